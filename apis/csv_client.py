@@ -0,0 +1,64 @@
+"""
+api.csv_client
+~~~~~~~~~~~~~~
+
+This module contains CsvClient class.
+
+"""
+
+import csv
+import logging
+import sys
+from operator import itemgetter
+from typing import Iterator, Self
+
+SOURCE_PREFIX = "csv:"
+
+
+def is_csv_source(source: str | None) -> bool:
+    """Checks if a --source value points to a local CSV file"""
+    return source is not None and source.startswith(SOURCE_PREFIX)
+
+
+class CsvClient:
+    """This client streams rows of a local CSV export with the same column mapping as the sheets"""
+
+    def __init__(self: Self, source: str) -> None:
+        self._file_path: str = source.removeprefix(SOURCE_PREFIX)
+
+    @property
+    def file_path(self: Self) -> str:
+        return self._file_path
+
+    def iter_rows(
+        self: Self, first_row: int, columns: list[int | None]
+    ) -> Iterator[tuple[str, ...]]:
+        """Yields the mapped columns of every data row, one row at a time.
+
+        Unmapped columns are yielded as empty strings, so rows have the same shape
+        as the rows read from Google Sheets.
+        """
+        mapped: list[int] = [column for column in columns if column is not None]
+        width: int = max(mapped) + 1
+        getter = itemgetter(*[column if column is not None else width for column in columns])
+
+        try:
+            with open(self._file_path, "r", encoding="utf-8", newline="") as f:
+                reader = csv.reader(f)
+
+                # Skip header rows before the data
+                for _ in range(first_row):
+                    next(reader, None)
+
+                for row in reader:
+                    # Cell at index width stands in for unmapped columns and must be empty
+                    if len(row) <= width:
+                        row.extend([""] * (width + 1 - len(row)))
+                    else:
+                        row[width] = ""
+
+                    values = getter(row)
+                    yield values if isinstance(values, tuple) else (values,)
+        except FileNotFoundError:
+            logging.error("No CSV file found at %s", self._file_path)
+            sys.exit(1)
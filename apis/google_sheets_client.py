@@ -6,61 +6,231 @@ This module contains GoogleSheetsClient class.
 
 """
 
+import hashlib
+import json
+import logging
 import os
 import sys
+import threading
+from datetime import datetime, timedelta
 from typing import Self
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
-from google.auth.exceptions import RefreshError
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
 from gspread import authorize
 from gspread.client import Client
 from gspread.exceptions import APIError, SpreadsheetNotFound
+from gspread.http_client import HTTPClient
 from gspread.spreadsheet import Spreadsheet
-from oauth2client.service_account import ServiceAccountCredentials
+from requests import Response
+
+from models.portfolio_config import PortfolioConfig
+from utils import files, profiler
 
 load_dotenv()
 
 
+class CachedCredentials(Credentials):
+    """Service account credentials which persist every refreshed access token for later runs"""
+
+    def refresh(self: Self, request: Request) -> None:
+        super().refresh(request)
+        GoogleSheetsClient.save_token(self)
+
+
+class RedirectedHTTPClient(HTTPClient):
+    """HTTP client which sends the requests of gspread to the server of GOOGLE_API_BASE_URL"""
+
+    def request(self: Self, method: str, endpoint: str, *args, **kwargs) -> Response:
+        return super().request(
+            method, GoogleSheetsClient.redirect_url(endpoint), *args, **kwargs
+        )
+
+
 class GoogleSheetsClient:
-    """Singleton class that returns an instance of the Google Sheet"""
+    """Class that returns an instance of the Google Sheet, one per spreadsheet and credentials"""
+
+    _instances: dict[tuple[str, str], "GoogleSheetsClient"] = {}
+    _instances_lock = threading.Lock()
+
+    _SCOPES: list[str] = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/drive",
+    ]
+
+    _TOKEN_FOLDER_NAME = "google_auth"
+    _TOKEN_FILE_NAME = "token"
 
-    _instance = None
-    _SHEET_ID: str | None = os.environ.get("SHEET_ID")
-    _CREDENTIALS_FILE: str | None = os.environ.get("CREDENTIALS_FILE")
+    # Cached tokens this close to expiry are refreshed up front instead of mid run
+    _TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
 
-    def __new__(cls):
-        if cls._SHEET_ID is None or cls._CREDENTIALS_FILE is None:
+    # Points Google API requests to another server, such as a local stand-in
+    _BASE_URL_VARIABLE = "GOOGLE_API_BASE_URL"
+
+    def __new__(cls, config: PortfolioConfig | None = None):
+        config = config if config is not None else PortfolioConfig.default()
+
+        if config.sheet_id is None or config.credentials_file is None:
             print("One or more environment variables are not set.")
             sys.exit(1)
 
-        if cls._instance is None:
-            cls._instance: Self = super().__new__(cls)
-            cls._instance._client = cls._instance._create_client()
-        return cls._instance
+        key: tuple[str, str] = (config.sheet_id, config.credentials_file)
 
-    @classmethod
-    def _create_client(cls: Self) -> Client:
-        """Creates and returns a Client object"""
+        # Services loading in parallel must share one client
+        with cls._instances_lock:
+            if key not in cls._instances:
+                instance: Self = super().__new__(cls)
+                instance._sheet_id = config.sheet_id
+                instance._client = instance._create_client(config.credentials_file)
+                instance._sheet = None
+                instance._lock = threading.Lock()
+                cls._instances[key] = instance
+        return cls._instances[key]
 
-        scope: list[str] = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive",
-        ]
+    def _create_client(self: Self, credentials_file: str) -> Client:
+        """Creates and returns a Client object.
 
-        creds: ServiceAccountCredentials = (
-            ServiceAccountCredentials.from_json_keyfile_name(
-                cls._CREDENTIALS_FILE, scope
+        The access token of an earlier run is reused while it is valid, so most runs
+        skip the token exchange. The token endpoint is the token_uri of the credentials
+        file, which can point to a local server for testing.
+
+        With GOOGLE_API_BASE_URL set, the token endpoint and every API request go to that
+        server instead, and tokens are neither reused nor saved, as they are only valid
+        there.
+        """
+        if self.base_url() is not None:
+            with open(credentials_file) as file:
+                info: dict = json.load(file)
+            info["token_uri"] = self.redirect_url(info["token_uri"])
+
+            creds: Credentials = Credentials.from_service_account_info(
+                info, scopes=self._SCOPES
             )
+            try:
+                creds.refresh(Request())
+            except (RefreshError, TransportError) as e:
+                print("Invalid credentials", e)
+                sys.exit(1)
+
+            logging.info("Sending Google API requests to %s", self.base_url())
+            return authorize(creds, http_client=RedirectedHTTPClient)
+
+        creds: CachedCredentials = CachedCredentials.from_service_account_file(
+            credentials_file, scopes=self._SCOPES
         )
 
+        if not self._load_token(creds):
+            try:
+                creds.refresh(Request())
+            except (RefreshError, TransportError) as e:
+                print("Invalid credentials", e)
+                sys.exit(1)
+
         return authorize(creds)
 
+    @classmethod
+    def base_url(cls: Self) -> str | None:
+        """Returns the server Google API requests are sent to, None for Google itself"""
+        base_url: str | None = os.environ.get(cls._BASE_URL_VARIABLE)
+        return base_url.rstrip("/") if base_url else None
+
+    @classmethod
+    def redirect_url(cls: Self, url: str) -> str:
+        """Returns the URL of a Google API request on the server of GOOGLE_API_BASE_URL.
+
+        The host is kept as the first segment of the path, so one server can stand in for
+        all of them: https://sheets.googleapis.com/v4/x becomes
+        <base url>/sheets.googleapis.com/v4/x.
+        """
+        base_url: str | None = cls.base_url()
+        if base_url is None:
+            return url
+
+        parts = urlsplit(url)
+        return (
+            f"{base_url}/{parts.netloc}{parts.path}"
+            + (f"?{parts.query}" if parts.query else "")
+        )
+
+    @classmethod
+    def _load_token(cls: Self, creds: Credentials) -> bool:
+        """Sets the cached access token on the credentials if it is still fresh"""
+        json_data: dict | None = files.read_file_as_json(
+            cls._TOKEN_FOLDER_NAME, cls._token_file_name(creds)
+        )
+
+        if json_data is None:
+            logging.debug("Did not find access token in cache")
+            return False
+
+        # A token is only valid for the account and scopes it was issued for
+        if (
+            json_data.get("service_account_email") != creds.service_account_email
+            or json_data.get("scopes") != cls._SCOPES
+        ):
+            logging.debug("Cached access token was issued for different credentials")
+            return False
+
+        try:
+            expiry: datetime = datetime.fromisoformat(json_data["expiry"])
+            token: str = json_data["token"]
+        except (KeyError, TypeError, ValueError):
+            logging.warning("Ignoring invalid access token in cache")
+            return False
+
+        # Expiry is a naive UTC datetime, same as google-auth
+        if expiry - cls._TOKEN_REFRESH_MARGIN <= datetime.utcnow():
+            logging.debug("Cached access token is about to expire")
+            return False
+
+        creds.token = token
+        creds.expiry = expiry
+
+        logging.debug("Reusing cached access token valid till %s UTC", expiry)
+        return True
+
+    @classmethod
+    def save_token(cls: Self, creds: Credentials) -> None:
+        """Saves the access token and its expiry to a file only the owner can read"""
+        if creds.token is None or creds.expiry is None:
+            return
+
+        files.save_private_file_as_json(
+            cls._TOKEN_FOLDER_NAME,
+            cls._token_file_name(creds),
+            {
+                "service_account_email": creds.service_account_email,
+                "scopes": cls._SCOPES,
+                "token": creds.token,
+                "expiry": creds.expiry.isoformat(),
+            },
+        )
+        logging.debug("Saved access token valid till %s UTC to cache", creds.expiry)
+
+    @classmethod
+    def _token_file_name(cls: Self, creds: Credentials) -> str:
+        """Returns the token file of a service account, so portfolios of other accounts keep theirs"""
+        digest: str = hashlib.sha1(
+            creds.service_account_email.encode("utf-8")
+        ).hexdigest()[:16]
+        return f"{cls._TOKEN_FILE_NAME}_{digest}"
+
     def get_sheet(self: Self) -> Spreadsheet:
-        """Returns the Spreadsheet object from Google Sheets"""
+        """Returns the Spreadsheet object from Google Sheets, opened once per run"""
+        with self._lock:
+            if self._sheet is None:
+                self._sheet: Spreadsheet = self._open_sheet()
+        return self._sheet
+
+    @profiler.timed("sheets.open")
+    def _open_sheet(self: Self) -> Spreadsheet:
         try:
-            return self._client.open_by_key(self._SHEET_ID)
+            return self._client.open_by_key(self._sheet_id)
         except SpreadsheetNotFound as e:
-            print("No Spreadsheet found with ID ->", self._SHEET_ID, e)
+            print("No Spreadsheet found with ID ->", self._sheet_id, e)
             sys.exit(1)
         except APIError as e:
             print("Error connecting to Google Sheets", e)
@@ -7,13 +7,22 @@ This module contains MFApiClient class.
 """
 
 import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future
 from decimal import Decimal
-from typing import Self
-
-from requests import HTTPError, Response, get
+from typing import TYPE_CHECKING, Self
 
 from models.mf_price import MFPrice
-from utils import files
+from models.nav_history import NavHistory
+from utils import cache_counters, files, profiler
+from utils.dates import to_datetime
+
+# requests is imported on first download, cached runs never load it
+if TYPE_CHECKING:
+    from requests import Response
 
 
 class MFApiClient:
@@ -21,26 +30,96 @@ class MFApiClient:
 
     _BASE_URL = "https://api.mfapi.in/mf/"
 
+    # Points the client to another server with the same API, such as a local stand-in
+    _BASE_URL_VARIABLE = "MFAPI_BASE_URL"
+
     _FOLDER_NAME = "mf_api_response"
 
+    # Bumped whenever the format of the cached NAV histories changes
+    _SCHEMA_VERSION = 1
+
+    # Fields of a NAV in the API response, each cached as a column
+    _FIELDS: list[str] = ["date", "nav"]
+
     def __init__(self: Self, override_cache=False) -> None:
         if override_cache:
             files.delete_files_in_folder(self._FOLDER_NAME)
 
-    def fetch_nav_prices(self: Self, amfi_code: int):
-        return self._fetch_nav_prices_from_cache(amfi_code)
+        self._base_url: str = (
+            os.environ.get(self._BASE_URL_VARIABLE, self._BASE_URL).rstrip("/") + "/"
+        )
+
+        # NAV histories loaded in this run, and the ones still being prefetched
+        self._nav_prices: dict[int, list[MFPrice] | None] = {}
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+        # Date indexes of NAV histories, built on first lookup or taken from a snapshot
+        self._nav_histories: dict[int, NavHistory | None] = {}
+
+    def prefetch_nav_prices(self: Self, amfi_codes: list[int], executor: Executor) -> None:
+        """Starts loading the NAV histories of the funds in the background"""
+        with self._lock:
+            for amfi_code in amfi_codes:
+                if (
+                    amfi_code in self._nav_prices
+                    or amfi_code in self._pending
+                    or amfi_code in self._nav_histories
+                ):
+                    continue
+                self._pending[amfi_code] = executor.submit(
+                    self._fetch_nav_prices_from_cache, amfi_code
+                )
+
+        logging.debug("Prefetching NAV prices of %s funds", len(amfi_codes))
+
+    def add_nav_histories(self: Self, nav_histories: dict[int, NavHistory]) -> None:
+        """Adds NAV histories which are already indexed, so their cache files are not read"""
+        with self._lock:
+            self._nav_histories.update(nav_histories)
+
+    def fetch_nav_prices(self: Self, amfi_code: int) -> list[MFPrice] | None:
+        """Returns the NAV history of a fund, waiting for it if it is being prefetched"""
+        with self._lock:
+            if amfi_code in self._nav_prices:
+                return self._nav_prices[amfi_code]
+            future: Future | None = self._pending.get(amfi_code)
+            nav_history: NavHistory | None = self._nav_histories.get(amfi_code)
+
+        if nav_history is not None:
+            pricing_data: list[MFPrice] | None = nav_history.to_prices()
+        elif future is not None:
+            pricing_data: list[MFPrice] | None = future.result()
+        else:
+            pricing_data: list[MFPrice] | None = self._fetch_nav_prices_from_cache(
+                amfi_code
+            )
 
+        with self._lock:
+            self._nav_prices[amfi_code] = pricing_data
+            self._pending.pop(amfi_code, None)
+
+        return pricing_data
+
+    @profiler.timed("nav.download")
     def _fetch_nav_prices_from_api(self: Self, amfi_code: int) -> list[MFPrice] | None:
-        url: str = self._BASE_URL + str(amfi_code)
+        from requests import get
+
+        url: str = self._base_url + str(amfi_code)
 
+        cache_counters.record("nav", cache_counters.FETCH)
         response: Response = get(url, timeout=10)
 
         # Check if the request was successful
         if response.status_code == 200:
             pricing_data_json = response.json()["data"]
 
-            files.save_file_as_json(
-                self._FOLDER_NAME, str(amfi_code), pricing_data_json
+            files.save_cache_file(
+                self._FOLDER_NAME,
+                str(amfi_code),
+                files.rows_to_columns(pricing_data_json, self._FIELDS),
+                self._SCHEMA_VERSION,
+                codec="record",
             )
 
             pricing_data: list[MFPrice] = [
@@ -51,31 +130,132 @@ class MFApiClient:
         else:
             return None
 
+    @profiler.timed("nav.load")
     def _fetch_nav_prices_from_cache(
         self: Self, amfi_code: int
     ) -> list[MFPrice] | None:
-        json_data: list[dict] | None = files.read_file_as_json(
-            self._FOLDER_NAME, str(amfi_code)
+        cached_columns: dict[str, list[str]] | None = files.read_cache_file(
+            self._FOLDER_NAME, str(amfi_code), self._SCHEMA_VERSION
         )
 
-        if json_data is None:
+        if cached_columns is None:
+            cache_counters.record("nav", cache_counters.MISS)
             return self._fetch_nav_prices_from_api(amfi_code)
 
-        pricing_data: list[MFPrice] = [MFPrice.from_dict(d) for d in json_data]
+        cache_counters.record("nav", cache_counters.HIT)
+
+        pricing_data: list[MFPrice] = [
+            MFPrice(date=date, nav=nav)
+            for date, nav in zip(cached_columns["date"], cached_columns["nav"])
+        ]
 
         return pricing_data
 
-    def get_nav_price(self: Self, amfi_code: int, date: datetime) -> Decimal:
-        pricing_data: list[MFPrice] = self.fetch_nav_prices(amfi_code)
+    def refresh_nav_prices(self: Self, amfi_codes: list[int], max_age: float) -> list[int]:
+        """Downloads NAV histories cached more than max_age seconds ago, returns the refreshed funds.
+
+        A fund whose download fails keeps its cached NAV history.
+        """
+        from requests import RequestException
+
+        refreshed: list[int] = []
+
+        for amfi_code in amfi_codes:
+            modified_time: float | None = self.nav_cache_modified_time(amfi_code)
+            if modified_time is not None and time.time() - modified_time < max_age:
+                continue
+
+            try:
+                pricing_data: list[MFPrice] | None = self._fetch_nav_prices_from_api(
+                    amfi_code
+                )
+            except (RequestException, ValueError, KeyError) as e:
+                logging.warning("Could not refresh NAV prices of %s: %s", amfi_code, e)
+                continue
 
-        for data in pricing_data:
-            if data.date > date:
+            if pricing_data is None:
+                logging.warning("Could not refresh NAV prices of %s", amfi_code)
                 continue
 
-            return Decimal(data.nav)
+            with self._lock:
+                self._nav_prices[amfi_code] = pricing_data
+                self._pending.pop(amfi_code, None)
+                self._nav_histories.pop(amfi_code, None)
+            refreshed.append(amfi_code)
+
+        if len(refreshed) > 0:
+            logging.info("Refreshed NAV prices of %s funds", len(refreshed))
+
+        return refreshed
+
+    def nav_history(self: Self, amfi_code: int) -> NavHistory | None:
+        """Returns the NAV history of a fund indexed by date, None if it has no NAV data"""
+        with self._lock:
+            if amfi_code in self._nav_histories:
+                return self._nav_histories[amfi_code]
+
+        pricing_data: list[MFPrice] | None = self.fetch_nav_prices(amfi_code)
+        nav_history: NavHistory | None = (
+            NavHistory.from_prices(pricing_data) if pricing_data is not None else None
+        )
+
+        with self._lock:
+            return self._nav_histories.setdefault(amfi_code, nav_history)
+
+    def latest_nav_date(self: Self, amfi_code: int) -> datetime.datetime | None:
+        """Returns the date of the latest NAV published for a fund"""
+        nav_history: NavHistory | None = self.nav_history(amfi_code)
+
+        if nav_history is None:
+            return None
+        return nav_history.latest_date()
+
+    def nav_cache_file_path(self: Self, amfi_code: int) -> str:
+        """Returns the cache file of the NAV history of a fund"""
+        return files.get_cache_file_path(self._FOLDER_NAME, str(amfi_code))
+
+    def cached_nav_range(
+        self: Self, amfi_code: int
+    ) -> tuple[int, datetime.datetime, datetime.datetime] | None:
+        """Returns the number of cached NAVs of a fund with the first and last date, without downloading"""
+        cached_columns: dict[str, list[str]] | None = files.read_cache_file(
+            self._FOLDER_NAME, str(amfi_code), self._SCHEMA_VERSION
+        )
+
+        if cached_columns is None or len(cached_columns["date"]) == 0:
+            return None
+
+        # NAVs are cached in the order of the API, which is the latest first
+        dates: list[datetime.datetime] = [
+            to_datetime(cached_columns["date"][0]),
+            to_datetime(cached_columns["date"][-1]),
+        ]
+        return len(cached_columns["date"]), min(dates), max(dates)
+
+    def nav_cache_modified_time(self: Self, amfi_code: int) -> float | None:
+        """Returns the time the NAV history of a fund was last cached"""
+        if not files.check_if_cache_file_exists(self._FOLDER_NAME, str(amfi_code)):
+            return None
+
+        return os.path.getmtime(self.nav_cache_file_path(amfi_code))
+
+    @profiler.counted("get_nav_price")
+    def get_nav_price(self: Self, amfi_code: int, date: datetime) -> Decimal:
+        """Returns the latest NAV of a fund published on or before a date"""
+        nav_history: NavHistory | None = self.nav_history(amfi_code)
+
+        if nav_history is None:
+            raise ValueError(f"No NAV data found for AMFI code: {amfi_code}")
+
+        nav: str | None = nav_history.nav_on(date)
+        if nav is None:
+            return None
+        return Decimal(nav)
 
     def get_fund_name(self: Self, amfi_code: int) -> str:
-        url: str = self._BASE_URL + str(amfi_code)
+        from requests import HTTPError, get
+
+        url: str = self._base_url + str(amfi_code)
 
         response: Response = get(url, timeout=10)
 
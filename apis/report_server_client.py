@@ -0,0 +1,159 @@
+"""
+api.report_server_client
+~~~~~~~~~~~~~~
+
+This module contains ReportServerClient class.
+
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Self
+from urllib.parse import urlencode
+
+from models.asset_value import AssetValue
+from utils import files
+from utils.dates import to_month_year
+
+# http.client is imported only once a server info file is found
+if TYPE_CHECKING:
+    from http.client import HTTPResponse
+
+
+class ReportServerClient:
+    """This Api Client class forwards reports to a running report server.
+
+    The server is found through the info file it writes on start, and is used only if it
+    answers and serves the same sources as the command.
+    """
+
+    # Server info file, written by the server with its address and token
+    FOLDER_NAME = "server"
+    FILE_NAME = "server"
+
+    # A server which does not answer this fast is treated as not running
+    _CONNECT_TIMEOUT = 0.5
+    _TIMEOUT = 300
+
+    def __init__(self: Self, host: str, port: int, token: str) -> None:
+        self._host: str = host
+        self._port: int = port
+        self._token: str = token
+
+    @classmethod
+    def connect(
+        cls, source: str | None, properties_source: str | None
+    ) -> "ReportServerClient | None":
+        """Returns a client of the running server, or None if there is no server to forward to"""
+        json_data: dict | None = files.read_file_as_json(cls.FOLDER_NAME, cls.FILE_NAME)
+
+        if json_data is None:
+            return None
+
+        if (
+            json_data.get("source") != source
+            or json_data.get("properties_source") != properties_source
+        ):
+            logging.debug("Report server serves other sources, calculating locally")
+            return None
+
+        client = cls(json_data["host"], json_data["port"], json_data["token"])
+        if client._request("/health", {}, cls._CONNECT_TIMEOUT) is None:
+            logging.debug("Report server is not running, calculating locally")
+            return None
+
+        logging.debug("Forwarding to report server on %s:%s", client._host, client._port)
+        return client
+
+    def summary(
+        self: Self, month: datetime, portfolio: str | None, country: str | None
+    ) -> AssetValue | None:
+        """Returns the asset value of the portfolio in a month with fund level returns"""
+        json_data: dict | None = self._request(
+            "/summary",
+            {"date": to_month_year(month), "portfolio": portfolio, "country": country},
+        )
+
+        if json_data is None:
+            return None
+
+        return AssetValue.from_dict(json_data["asset_value"])
+
+    def asset_values(
+        self: Self, from_date: datetime, to_date: datetime, equity_only: bool
+    ) -> list[AssetValue] | None:
+        """Returns the asset value of the portfolio in every month of a range"""
+        json_data: dict | None = self._request(
+            "/assetvalue",
+            {
+                "from": to_month_year(from_date),
+                "to": to_month_year(to_date),
+                "equity": "true" if equity_only else None,
+            },
+        )
+
+        if json_data is None:
+            return None
+
+        return [AssetValue.from_dict(value) for value in json_data["asset_values"]]
+
+    def benchmark(
+        self: Self,
+        amfi_code: int,
+        from_date: datetime,
+        to_date: datetime,
+        equity_only: bool,
+    ) -> tuple[str, list[AssetValue]] | None:
+        """Returns the name of a benchmark fund and the monthly asset values of the portfolio invested in it"""
+        json_data: dict | None = self._request(
+            "/benchmark",
+            {
+                "amfi_code": amfi_code,
+                "from": to_month_year(from_date),
+                "to": to_month_year(to_date),
+                "equity": "true" if equity_only else None,
+            },
+        )
+
+        if json_data is None:
+            return None
+
+        return json_data["name"], [
+            AssetValue.from_dict(value) for value in json_data["asset_values"]
+        ]
+
+    def _request(
+        self: Self, path: str, params: dict, timeout: float | None = None
+    ) -> dict | None:
+        """Sends a GET request and returns the JSON response, or None if it failed"""
+        from http.client import HTTPConnection
+
+        query: str = urlencode(
+            {key: value for key, value in params.items() if value is not None}
+        )
+        connection = HTTPConnection(
+            self._host, self._port, timeout=timeout or self._TIMEOUT
+        )
+
+        try:
+            connection.request(
+                "GET",
+                path + ("?" + query if query else ""),
+                headers={"Authorization": "Bearer " + self._token},
+            )
+            response: HTTPResponse = connection.getresponse()
+            json_data: dict = json.loads(response.read())
+        except (OSError, ValueError) as e:
+            logging.debug("Request to report server failed: %s", e)
+            return None
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            logging.warning(
+                "Report server could not serve %s: %s", path, json_data.get("error")
+            )
+            return None
+
+        return json_data
@@ -0,0 +1,140 @@
+"""
+benchmarks.importtime
+~~~~~~~~~~~~~~
+
+This module checks the import time of a command against a budget.
+Run python3 benchmarks/importtime.py --help for more information.
+
+"""
+
+import os
+import subprocess
+import sys
+from argparse import REMAINDER, ArgumentParser, Namespace
+
+MAIN_FILE: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+
+# Libraries which a run from cache should never load
+DEFAULT_FORBIDDEN: list[str] = [
+    "gspread",
+    "google.auth",
+    "google.oauth2",
+    "requests",
+    "numpy",
+    "scipy",
+    "xirr",
+]
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, int, str]]:
+    """Parses the -X importtime report into (self us, cumulative us, module) tuples.
+
+    Imports of the interpreter start-up, up to and including site, are left out as they
+    depend on the environment and not on the script.
+    """
+    imports: list[tuple[int, int, str]] = []
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue
+
+        if module.rstrip() == " site":
+            imports.clear()
+            continue
+
+        imports.append((int(self_us), int(cumulative_us), module.rstrip()))
+
+    return imports
+
+
+def measure(command: list[str]) -> tuple[list[tuple[int, int, str]], int]:
+    """Runs main.py with a command and returns its imports and exit code"""
+    result: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN_FILE] + command,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return parse_importtime(result.stderr), result.returncode
+
+
+def main() -> int:
+    parser = ArgumentParser(
+        description="Check the import time of a main.py command run from the current folder"
+    )
+    parser.add_argument(
+        "command",
+        nargs=REMAINDER,
+        help="command and arguments passed to main.py, defaulted to summary",
+    )
+    parser.add_argument(
+        "--budget",
+        metavar="ms",
+        dest="budget",
+        type=float,
+        default=100,
+        help="maximum total import time in milliseconds, defaulted to 100",
+    )
+    parser.add_argument(
+        "--forbid",
+        metavar="module",
+        dest="forbidden",
+        action="append",
+        help="module which must not be imported, defaulted to network and numeric libraries",
+    )
+    parser.add_argument(
+        "--top",
+        metavar="count",
+        dest="top",
+        type=int,
+        default=10,
+        help="number of slowest top-level imports to print, defaulted to 10",
+    )
+    args: Namespace = parser.parse_args()
+
+    command: list[str] = args.command or ["summary"]
+
+    imports, returncode = measure(command)
+    if returncode != 0:
+        print(f"main.py {' '.join(command)} exited with code {returncode}")
+        return returncode
+
+    # Top-level imports are not indented, their cumulative times add up to the total
+    top_level: list[tuple[int, int, str]] = [
+        entry for entry in imports if not entry[2].startswith("  ")
+    ]
+    total_ms: float = sum(cumulative for _, cumulative, _ in top_level) / 1000
+
+    print(f"Slowest imports of main.py {' '.join(command)}:")
+    for _, cumulative, module in sorted(top_level, reverse=True, key=lambda x: x[1])[
+        : args.top
+    ]:
+        print(f"{cumulative / 1000:8.1f} ms  {module.strip()}")
+
+    forbidden: list[str] = args.forbidden or DEFAULT_FORBIDDEN
+    modules: set[str] = {module.strip() for _, _, module in imports}
+    loaded: list[str] = [
+        name
+        for name in forbidden
+        if any(module == name or module.startswith(name + ".") for module in modules)
+    ]
+
+    print(f"\nTotal import time {total_ms:.1f} ms, budget {args.budget:.1f} ms")
+
+    failed = False
+    if total_ms > args.budget:
+        print("Import time is over budget")
+        failed = True
+    if len(loaded) > 0:
+        print("Forbidden modules were imported:", ", ".join(loaded))
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
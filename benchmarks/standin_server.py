@@ -0,0 +1,374 @@
+"""
+benchmarks.standin_server
+~~~~~~~~~~~~~~
+
+This module records mfapi and Google API responses and serves them back from a local
+server, so runs which download can be timed and profiled without the network.
+Run python3 benchmarks/standin_server.py --help for more information.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Self
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import setup_logging
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Hosts which are recorded, the first segment of every path names one of them
+_MFAPI_HOST = "api.mfapi.in"
+_GOOGLE_HOST_SUFFIX = ".googleapis.com"
+
+# Tokens are exchanged with the server every run and never recorded
+_TOKEN_PATH = "/oauth2.googleapis.com/token"
+_REPLAY_TOKEN: dict = {
+    "access_token": "replay",
+    "expires_in": 3600,
+    "token_type": "Bearer",
+}
+
+# Request headers passed on to the recorded hosts
+_FORWARDED_HEADERS: list[str] = ["Authorization", "Content-Type", "Accept"]
+
+_UPSTREAM_TIMEOUT = 30
+
+
+class StandinServer:
+    """Serves mfapi and Google API requests as paths <host>/<path> on the loopback.
+
+    In record mode every request is sent on to https://<host>/<path> and a successful
+    response is saved to the fixtures folder. In replay mode responses are served from
+    the fixtures only, with 404 for a request which was not recorded. Either mode can
+    delay responses and fail a share of them, to exercise concurrent downloads and
+    error handling the way a slow or flaky network would.
+    """
+
+    def __init__(
+        self: Self,
+        mode: str,
+        fixtures_path: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        error_status: int = 503,
+        drop_rate: float = 0,
+        seed: int | None = None,
+    ) -> None:
+        self._mode: str = mode
+        self._fixtures_path: str = fixtures_path
+        self._latency: float = latency
+        self._jitter: float = jitter
+        self._error_rate: float = error_rate
+        self._error_status: int = error_status
+        self._drop_rate: float = drop_rate
+
+        # Handler threads draw from one generator, so a seed repeats the same faults
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), StandinRequestHandler)
+        self._server.daemon_threads = True
+        self._server.standin_server = self
+
+    @property
+    def address(self: Self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    @property
+    def base_url(self: Self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def serve_forever(self: Self) -> None:
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def shutdown(self: Self) -> None:
+        """Stops serving requests, to be called from another thread"""
+        self._server.shutdown()
+
+    def handle(
+        self: Self, method: str, path: str, headers: dict[str, str], body: bytes
+    ) -> tuple[int, str, bytes] | None:
+        """Returns the status code, content type and body of the response to a request,
+        None to drop the connection without a response"""
+        with self._random_lock:
+            delay: float = max(0.0, self._random.gauss(self._latency, self._jitter))
+            is_dropped: bool = self._random.random() < self._drop_rate
+            is_failed: bool = self._random.random() < self._error_rate
+
+        time.sleep(delay)
+
+        if is_dropped:
+            return None
+        if is_failed:
+            return self._error(self._error_status, "Injected error")
+
+        host: str = urlsplit(path).path.split("/")[1]
+        if host != _MFAPI_HOST and not host.endswith(_GOOGLE_HOST_SUFFIX):
+            return self._error(404, f"Not a recorded host: {host}")
+
+        if self._mode == REPLAY and urlsplit(path).path == _TOKEN_PATH:
+            return 200, "application/json", json.dumps(_REPLAY_TOKEN).encode("utf-8")
+
+        if self._mode == RECORD:
+            return self._record(method, path, headers, body)
+        return self._replay(method, path, body)
+
+    def _record(
+        self: Self, method: str, path: str, headers: dict[str, str], body: bytes
+    ) -> tuple[int, str, bytes]:
+        from requests import RequestException, request
+
+        try:
+            response = request(
+                method,
+                "https://" + path.lstrip("/"),
+                headers={
+                    name: headers[name]
+                    for name in _FORWARDED_HEADERS
+                    if name in headers
+                },
+                data=body or None,
+                timeout=_UPSTREAM_TIMEOUT,
+            )
+        except RequestException as e:
+            logging.warning("Could not forward %s %s: %s", method, path, e)
+            return self._error(502, str(e))
+
+        content_type: str = response.headers.get("Content-Type", "application/json")
+
+        # Failed responses are passed on but not recorded, nor are access tokens
+        if response.ok and urlsplit(path).path != _TOKEN_PATH:
+            self._save_fixture(
+                method, path, body, response.status_code, content_type, response.text
+            )
+            logging.info("Recorded %s %s", method, path)
+
+        return response.status_code, content_type, response.content
+
+    def _replay(
+        self: Self, method: str, path: str, body: bytes
+    ) -> tuple[int, str, bytes]:
+        fixture_path: str = self._fixture_path(method, path, body)
+
+        try:
+            with open(fixture_path, encoding="utf-8") as file:
+                fixture: dict = json.load(file)
+        except FileNotFoundError:
+            logging.warning("No fixture recorded for %s %s", method, path)
+            return self._error(404, f"No fixture recorded for {method} {path}")
+
+        logging.debug("Replayed %s %s", method, path)
+        return (
+            fixture["status"],
+            fixture["content_type"],
+            fixture["body"].encode("utf-8"),
+        )
+
+    def _save_fixture(
+        self: Self,
+        method: str,
+        path: str,
+        body: bytes,
+        status: int,
+        content_type: str,
+        text: str,
+    ) -> None:
+        fixture_path: str = self._fixture_path(method, path, body)
+        os.makedirs(os.path.dirname(fixture_path), exist_ok=True)
+
+        # Written whole and renamed, so a replay never reads a fixture being recorded
+        temp_path: str = f"{fixture_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "request": f"{method} {path}",
+                    "status": status,
+                    "content_type": content_type,
+                    "body": text,
+                },
+                file,
+            )
+        os.replace(temp_path, fixture_path)
+
+    def _fixture_path(self: Self, method: str, path: str, body: bytes) -> str:
+        """Returns the fixture file of a request, grouped in a folder by host"""
+        digest = hashlib.sha1(f"{method} {path}".encode("utf-8"))
+        digest.update(body)
+        host: str = urlsplit(path).path.split("/")[1]
+        return os.path.join(
+            self._fixtures_path, host, digest.hexdigest()[:16] + ".json"
+        )
+
+    @staticmethod
+    def _error(status: int, message: str) -> tuple[int, str, bytes]:
+        """Returns an error response in the format of Google APIs, which gspread parses"""
+        payload: bytes = json.dumps(
+            {
+                "error": {
+                    "code": status,
+                    "message": message,
+                    "status": HTTPStatus(status).name,
+                }
+            }
+        ).encode("utf-8")
+        return status, "application/json", payload
+
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+    """Passes requests to the stand-in server and writes its responses"""
+
+    server_version = "PortfolioStandin/1.0"
+
+    def do_GET(self: Self) -> None:
+        self._respond("GET")
+
+    def do_POST(self: Self) -> None:
+        self._respond("POST")
+
+    def _respond(self: Self, method: str) -> None:
+        body: bytes = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        response: tuple[int, str, bytes] | None = self.server.standin_server.handle(
+            method, self.path, dict(self.headers.items()), body
+        )
+        if response is None:
+            self.close_connection = True
+            return
+
+        status, content_type, payload = response
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self: Self, format: str, *args) -> None:
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+def main() -> int:
+    parser = ArgumentParser(
+        description="Record mfapi and Google API responses, or serve them back offline"
+    )
+    parser.add_argument(
+        "mode",
+        choices=[RECORD, REPLAY],
+        help="record forwards requests and saves the responses, replay serves them",
+    )
+    parser.add_argument(
+        "--fixtures",
+        metavar="folder",
+        dest="fixtures_path",
+        default="fixtures",
+        help="folder of the recorded responses, defaulted to fixtures",
+    )
+    parser.add_argument(
+        "--port",
+        dest="port",
+        type=int,
+        default=8780,
+        help="port to listen on at 127.0.0.1, defaulted to 8780",
+    )
+    parser.add_argument(
+        "--latency",
+        metavar="ms",
+        dest="latency",
+        type=float,
+        default=0,
+        help="mean delay of each response in milliseconds, defaulted to 0",
+    )
+    parser.add_argument(
+        "--jitter",
+        metavar="ms",
+        dest="jitter",
+        type=float,
+        default=0,
+        help="standard deviation of the delay in milliseconds, defaulted to 0",
+    )
+    parser.add_argument(
+        "--error-rate",
+        metavar="share",
+        dest="error_rate",
+        type=float,
+        default=0,
+        help="share of requests answered with --error-status, between 0 and 1",
+    )
+    parser.add_argument(
+        "--error-status",
+        metavar="code",
+        dest="error_status",
+        type=int,
+        default=503,
+        help="status code of injected errors, defaulted to 503",
+    )
+    parser.add_argument(
+        "--drop-rate",
+        metavar="share",
+        dest="drop_rate",
+        type=float,
+        default=0,
+        help="share of requests whose connection is closed without a response",
+    )
+    parser.add_argument(
+        "--seed",
+        dest="seed",
+        type=int,
+        help="seed of the injected delays and errors, to repeat them across runs",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        dest="verbose",
+        help="log every request",
+    )
+    args: Namespace = parser.parse_args()
+
+    setup_logging(args.verbose)
+
+    server = StandinServer(
+        args.mode,
+        args.fixtures_path,
+        port=args.port,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+    )
+
+    print(f"Serving {args.mode} of {args.fixtures_path} on {server.base_url}, use:")
+    print(f"export MFAPI_BASE_URL={server.base_url}/{_MFAPI_HOST}/mf/")
+    print(f"export GOOGLE_API_BASE_URL={server.base_url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,536 @@
+"""
+benchmarks.valuation
+~~~~~~~~~~~~~~
+
+This module times the valuation hot paths on synthetic portfolios, fully offline.
+Run python3 benchmarks/valuation.py --help for more information.
+
+"""
+
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from typing import Callable, Self
+
+ROOT_FOLDER: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_FOLDER)
+
+from apis.mf_api_client import MFApiClient
+from features.mf_monthly_asset_value import calculate_asset_values
+from features.mf_summary import calculate_summary_asset_value
+from models.mf_property import MFProperty
+from models.transaction_table import TransactionTable
+from services.asset_value_service import AssetValueService
+from services.mf_data_service import MFDataService
+from services.mf_properties_service import MFPropertiesService
+from services.portfolio_loader_service import PortfolioLoaderService
+from services.result_cache_service import ResultCacheService
+from utils import dates, files
+from utils.xirr import batch_xirr, solve_xirr
+
+# Transactions and funds of each portfolio size
+SIZES: dict[str, tuple[int, int]] = {
+    "small": (100, 10),
+    "medium": (10_000, 100),
+    "large": (100_000, 300),
+    "huge": (1_000_000, 1_000),
+}
+
+# Bumped whenever the format of the results file changes
+RESULTS_VERSION = 1
+
+# NAV histories span 20 years of business days, fixed so results compare across commits
+FIRST_DATE = datetime(2006, 1, 2)
+LAST_DATE = datetime(2025, 12, 31)
+
+# Index fund which portfolios are compared with by the benchmark cases
+BENCHMARK_AMFI_CODE = 100000
+
+ASSETS: list[str] = ["equity", "elss", "debt", "arbitrage"]
+
+# Assets of the synthetic funds with their weights, daily NAV drift and volatility
+_FUND_ASSETS: list[tuple[str, int, float, float]] = [
+    ("Equity", 6, 0.0004, 0.011),
+    ("ELSS", 1, 0.0004, 0.012),
+    ("Debt", 2, 0.00025, 0.001),
+    ("Arbitrage", 1, 0.0002, 0.0008),
+]
+_FUND_PORTFOLIOS: list[str] = ["Core", "Satellite", "Tax"]
+_FUND_COUNTRIES: list[str] = ["India", "India", "India", "US"]
+
+# Share of transactions which were sold, the rest are still held
+_SELL_RATIO = 0.15
+
+# Unsold transactions are written the way the sheet leaves them
+_UNSOLD_DATE = "01-01-2099"
+_UNSOLD_PRICE = "0"
+
+
+def generate_portfolio(transaction_count: int, fund_count: int, seed: int) -> None:
+    """Writes the transactions, properties and NAV histories of a synthetic portfolio to
+    the caches of the current folder, in the formats the services read them from"""
+    rng = random.Random(seed)
+
+    business_days: list[int] = [
+        day
+        for day in range(FIRST_DATE.toordinal(), LAST_DATE.toordinal() + 1)
+        if datetime.fromordinal(day).weekday() < 5
+    ]
+    datestrings: list[str] = [
+        dates.to_datestring(datetime.fromordinal(day)) for day in business_days
+    ]
+
+    # Transactions are spread unevenly across funds, as in a real portfolio
+    fund_weights: list[float] = [rng.paretovariate(1.5) for _ in range(fund_count)]
+    fund_indexes: list[int] = rng.choices(
+        range(fund_count), weights=fund_weights, k=transaction_count
+    )
+    fund_transaction_counts: list[int] = [0] * fund_count
+    for fund_index in fund_indexes:
+        fund_transaction_counts[fund_index] += 1
+
+    mf_properties: dict[str, MFProperty] = {}
+    rows: list[tuple] = []
+
+    for fund_index in range(fund_count):
+        fund: str = f"Synthetic Fund {fund_index:04d}"
+        amfi_code: int = BENCHMARK_AMFI_CODE + 1 + fund_index
+        asset, _, drift, volatility = rng.choices(
+            _FUND_ASSETS, weights=[weight for _, weight, _, _ in _FUND_ASSETS]
+        )[0]
+
+        mf_properties[fund] = MFProperty(
+            amfi_code=amfi_code,
+            portfolio=rng.choice(_FUND_PORTFOLIOS),
+            asset=asset,
+            country=rng.choice(_FUND_COUNTRIES),
+        )
+
+        # NAVs are kept only while the transactions of their fund are generated
+        navs: list[str] = _save_nav_history(
+            rng, amfi_code, datestrings, drift, volatility
+        )
+
+        for _ in range(fund_transaction_counts[fund_index]):
+            buy_index: int = rng.randrange(len(business_days) - 1)
+            units: str = str(
+                round(rng.uniform(500, 5000) / float(navs[buy_index]), 3)
+            )
+
+            if rng.random() < _SELL_RATIO:
+                sell_index: int = rng.randrange(buy_index + 1, len(business_days))
+                rows.append(
+                    (
+                        business_days[buy_index],
+                        fund,
+                        "SELL",
+                        units,
+                        datestrings[buy_index],
+                        navs[buy_index],
+                        datestrings[sell_index],
+                        navs[sell_index],
+                    )
+                )
+            else:
+                rows.append(
+                    (
+                        business_days[buy_index],
+                        fund,
+                        "BUY",
+                        units,
+                        datestrings[buy_index],
+                        navs[buy_index],
+                        _UNSOLD_DATE,
+                        _UNSOLD_PRICE,
+                    )
+                )
+
+    _save_nav_history(rng, BENCHMARK_AMFI_CODE, datestrings, 0.0004, 0.01)
+
+    # Cached transactions are sorted by buy date, as the services save them
+    rows.sort(key=lambda row: (row[0], row[1]))
+    files.save_cache_file(
+        MFDataService._FOLDER_NAME,
+        MFDataService._FILE_NAME,
+        {
+            field: [row[column] for row in rows]
+            for column, field in enumerate(MFDataService._FIELDS, start=1)
+        },
+        MFDataService._SCHEMA_VERSION,
+        codec="record",
+    )
+    files.save_cache_file(
+        MFPropertiesService._FOLDER_NAME,
+        MFPropertiesService._FILE_NAME,
+        {fund: mf_property.to_dict() for fund, mf_property in mf_properties.items()},
+        MFPropertiesService._SCHEMA_VERSION,
+    )
+
+
+def _save_nav_history(
+    rng: random.Random,
+    amfi_code: int,
+    datestrings: list[str],
+    drift: float,
+    volatility: float,
+) -> list[str]:
+    """Saves a random walk of NAVs on the given dates, returns them oldest first"""
+    nav: float = rng.uniform(10, 50)
+    navs: list[str] = []
+    for _ in datestrings:
+        nav *= 1 + rng.gauss(drift, volatility)
+        navs.append(f"{nav:.4f}")
+
+    # NAVs are cached in the order of the API, which is the latest first
+    files.save_cache_file(
+        MFApiClient._FOLDER_NAME,
+        str(amfi_code),
+        {"date": datestrings[::-1], "nav": navs[::-1]},
+        MFApiClient._SCHEMA_VERSION,
+        codec="record",
+    )
+
+    return navs
+
+
+class Portfolio:
+    """The inputs of the synthetic portfolio, loaded once and shared by the cases"""
+
+    def __init__(self: Self, months: int) -> None:
+        self.txn_table: TransactionTable = MFDataService().mf_txn_table()
+        self.mf_properties: dict[str, MFProperty] = (
+            MFPropertiesService().mf_properties()
+        )
+        self.amfi_codes: list[int] = sorted(
+            {mf_property.amfi_code for mf_property in self.mf_properties.values()}
+        )
+        self.mf_api_client = MFApiClient()
+        for amfi_code in self.amfi_codes + [BENCHMARK_AMFI_CODE]:
+            self.mf_api_client.nav_history(amfi_code)
+
+        # Months of the range end with the month of the last NAV
+        self.to_date: datetime = LAST_DATE.replace(day=1)
+        first_month: int = self.to_date.year * 12 + self.to_date.month - months
+        self.from_date: datetime = datetime(first_month // 12, first_month % 12 + 1, 1)
+
+        self.portfolio_cashflow, self.fund_cashflows = self._cashflows()
+
+    def _cashflows(
+        self: Self,
+    ) -> tuple[
+        tuple[list[datetime], list[float]], list[tuple[list[datetime], list[float]]]
+    ]:
+        """Returns cashflows of the portfolio and of each fund, valued at the end"""
+        fund_navs: dict[int, float] = {}
+        fund_cashflows: dict[int, tuple[list[datetime], list[float]]] = {}
+
+        for fund_code, units, buy_price, buy_day in zip(
+            self.txn_table.fund_codes,
+            self.txn_table.units,
+            self.txn_table.buy_prices,
+            self.txn_table.buy_days,
+        ):
+            if fund_code not in fund_navs:
+                amfi_code: int = self.mf_properties[
+                    self.txn_table.funds[fund_code]
+                ].amfi_code
+                fund_navs[fund_code] = float(
+                    self.mf_api_client.get_nav_price(amfi_code, LAST_DATE)
+                )
+
+            cashflow_dates, cashflow_values = fund_cashflows.setdefault(
+                fund_code, ([], [])
+            )
+            cashflow_dates += [datetime.fromordinal(buy_day), LAST_DATE]
+            cashflow_values += [-units * buy_price, units * fund_navs[fund_code]]
+
+        portfolio_cashflow: tuple[list[datetime], list[float]] = ([], [])
+        for cashflow_dates, cashflow_values in fund_cashflows.values():
+            portfolio_cashflow[0].extend(cashflow_dates)
+            portfolio_cashflow[1].extend(cashflow_values)
+
+        return portfolio_cashflow, list(fund_cashflows.values())
+
+
+def cases(portfolio: Portfolio) -> dict[str, Callable[[], object]]:
+    """Returns the timed cases by name, each run from the current folder"""
+    asset_value_service = AssetValueService()
+
+    def load_navs() -> None:
+        mf_api_client = MFApiClient()
+        for amfi_code in portfolio.amfi_codes:
+            mf_api_client.nav_history(amfi_code)
+
+    def decode_sheets() -> None:
+        MFDataService().mf_txn_table()
+        MFPropertiesService().mf_properties()
+
+    def value_month(fund_level: bool) -> None:
+        asset_value_service.calculate_mf_asset_value(
+            txn_list=portfolio.txn_table,
+            mf_properties=portfolio.mf_properties,
+            mf_api_client=portfolio.mf_api_client,
+            month=portfolio.to_date,
+            assets_to_include=ASSETS,
+            fund_level=fund_level,
+        )
+
+    def value_range(benchmark: bool) -> None:
+        loader = PortfolioLoaderService()
+        calculate_asset_values(
+            loader, portfolio.from_date, portfolio.to_date, ASSETS
+        )
+
+        # As the assetvalue command, without the network lookup of the fund name
+        if benchmark:
+            mf_api_client: MFApiClient = loader.mf_api_client()
+            mf_properties: dict[str, MFProperty] = loader.mf_properties()
+            asset_value_service.calculate_benchmark_asset_values(
+                benchmark_txn_list=loader.mf_data_service().benchmark_txn_data(
+                    mf_properties, mf_api_client, BENCHMARK_AMFI_CODE
+                ),
+                mf_properties=mf_properties,
+                mf_api_client=mf_api_client,
+                amfi_code=BENCHMARK_AMFI_CODE,
+                from_date=portfolio.from_date,
+                to_date=portfolio.to_date,
+                assets_to_include=ASSETS,
+            )
+
+    def summarize(portfolio_name: str | None, country: str | None) -> None:
+        calculate_summary_asset_value(
+            portfolio.to_date, portfolio_name, country, False, None, None
+        )
+
+    return {
+        "nav.load": load_navs,
+        "sheet.decode": decode_sheets,
+        "valuation": lambda: value_month(False),
+        "valuation.fund_level": lambda: value_month(True),
+        "xirr": lambda: solve_xirr(portfolio.portfolio_cashflow),
+        "xirr.batch": lambda: batch_xirr(portfolio.fund_cashflows),
+        "assetvalue": lambda: value_range(False),
+        "assetvalue.benchmark": lambda: value_range(True),
+        "summary": lambda: summarize(None, None),
+        "summary.filtered": lambda: summarize("Core", "India"),
+    }
+
+
+def measure(case: Callable[[], object], repeat: int) -> list[float]:
+    """Returns the wall time of each run of a case, every run starting cold.
+
+    An untimed run goes first, so libraries imported on first use and process pools
+    started on first use are not counted, benchmarks/importtime.py covers imports.
+    """
+    timings: list[float] = []
+
+    for run in range(repeat + 1):
+        # Runs calculate every month, as a run after a change would
+        files.delete_files_in_folder(ResultCacheService._FOLDER_NAME)
+        dates.to_datetime.cache_clear()
+        dates.to_ordinal.cache_clear()
+        gc.collect()
+
+        start: float = time.perf_counter()
+        case()
+        if run > 0:
+            timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def run_size(size: str, args: Namespace) -> dict:
+    transaction_count, fund_count = SIZES[size]
+
+    with tempfile.TemporaryDirectory(prefix=f"benchmark-{size}-") as folder_path:
+        previous_folder_path: str = os.getcwd()
+        os.chdir(folder_path)
+        try:
+            print(
+                f"Generating {size} portfolio of {transaction_count} transactions"
+                f" across {fund_count} funds..."
+            )
+            generate_portfolio(transaction_count, fund_count, args.seed)
+
+            portfolio = Portfolio(args.months)
+            results: dict[str, dict] = {}
+
+            for name, case in cases(portfolio).items():
+                if args.cases is not None and name not in args.cases:
+                    continue
+
+                timings: list[float] = measure(case, args.repeat)
+                results[name] = {
+                    "min": min(timings),
+                    "median": statistics.median(timings),
+                    "runs": timings,
+                }
+                print(
+                    f"{size:>8}  {name:<22}"
+                    f"{format_seconds(results[name]['median']):>12} median"
+                    f"{format_seconds(results[name]['min']):>12} min"
+                )
+        finally:
+            os.chdir(previous_folder_path)
+
+    return {
+        "transactions": transaction_count,
+        "funds": fund_count,
+        "cases": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Prints the change of each case against a baseline, True if none regressed"""
+    passed = True
+
+    print(f"\nChange against baseline of commit {baseline.get('commit') or 'unknown'}:")
+    for size, size_results in results["sizes"].items():
+        baseline_cases: dict = baseline["sizes"].get(size, {}).get("cases", {})
+
+        for name, result in size_results["cases"].items():
+            if name not in baseline_cases:
+                continue
+
+            baseline_median: float = baseline_cases[name]["median"]
+            change: float = result["median"] / baseline_median - 1
+            regressed: bool = change > tolerance
+            passed = passed and not regressed
+
+            print(
+                f"{size:>8}  {name:<22}"
+                f"{format_seconds(baseline_median):>12} ->"
+                f"{format_seconds(result['median']):>12}"
+                f"{change:>+9.1%}{'  slower' if regressed else ''}"
+            )
+
+    return passed
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    return f"{seconds * 1e3:.2f}ms"
+
+
+def git_commit() -> str | None:
+    """Returns the commit the benchmark was run on, None outside a git checkout"""
+    try:
+        result: subprocess.CompletedProcess = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_FOLDER,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def main() -> int:
+    parser = ArgumentParser(
+        description="Time the valuation hot paths on synthetic portfolios offline"
+    )
+    parser.add_argument(
+        "--size",
+        dest="sizes",
+        choices=SIZES.keys(),
+        action="append",
+        help="portfolio size to run, repeatable, defaulted to small and medium. "
+        + ", ".join(
+            f"{size} has {transactions} transactions across {funds} funds"
+            for size, (transactions, funds) in SIZES.items()
+        ),
+    )
+    parser.add_argument(
+        "--case",
+        dest="cases",
+        action="append",
+        help="case to run, repeatable, defaulted to all cases",
+    )
+    parser.add_argument(
+        "--repeat",
+        dest="repeat",
+        type=int,
+        default=5,
+        help="runs of each case, the median is compared, defaulted to 5",
+    )
+    parser.add_argument(
+        "--months",
+        dest="months",
+        type=int,
+        default=24,
+        help="months of the assetvalue cases, up to the last month of the NAV"
+        " histories, defaulted to 24",
+    )
+    parser.add_argument(
+        "--seed",
+        dest="seed",
+        type=int,
+        default=0,
+        help="seed of the synthetic portfolios, defaulted to 0",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="file",
+        dest="output_path",
+        help="save the results as JSON, to compare later runs against",
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="file",
+        dest="baseline_path",
+        help="compare with the results of an earlier run, saved with --output",
+    )
+    parser.add_argument(
+        "--tolerance",
+        metavar="%",
+        dest="tolerance",
+        type=float,
+        default=10,
+        help="slowdown of a median against the baseline counted as a regression,"
+        " defaulted to 10",
+    )
+    args: Namespace = parser.parse_args()
+
+    results: dict = {
+        "version": RESULTS_VERSION,
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"repeat": args.repeat, "months": args.months, "seed": args.seed},
+        "sizes": {
+            size: run_size(size, args) for size in args.sizes or ["small", "medium"]
+        },
+    }
+
+    if args.output_path is not None:
+        with open(args.output_path, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"\nSaved results to {args.output_path}")
+
+    if args.baseline_path is not None:
+        with open(args.baseline_path) as file:
+            baseline: dict = json.load(file)
+
+        if baseline.get("settings") != results["settings"]:
+            print("Baseline was run with other settings, timings may not compare")
+        if not compare(results, baseline, args.tolerance / 100):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+features.batch_reports
+~~~~~~~~~~~~~~
+
+This module contains a method which calculates the summary of every portfolio of a manifest.
+
+"""
+
+import json
+import logging
+import sys
+from argparse import Namespace
+from datetime import datetime
+
+from models.asset_value import AssetValue
+from models.portfolio_config import PortfolioConfig
+from services.batch_service import BatchService
+from utils import files
+from utils.dates import to_month_year
+from utils.functions import format_inr, print_header, print_table
+
+
+def calculate_batch_summaries(args: Namespace) -> None:
+    # Parse arguments
+    manifest_path: str = args.manifest
+    month: datetime = args.date
+    workers: int = args.workers
+    output_folder: str | None = args.output_folder
+    override_cache: bool = args.override_cache
+    processes: bool = args.processes
+
+    configs: list[PortfolioConfig] = read_manifest(manifest_path)
+
+    results: list[tuple[PortfolioConfig, AssetValue | None]] = BatchService(
+        configs, workers, override_cache, processes
+    ).calculate_summaries(month)
+
+    # Print values and returns of every portfolio
+    print_header(f"Portfolio Summaries as on {to_month_year(month)}:")
+    print_table(
+        [("", "Invested", "Current", "Unrealized", "Realized", "XIRR")]
+        + [
+            (
+                (config.name,) + format_summary(asset_value.data)
+                if asset_value is not None
+                else (config.name, "Failed", "", "", "", "")
+            )
+            for config, asset_value in results
+        ]
+    )
+
+    if output_folder is not None:
+        for config, asset_value in results:
+            if asset_value is not None:
+                files.save_file_as_json(
+                    output_folder, config.name, {"asset_value": asset_value.to_dict()}
+                )
+        logging.info("Saved portfolio summaries to %s", output_folder)
+
+    failed: list[str] = [
+        config.name for config, asset_value in results if asset_value is None
+    ]
+    if len(failed) > 0:
+        logging.error("Failed to calculate %s: %s", len(failed), ", ".join(failed))
+        sys.exit(1)
+
+
+def read_manifest(manifest_path: str) -> list[PortfolioConfig]:
+    """Reads the portfolios of a manifest, exiting if the manifest is not valid"""
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            json_data: dict = json.load(f)
+
+        configs: list[PortfolioConfig] = [
+            PortfolioConfig.from_dict(portfolio)
+            for portfolio in json_data["portfolios"]
+        ]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logging.error("Could not read manifest %s: %s", manifest_path, e)
+        sys.exit(1)
+
+    names: list[str] = [config.name for config in configs]
+    duplicates: set[str] = {name for name in names if names.count(name) > 1}
+    if len(duplicates) > 0:
+        logging.error(
+            "Duplicate portfolio names in manifest: %s", ", ".join(sorted(duplicates))
+        )
+        sys.exit(1)
+
+    logging.info("Read %s portfolios from %s", len(configs), manifest_path)
+
+    return configs
+
+
+def format_summary(data: AssetValue.Data) -> tuple[str, ...]:
+    return (
+        format_inr(data.invested_value),
+        format_inr(data.current_value),
+        format_inr(data.current_value - data.invested_value),
+        format_inr(data.realized),
+        str(round(data.xirr * 100, 2)) + "%",
+    )
@@ -0,0 +1,203 @@
+"""
+features.cache_report
+~~~~~~~~~~~~~~
+
+This module contains methods which report on, verify and prune the cache folders.
+
+"""
+
+import logging
+import os
+import sys
+from argparse import Namespace
+from datetime import datetime
+
+from models.cache_entry import CacheEntry
+from services.cache_service import CacheService
+from utils import cache_counters
+from utils.dates import to_datestring
+from utils.functions import print_header, print_table
+
+
+def inspect_cache(args: Namespace) -> None:
+    # Parse arguments
+    cache_command: str = args.cache_command
+
+    if cache_command == "stats":
+        print_cache_stats(args)
+    elif cache_command == "verify":
+        verify_cache()
+    elif cache_command == "prune":
+        prune_cache(args)
+
+
+def print_cache_stats(args: Namespace) -> None:
+    # Parse arguments
+    reset_counters: bool = args.reset_counters
+
+    cache_service = CacheService()
+    entries: list[CacheEntry] = cache_service.entries()
+    now: datetime = datetime.now()
+
+    # Folders of batch portfolios are summed up by the cache they hold
+    folders: dict[str, list[CacheEntry]] = {}
+    for entry in entries:
+        folder_parts: list[str] = entry.folder_name.split(os.sep)
+        if len(folder_parts) == 3:
+            folder_parts[1] = "*"
+        folders.setdefault(os.path.join(*folder_parts), []).append(entry)
+
+    print_header("Cache Folders:")
+    print_table(
+        [("", "Entries", "Size", "Partial", "Legacy", "Oldest", "Newest")]
+        + [
+            (
+                folder_name,
+                sum(1 for entry in folder if entry.kind == CacheEntry.CACHE),
+                format_size(sum(entry.size for entry in folder)),
+                sum(1 for entry in folder if entry.kind == CacheEntry.PARTIAL),
+                sum(1 for entry in folder if entry.kind == CacheEntry.LEGACY),
+                format_age(now, min(entry.modified_time for entry in folder)),
+                format_age(now, max(entry.modified_time for entry in folder)),
+            )
+            for folder_name, folder in folders.items()
+        ]
+    )
+
+    # Schemes furthest behind today come first, unreadable ones last
+    nav_rows: list[tuple] = []
+    for amfi_code, entry in cache_service.nav_entries(entries).items():
+        nav_range: tuple[int, datetime, datetime] | None = cache_service.nav_range(
+            amfi_code
+        )
+        if nav_range is None:
+            nav_rows.append((amfi_code, "Unreadable", format_size(entry.size)))
+            continue
+
+        navs, first_date, last_date = nav_range
+        nav_rows.append(
+            (
+                amfi_code,
+                navs,
+                format_size(entry.size),
+                to_datestring(first_date),
+                to_datestring(last_date),
+                (now - last_date).days,
+                format_age(now, entry.modified_time),
+            )
+        )
+    nav_rows.sort(key=lambda row: -row[5] if len(row) > 3 else float("inf"))
+
+    print_header(f"NAV Histories ({len(nav_rows)}):")
+    print_table(
+        [("AMFI Code", "NAVs", "Size", "First NAV", "Last NAV", "Days Behind", "Cached")]
+        + nav_rows
+    )
+
+    counters: dict = cache_counters.load()
+
+    print_header(f"Cache Counters since {counters['since'] or 'now'}:")
+    print_table(
+        [("", "Hits", "Misses", "Fetches", "Hit Rate")]
+        + [
+            (
+                cache,
+                counts["hits"],
+                counts["misses"],
+                counts["fetches"],
+                format_hit_rate(counts),
+            )
+            for cache, counts in sorted(counters["caches"].items())
+        ]
+    )
+
+    if reset_counters:
+        cache_counters.reset()
+        logging.info("Reset cache counters")
+
+
+def verify_cache() -> None:
+    cache_service = CacheService()
+    entries: list[CacheEntry] = cache_service.entries()
+
+    problems: dict[str, str] = cache_service.verify(entries)
+
+    if len(problems) == 0:
+        logging.info("Verified %s cache files, all are readable", len(entries))
+        return
+
+    print_header(f"Unreadable Cache Files ({len(problems)}):")
+    print_table(sorted(problems.items()))
+
+    logging.error(
+        "Found %s unreadable cache files, remove them with: cache prune --corrupt",
+        len(problems),
+    )
+    sys.exit(1)
+
+
+def prune_cache(args: Namespace) -> None:
+    # Parse arguments
+    folder_name: str | None = args.folder_name
+    portfolio: str | None = args.portfolio
+    amfi_codes: list[int] | None = args.amfi_codes
+    older_than_days: float | None = args.older_than_days
+    corrupt: bool = args.corrupt
+    legacy: bool = args.legacy
+    dry_run: bool = args.dry_run
+
+    # Pruning everything must be asked for, by selecting the folders one by one
+    if not (corrupt or legacy) and all(
+        selection is None
+        for selection in [folder_name, portfolio, amfi_codes, older_than_days]
+    ):
+        logging.error("Select the cache entries to prune, see: cache prune --help")
+        sys.exit(1)
+
+    cache_service = CacheService()
+    selected: list[CacheEntry] = cache_service.select(
+        cache_service.entries(),
+        folder_name=folder_name,
+        portfolio=portfolio,
+        amfi_codes=amfi_codes,
+        older_than_days=older_than_days,
+        corrupt=corrupt,
+        legacy=legacy,
+    )
+
+    if len(selected) == 0:
+        logging.info("No cache entries match the selection")
+        return
+
+    size: int = cache_service.prune(selected, dry_run)
+
+    print_header(
+        f"{'Would Remove' if dry_run else 'Removed'} {len(selected)} Cache Files"
+        f" ({format_size(size)}):"
+    )
+    print_table([(entry.path, format_size(entry.size)) for entry in selected])
+
+
+def format_size(size: int) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_age(now: datetime, time: datetime) -> str:
+    """Formats the time since a file was written in the largest whole unit"""
+    seconds: float = (now - time).total_seconds()
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h ago"
+    return f"{int(seconds // 86400)}d ago"
+
+
+def format_hit_rate(counts: dict[str, int]) -> str:
+    lookups: int = counts["hits"] + counts["misses"]
+    if lookups == 0:
+        return ""
+    return f"{counts['hits'] / lookups:.1%}"
@@ -0,0 +1,113 @@
+"""
+features.mf_correlation
+~~~~~~~~~~~~~~
+
+This module contains a method which calculates correlation of returns between held mutual funds.
+
+"""
+
+import logging
+from argparse import Namespace
+from datetime import datetime
+
+import numpy as np
+
+from apis.mf_api_client import MFApiClient
+from models.asset_value import AssetValue
+from models.mf_property import MFProperty
+from models.transaction_table import TransactionTable
+from services.asset_value_service import AssetValueService
+from services.nav_matrix_service import NavMatrixService
+from services.portfolio_loader_service import PortfolioLoaderService
+from utils.dates import to_datestring
+from utils.functions import print_header, print_table
+
+# Number of most correlated pairs to list
+TOP_PAIRS = 10
+
+
+def calculate_fund_correlation(args: Namespace) -> None:
+    # Parse arguments
+    from_date: datetime | None = args.from_date
+    to_date: datetime = args.to_date
+    frequency: str = args.frequency
+    portfolio: str = args.portfolio
+    country: str = args.country
+    override_cache: bool = args.override_cache
+    source: str | None = args.source
+    properties_source: str | None = args.properties_source
+
+    # Start loading transactions, properties and NAV prices in parallel
+    loader = PortfolioLoaderService(override_cache, source, properties_source)
+
+    # Get transactions
+    mf_txn_table: TransactionTable = loader.mf_data_service().mf_txn_table()
+
+    # Get properties
+    mf_api_client: MFApiClient = loader.mf_api_client()
+    mf_properties: dict[str, MFProperty] = loader.mf_properties()
+
+    # Calculate which type of assets to include
+    assets_to_include: list[str] = ["equity", "elss", "debt", "arbitrage"]
+
+    # Funds held at the end of the window
+    asset_value: AssetValue = AssetValueService().calculate_mf_asset_value(
+        txn_list=mf_txn_table,
+        mf_properties=mf_properties,
+        mf_api_client=mf_api_client,
+        month=to_date,
+        assets_to_include=assets_to_include,
+        portfolio=portfolio,
+        country=country,
+    )
+
+    funds: list[str] = sorted(asset_value.meta_dict.keys())
+    if len(funds) < 2:
+        logging.error("At least 2 held funds are required to calculate correlation")
+        return
+
+    grid, returns = NavMatrixService(mf_api_client).return_matrix(
+        [mf_properties[fund].amfi_code for fund in funds],
+        frequency=frequency,
+        to_date=to_date,
+    )
+
+    if from_date is not None:
+        mask: np.ndarray = grid >= from_date.toordinal()
+        grid, returns = grid[mask], returns[:, mask]
+
+    if len(grid) < 3:
+        logging.error("Not enough common NAV history in the selected window")
+        return
+
+    correlation: np.ndarray = np.corrcoef(returns)
+
+    print_header(
+        f"Correlation of {frequency} returns from {to_datestring(datetime.fromordinal(int(grid[0])))} "
+        f"to {to_datestring(datetime.fromordinal(int(grid[-1])))} ({len(grid)} returns)"
+    )
+
+    print_table(
+        [("", "") + tuple(str(i + 1) for i in range(len(funds)))]
+        + [
+            (str(i + 1), fund)
+            + tuple(str(round(value, 2)) for value in correlation[i])
+            for i, fund in enumerate(funds)
+        ]
+    )
+
+    # List the most correlated pairs from the upper triangle
+    rows, cols = np.triu_indices(len(funds), k=1)
+    pair_order: np.ndarray = np.argsort(correlation[rows, cols])[::-1][:TOP_PAIRS]
+
+    print_header("Most Correlated Pairs")
+    print_table(
+        [
+            (
+                funds[rows[i]],
+                funds[cols[i]],
+                str(round(correlation[rows[i], cols[i]], 2)),
+            )
+            for i in pair_order
+        ]
+    )
@@ -11,13 +11,18 @@ from datetime import datetime
 from decimal import Decimal
 
 from apis.mf_api_client import MFApiClient
+from apis.report_server_client import ReportServerClient
+from features.watch_reports import watch_report
 from models.asset_value import AssetValue
+from models.attribution import Attribution
 from models.mf_property import MFProperty
-from models.mf_transaction import MFTransaction
+from models.transaction_table import TransactionTable
 from services.asset_value_service import AssetValueService
 from services.mf_data_service import MFDataService
-from services.mf_properties_service import MFPropertiesService
-from utils import dates
+from services.portfolio_loader_service import PortfolioLoaderService
+from services.portfolio_state_service import PortfolioStateService
+from services.result_cache_service import ResultCacheService
+from utils import dates, files
 from utils.functions import format_inr, print_header, print_table
 
 HEADERS: list = [
@@ -41,19 +46,13 @@ def calculate_monthly_asset_value(args: Namespace):
     equity_benchmark: int = args.equity_benchmark
     equity_only: bool = args.equity
     override_cache: bool = args.override_cache
-
-    # Get transactions
-    mf_data_service: MFDataService = MFDataService(override_cache)
-    mf_txn_list: list[MFTransaction] = mf_data_service.mf_txn_data()
-
-    # Get properties
-    mf_api_client = MFApiClient(override_cache)
-    mf_properties: dict[str, MFProperty] = MFPropertiesService(
-        override_cache
-    ).mf_properties()
-
-    # Initialize asset value service
-    asset_value_service = AssetValueService()
+    source: str | None = args.source
+    properties_source: str | None = args.properties_source
+    export_path: str | None = args.export_path
+    is_attribution: bool = args.attribution or export_path is not None
+    watch: bool = args.watch
+    interval_minutes: float = args.interval_minutes
+    verbose: bool = args.verbose
 
     # Calculate which type of assets to include
     assets_to_include: list[str] = ["equity", "elss"]
@@ -61,25 +60,131 @@ def calculate_monthly_asset_value(args: Namespace):
         assets_to_include.append("debt")
         assets_to_include.append("arbitrage")
 
+    # Watch keeps the portfolio in memory and redraws the report whenever it changes
+    if watch:
+        watch_monthly_asset_value(
+            from_date,
+            to_date,
+            assets_to_include,
+            equity_benchmark if is_benchmark else None,
+            is_attribution,
+            export_path,
+            source,
+            properties_source,
+            interval_minutes,
+            verbose,
+        )
+        return
+
+    # Forward to a running report server, which has the portfolio in memory
+    server_client: ReportServerClient | None = None
+    if not args.local and not override_cache:
+        server_client = ReportServerClient.connect(source, properties_source)
+
+    # Inputs are loaded only if a report is calculated locally
+    loader: PortfolioLoaderService | None = None
+
     print(
         f"\nCalculating asset value from {dates.to_month_year(from_date)} to {dates.to_month_year(to_date)}...\n"
     )
 
-    mf_asset_value_data: list[AssetValue.Data] = []
+    mf_asset_values: list[AssetValue] | None = (
+        server_client.asset_values(from_date, to_date, equity_only)
+        if server_client is not None
+        else None
+    )
 
-    # Calculate asset value for each month
-    month: datetime = from_date
-    while month <= to_date:
-        mf_asset_value_data.append(
-            asset_value_service.calculate_mf_asset_value(
-                txn_list=mf_txn_list,
-                mf_properties=mf_properties,
-                mf_api_client=mf_api_client,
-                month=month,
-                assets_to_include=assets_to_include,
-            ).data
+    if mf_asset_values is None:
+        loader = PortfolioLoaderService(override_cache, source, properties_source)
+        mf_asset_values = calculate_asset_values(
+            loader, from_date, to_date, assets_to_include
         )
-        month = dates.add_month(month)
+
+    print_asset_values(mf_asset_values, is_attribution, export_path)
+
+    # If benchmark flag is present, calculate benchmark returns
+    if is_benchmark:
+        benchmark: tuple[str, list[AssetValue]] | None = (
+            server_client.benchmark(equity_benchmark, from_date, to_date, equity_only)
+            if server_client is not None
+            else None
+        )
+
+        if benchmark is None:
+            if loader is None:
+                loader = PortfolioLoaderService(
+                    override_cache, source, properties_source
+                )
+            benchmark = calculate_benchmark_asset_values(
+                loader, equity_benchmark, from_date, to_date, assets_to_include
+            )
+
+        benchmark_fund_name, benchmark_asset_values = benchmark
+
+        print_benchmark(
+            mf_asset_values,
+            benchmark_fund_name,
+            benchmark_asset_values,
+            from_date,
+            to_date,
+        )
+
+
+def watch_monthly_asset_value(
+    from_date: datetime,
+    to_date: datetime,
+    assets_to_include: list[str],
+    equity_benchmark: int | None,
+    is_attribution: bool,
+    export_path: str | None,
+    source: str | None,
+    properties_source: str | None,
+    interval_minutes: float,
+    verbose: bool,
+) -> None:
+    state = PortfolioStateService(source, properties_source)
+
+    # A range up to last month grows by a month once it has ended, a single month moves
+    follows_last_month: bool = to_date == dates.get_last_month_date()
+    is_single_month: bool = from_date == to_date
+
+    def draw() -> None:
+        last_month: datetime = dates.get_last_month_date()
+        report_to_date: datetime = last_month if follows_last_month else to_date
+        report_from_date: datetime = (
+            report_to_date if is_single_month else from_date
+        )
+
+        print(
+            f"\nCalculating asset value from {dates.to_month_year(report_from_date)} to {dates.to_month_year(report_to_date)}...\n"
+        )
+
+        mf_asset_values: list[AssetValue] = state.asset_values(
+            report_from_date, report_to_date, assets_to_include
+        )
+        print_asset_values(mf_asset_values, is_attribution, export_path)
+
+        if equity_benchmark is not None:
+            benchmark_fund_name, benchmark_asset_values = state.benchmark_asset_values(
+                equity_benchmark, report_from_date, report_to_date, assets_to_include
+            )
+            print_benchmark(
+                mf_asset_values,
+                benchmark_fund_name,
+                benchmark_asset_values,
+                report_from_date,
+                report_to_date,
+            )
+
+    watch_report(state, draw, interval_minutes, verbose)
+
+
+def print_asset_values(
+    mf_asset_values: list[AssetValue], is_attribution: bool, export_path: str | None
+) -> None:
+    mf_asset_value_data: list[AssetValue.Data] = [
+        asset_value.data for asset_value in mf_asset_values
+    ]
 
     # Print results
     print("\t".join(HEADERS))
@@ -89,59 +194,122 @@ def calculate_monthly_asset_value(args: Namespace):
     # Print summary
     print_summary(mf_asset_value_data, "Overall Portfolio")
 
-    # If benchmark flag is present, calculate benchmark returns
-    if is_benchmark:
-        # Get benchmark name
-        benchmark_fund_name: str = mf_api_client.get_fund_name(equity_benchmark)
+    # If attribution flag is present, split monthly change into new money and market
+    if is_attribution:
+        # Attribution is built on numpy, which is only loaded when it is requested
+        from services.attribution_service import AttributionService
 
-        print(f"\nSimulating portfolio with benchmark set to {benchmark_fund_name}...")
+        attributions: list[Attribution] = AttributionService().calculate_attribution(
+            mf_asset_values
+        )
 
-        # Get benchmark transactions
-        benchmark_txn_list = []
-        if is_benchmark:
-            benchmark_txn_list: list[MFTransaction] = (
-                mf_data_service.benchmark_txn_data(
-                    mf_properties, mf_api_client, equity_benchmark
-                )
+        print_attribution(attributions)
+
+        if export_path is not None:
+            files.export_rows(
+                export_path,
+                [row for attribution in attributions for row in attribution.to_rows()],
             )
+            print(f"\nExported attribution to {export_path}")
 
-        # Creating fake entry
-        mf_properties["Benchmark"] = MFProperty(
-            equity_benchmark, "Benchmark", "Equity", "India"
-        )
 
-        print(
-            f"\nCalculating benchmark value from {dates.to_month_year(from_date)} to {dates.to_month_year(to_date)}...\n"
-        )
+def print_benchmark(
+    mf_asset_values: list[AssetValue],
+    benchmark_fund_name: str,
+    benchmark_asset_values: list[AssetValue],
+    from_date: datetime,
+    to_date: datetime,
+) -> None:
+    print(f"\nSimulating portfolio with benchmark set to {benchmark_fund_name}...")
+
+    print(
+        f"\nCalculating benchmark value from {dates.to_month_year(from_date)} to {dates.to_month_year(to_date)}...\n"
+    )
 
-        benchmark_asset_value_data: list[AssetValue.Data] = []
-
-        # Calculate benchmark value for each month
-        month = from_date
-        while month <= to_date:
-            benchmark_asset_value_data.append(
-                asset_value_service.calculate_mf_asset_value(
-                    txn_list=benchmark_txn_list,
-                    mf_properties=mf_properties,
-                    mf_api_client=mf_api_client,
-                    month=month,
-                    assets_to_include=assets_to_include,
-                ).data
+    benchmark_asset_value_data: list[AssetValue.Data] = [
+        asset_value.data for asset_value in benchmark_asset_values
+    ]
+
+    # Print results
+    print("\t".join(HEADERS))
+    for data in benchmark_asset_value_data:
+        print(data)
+
+    # Print comparison with benchmark
+    print_comparison(
+        [asset_value.data for asset_value in mf_asset_values],
+        "Overall Portfolio",
+        benchmark_asset_value_data,
+        benchmark_fund_name,
+    )
+
+
+def calculate_asset_values(
+    loader: PortfolioLoaderService,
+    from_date: datetime,
+    to_date: datetime,
+    assets_to_include: list[str],
+) -> list[AssetValue]:
+    # Get transactions
+    mf_txn_table: TransactionTable = loader.mf_data_service().mf_txn_table()
+
+    # Get properties
+    mf_api_client: MFApiClient = loader.mf_api_client()
+    mf_properties: dict[str, MFProperty] = loader.mf_properties()
+
+    mf_asset_values: list[AssetValue] = []
+
+    # Months not affected by changes since the last run are reused from cache
+    result_cache_service = ResultCacheService(
+        mf_txn_table, mf_properties, mf_api_client
+    )
+
+    # Calculate asset value for each month
+    month: datetime = from_date
+    while month <= to_date:
+        mf_asset_values.append(
+            result_cache_service.calculate_mf_asset_value(
+                month=month,
+                assets_to_include=assets_to_include,
             )
-            month: datetime = dates.add_month(month)
-
-        # Print results
-        print("\t".join(HEADERS))
-        for data in benchmark_asset_value_data:
-            print(data)
-
-        # Print comparison with benchmark
-        print_comparison(
-            mf_asset_value_data,
-            "Overall Portfolio",
-            benchmark_asset_value_data,
-            benchmark_fund_name,
         )
+        month = dates.add_month(month)
+
+    result_cache_service.save()
+
+    return mf_asset_values
+
+
+def calculate_benchmark_asset_values(
+    loader: PortfolioLoaderService,
+    equity_benchmark: int,
+    from_date: datetime,
+    to_date: datetime,
+    assets_to_include: list[str],
+) -> tuple[str, list[AssetValue]]:
+    mf_data_service: MFDataService = loader.mf_data_service()
+    mf_api_client: MFApiClient = loader.mf_api_client()
+    mf_properties: dict[str, MFProperty] = loader.mf_properties()
+
+    # Get benchmark name
+    benchmark_fund_name: str = mf_api_client.get_fund_name(equity_benchmark)
+
+    # Equity transactions are replaced with units of the benchmark fund
+    benchmark_asset_values: list[AssetValue] = (
+        AssetValueService().calculate_benchmark_asset_values(
+            benchmark_txn_list=mf_data_service.benchmark_txn_data(
+                mf_properties, mf_api_client, equity_benchmark
+            ),
+            mf_properties=mf_properties,
+            mf_api_client=mf_api_client,
+            amfi_code=equity_benchmark,
+            from_date=from_date,
+            to_date=to_date,
+            assets_to_include=assets_to_include,
+        )
+    )
+
+    return benchmark_fund_name, benchmark_asset_values
 
 
 def print_summary(monthly_asset_value_data: list[AssetValue.Data], portfolio_name):
@@ -230,6 +398,54 @@ def print_summary(monthly_asset_value_data: list[AssetValue.Data], portfolio_nam
     )
 
 
+def print_attribution(attributions: list[Attribution]):
+    from services.attribution_service import AttributionService
+
+    if len(attributions) == 0:
+        return
+
+    print_header(
+        f"\nAttribution from {dates.to_month_year(attributions[0].from_month)} to {dates.to_month_year(attributions[-1].to_month)}\n"
+    )
+
+    print_table(
+        [("Month", "Change", "New Money", "Market")]
+        + [
+            (
+                dates.to_month_year(attribution.to_month),
+                format_inr(attribution.total.total),
+                format_inr(attribution.total.new_money),
+                format_inr(attribution.total.market),
+            )
+            for attribution in attributions
+        ]
+    )
+
+    total: Attribution = AttributionService().total_attribution(attributions)
+
+    for label, splits in (
+        ("By Asset Type", total.by_asset),
+        ("By Portfolio", total.by_portfolio),
+        ("By Country", total.by_country),
+        ("By Mutual Funds", total.by_fund),
+    ):
+        print_header(f"\n{label} ({len(splits)})\n")
+        print_table(
+            [("", "Change", "New Money", "Market")]
+            + [
+                (
+                    name,
+                    format_inr(split.total),
+                    format_inr(split.new_money),
+                    format_inr(split.market),
+                )
+                for name, split in sorted(
+                    splits.items(), key=lambda item: item[1].total, reverse=True
+                )
+            ]
+        )
+
+
 def print_comparison(
     portfolio_asset_value_data: list[AssetValue.Data],
     portfolio_name,
@@ -0,0 +1,142 @@
+"""
+features.mf_projection
+~~~~~~~~~~~~~~
+
+This module contains a method which projects future mutual fund portfolio value.
+
+"""
+
+import logging
+from argparse import Namespace
+from datetime import datetime
+
+import numpy as np
+
+from apis.mf_api_client import MFApiClient
+from models.asset_value import AssetValue
+from models.mf_property import MFProperty
+from models.projection import PERCENTILES, Projection
+from models.transaction_table import TransactionTable
+from services.asset_value_service import AssetValueService
+from services.nav_matrix_service import NavMatrixService
+from services.portfolio_loader_service import PortfolioLoaderService
+from services.projection_service import ProjectionService
+from utils.dates import to_datestring, to_month_year
+from utils.functions import format_inr, print_header, print_table
+
+
+def project_portfolio_value(args: Namespace) -> None:
+    # Parse arguments
+    month: datetime = args.date
+    years: int = args.years
+    monthly_sip: float = args.sip
+    target: float | None = args.target
+    paths: int = args.paths
+    daily: bool = args.frequency == "daily"
+    workers: int = args.workers
+    seed: int | None = args.seed
+    portfolio: str = args.portfolio
+    country: str = args.country
+    override_cache: bool = args.override_cache
+    source: str | None = args.source
+    properties_source: str | None = args.properties_source
+
+    # Start loading transactions, properties and NAV prices in parallel
+    loader = PortfolioLoaderService(override_cache, source, properties_source)
+
+    # Get transactions
+    mf_txn_table: TransactionTable = loader.mf_data_service().mf_txn_table()
+
+    # Get properties
+    mf_api_client: MFApiClient = loader.mf_api_client()
+    mf_properties: dict[str, MFProperty] = loader.mf_properties()
+
+    # Calculate which type of assets to include
+    assets_to_include: list[str] = ["equity", "elss", "debt", "arbitrage"]
+
+    # Current holdings are the starting point of every path
+    asset_value: AssetValue = AssetValueService().calculate_mf_asset_value(
+        txn_list=mf_txn_table,
+        mf_properties=mf_properties,
+        mf_api_client=mf_api_client,
+        month=month,
+        assets_to_include=assets_to_include,
+        portfolio=portfolio,
+        country=country,
+    )
+
+    funds: list[str] = list(asset_value.meta_dict.keys())
+    if len(funds) == 0:
+        logging.error("No holdings found as on %s", to_month_year(month))
+        return
+
+    fund_values: np.ndarray = np.array(
+        [
+            float(meta.qty * meta.price)
+            for meta in asset_value.meta_dict.values()
+        ]
+    )
+    start_value: float = float(fund_values.sum())
+
+    grid, return_matrix = NavMatrixService(mf_api_client).return_matrix(
+        [mf_properties[fund].amfi_code for fund in funds],
+        frequency=args.frequency,
+        to_date=month,
+    )
+
+    if len(grid) == 0:
+        logging.error("Not enough NAV history to sample returns from")
+        return
+
+    print(
+        f"\nSimulating {paths} paths over {years} years from {args.frequency} returns "
+        f"between {to_datestring(datetime.fromordinal(int(grid[0])))} and "
+        f"{to_datestring(datetime.fromordinal(int(grid[-1])))}...\n"
+    )
+
+    projection: Projection = ProjectionService().project(
+        weights=fund_values / start_value,
+        return_matrix=return_matrix,
+        start_value=start_value,
+        years=years,
+        monthly_sip=monthly_sip,
+        paths=paths,
+        daily=daily,
+        target=target,
+        workers=workers,
+        seed=seed,
+    )
+
+    print_projection(projection, target)
+
+
+def print_projection(projection: Projection, target: float | None) -> None:
+    print_header("Projection")
+    print_table(
+        [
+            ("Current", format_inr(projection.start_value)),
+            ("Paths", str(projection.paths)),
+            ("Sampled Returns", str(projection.history_length)),
+        ]
+    )
+
+    headers: tuple = ("Year", "Invested") + tuple(f"P{p}" for p in PERCENTILES)
+    if target is not None:
+        headers += (f">= {format_inr(target)}",)
+
+    print_header("Value Percentiles")
+    print_table(
+        [headers]
+        + [
+            (str(year.year), format_inr(round(year.invested_value)))
+            + tuple(
+                format_inr(round(year.percentiles[p])) for p in PERCENTILES
+            )
+            + (
+                (str(round(year.target_probability * 100, 2)) + "%",)
+                if year.target_probability is not None
+                else ()
+            )
+            for year in projection.years
+        ]
+    )
@@ -0,0 +1,126 @@
+"""
+features.mf_risk
+~~~~~~~~~~~~~~
+
+This module contains a method which calculates risk metrics of the mutual fund portfolio.
+
+"""
+
+from argparse import Namespace
+from datetime import datetime
+
+from apis.mf_api_client import MFApiClient
+from models.mf_property import MFProperty
+from models.mf_transaction import MFTransaction
+from models.risk_metrics import RiskMetrics
+from services.portfolio_loader_service import PortfolioLoaderService
+from services.risk_service import RiskService
+from utils.dates import to_datestring, to_month_year
+from utils.functions import print_header, print_table
+
+
+def calculate_risk_metrics(args: Namespace) -> None:
+    # Parse arguments
+    from_date: datetime | None = args.from_date
+    to_date: datetime = args.to_date
+    risk_free_rate: float = args.risk_free_rate / 100
+    portfolio: str = args.portfolio
+    country: str = args.country
+    override_cache: bool = args.override_cache
+    source: str | None = args.source
+    properties_source: str | None = args.properties_source
+
+    # Start loading transactions, properties and NAV prices in parallel
+    loader = PortfolioLoaderService(override_cache, source, properties_source)
+
+    # Get transactions
+    mf_txn_list: list[MFTransaction] = loader.mf_data_service().mf_txn_data()
+
+    # Get properties
+    mf_api_client: MFApiClient = loader.mf_api_client()
+    mf_properties: dict[str, MFProperty] = loader.mf_properties()
+
+    # Calculate which type of assets to include
+    assets_to_include: list[str] = ["equity", "elss", "debt", "arbitrage"]
+
+    portfolio_metrics, fund_metrics = RiskService().calculate_risk_metrics(
+        txn_list=mf_txn_list,
+        mf_properties=mf_properties,
+        mf_api_client=mf_api_client,
+        from_date=from_date,
+        to_date=to_date,
+        risk_free_rate=risk_free_rate,
+        assets_to_include=assets_to_include,
+        portfolio=portfolio,
+        country=country,
+    )
+
+    print_header(
+        f"Portfolio Risk as on {to_month_year(to_date)} (Risk free rate {round(risk_free_rate * 100, 2)}%)"
+    )
+    print_table(
+        [
+            ("Volatility", format_pct(portfolio_metrics.volatility)),
+            ("Downside Deviation", format_pct(portfolio_metrics.downside_deviation)),
+            ("Sharpe", format_ratio(portfolio_metrics.sharpe)),
+            ("Sortino", format_ratio(portfolio_metrics.sortino)),
+            ("Max Drawdown", format_pct(portfolio_metrics.max_drawdown)),
+            ("Peak", format_date(portfolio_metrics.peak_date)),
+            ("Trough", format_date(portfolio_metrics.trough_date)),
+            ("Recovered", format_date(portfolio_metrics.recovery_date)),
+            ("Recovery Days", format_days(portfolio_metrics)),
+        ]
+    )
+
+    print_header(f"By Mutual Funds ({len(fund_metrics)})")
+    print_table(
+        [
+            (
+                "",
+                "Volatility",
+                "Downside",
+                "Sharpe",
+                "Sortino",
+                "Max DD",
+                "Peak",
+                "Trough",
+                "Recovered",
+                "Days",
+            )
+        ]
+        + [
+            (
+                fund,
+                format_pct(metrics.volatility),
+                format_pct(metrics.downside_deviation),
+                format_ratio(metrics.sharpe),
+                format_ratio(metrics.sortino),
+                format_pct(metrics.max_drawdown),
+                format_date(metrics.peak_date),
+                format_date(metrics.trough_date),
+                format_date(metrics.recovery_date),
+                format_days(metrics),
+            )
+            for fund, metrics in sorted(
+                fund_metrics.items(), key=lambda item: item[1].volatility, reverse=True
+            )
+        ]
+    )
+
+
+def format_pct(value: float) -> str:
+    return str(round(value * 100, 2)) + "%"
+
+
+def format_ratio(value: float | None) -> str:
+    return str(round(value, 2)) if value is not None else "-"
+
+
+def format_date(date: datetime | None) -> str:
+    return to_datestring(date) if date is not None else "-"
+
+
+def format_days(metrics: RiskMetrics) -> str:
+    if metrics.recovery_days is not None:
+        return str(metrics.recovery_days)
+    return "Not recovered" if metrics.trough_date is not None else "-"
@@ -11,15 +11,21 @@ from datetime import datetime
 from decimal import Decimal
 
 from apis.mf_api_client import MFApiClient
+from apis.report_server_client import ReportServerClient
+from features.watch_reports import watch_report
 from models.asset_value import AssetValue
 from models.mf_property import MFProperty
-from models.mf_transaction import MFTransaction
-from services.asset_value_service import AssetValueService
+from models.transaction_table import TransactionTable
 from services.mf_data_service import MFDataService
-from services.mf_properties_service import MFPropertiesService
-from utils.dates import to_month_year
+from services.portfolio_loader_service import PortfolioLoaderService
+from services.portfolio_state_service import PortfolioStateService
+from services.result_cache_service import ResultCacheService
+from utils.dates import get_last_month_date, to_month_year
 from utils.functions import format_inr, print_header, print_table
 
+# Asset types included in the summary
+ASSETS: list[str] = ["equity", "elss", "debt", "arbitrage"]
+
 
 def calculate_portfolio_summary(args: Namespace) -> None:
     # Parse arguments
@@ -27,38 +33,81 @@ def calculate_portfolio_summary(args: Namespace) -> None:
     portfolio: str = args.portfolio
     country: str = args.country
     override_cache: bool = args.override_cache
-
-    # Get transactions
-    mf_data_service: MFDataService = MFDataService(override_cache)
-    mf_txn_list: list[MFTransaction] = mf_data_service.mf_txn_data()
-
-    # Get properties
-    mf_api_client = MFApiClient(override_cache)
-    mf_properties: dict[str, MFProperty] = MFPropertiesService(
-        override_cache
-    ).mf_properties()
-
-    # Initialize asset value service
-    asset_value_service = AssetValueService()
-
+    source: str | None = args.source
+    properties_source: str | None = args.properties_source
+    watch: bool = args.watch
+    interval_minutes: float = args.interval_minutes
+    verbose: bool = args.verbose
+
+    # Watch keeps the portfolio in memory and redraws the summary whenever it changes
+    if watch:
+        watch_portfolio_summary(
+            month,
+            portfolio,
+            country,
+            source,
+            properties_source,
+            interval_minutes,
+            verbose,
+        )
+        return
+
+    asset_value: AssetValue | None = None
+
+    # Forward to a running report server, which has the portfolio in memory
+    if not args.local and not override_cache:
+        server_client: ReportServerClient | None = ReportServerClient.connect(
+            source, properties_source
+        )
+        if server_client is not None:
+            asset_value = server_client.summary(month, portfolio, country)
+
+    if asset_value is None:
+        asset_value = calculate_summary_asset_value(
+            month, portfolio, country, override_cache, source, properties_source
+        )
+
+    print_portfolio_summary(asset_value, portfolio, country)
+
+
+def watch_portfolio_summary(
+    month: datetime,
+    portfolio: str | None,
+    country: str | None,
+    source: str | None,
+    properties_source: str | None,
+    interval_minutes: float,
+    verbose: bool,
+) -> None:
+    state = PortfolioStateService(source, properties_source)
+
+    # A summary of last month moves on to the next one once it has ended
+    follows_last_month: bool = month == get_last_month_date()
+
+    def draw() -> None:
+        print_portfolio_summary(
+            state.asset_value(
+                month=get_last_month_date() if follows_last_month else month,
+                assets_to_include=ASSETS,
+                portfolio=portfolio,
+                country=country,
+                fund_level=True,
+            ),
+            portfolio,
+            country,
+        )
+
+    watch_report(state, draw, interval_minutes, verbose)
+
+
+def print_portfolio_summary(
+    asset_value: AssetValue, portfolio: str | None, country: str | None
+) -> None:
     filter_map: list[tuple[str, str]] = [
         ("Portfolio", portfolio.capitalize() if portfolio is not None else "None"),
         ("Country", country.capitalize() if country is not None else "None"),
     ]
 
-    # Calculate which type of assets to include
-    assets_to_include: list[str] = ["equity", "elss", "debt", "arbitrage"]
-
-    asset_value: AssetValue = asset_value_service.calculate_mf_asset_value(
-        txn_list=mf_txn_list,
-        mf_properties=mf_properties,
-        mf_api_client=mf_api_client,
-        month=month,
-        assets_to_include=assets_to_include,
-        portfolio=portfolio,
-        country=country,
-    )
-
     meta_dict: dict[str:"AssetValue.Meta"] = asset_value.meta_dict
     data: AssetValue.Data = asset_value.data
 
@@ -136,7 +185,63 @@ def calculate_portfolio_summary(args: Namespace) -> None:
 
     # Print mutual fund split
     print_header(f"By Mutual Funds ({len(fund_split)})")
-    print_table(sort_list(fund_split, data.current_value))
+    print_table(
+        [("", "Share", "Invested", "Current", "Unrealized", "Realized", "XIRR")]
+        + [
+            (fund, share) + format_fund_data(asset_value.fund_data_dict[fund])
+            for fund, share in sort_list(fund_split, data.current_value)
+        ]
+    )
+
+    # Print funds which have been fully sold
+    exited_funds: list[str] = sorted(
+        fund for fund in asset_value.fund_data_dict if fund not in fund_split
+    )
+    if len(exited_funds) > 0:
+        print_header(f"Exited Mutual Funds ({len(exited_funds)})")
+        print_table(
+            [("", "Invested", "Current", "Unrealized", "Realized", "XIRR")]
+            + [
+                (fund,) + format_fund_data(asset_value.fund_data_dict[fund])
+                for fund in exited_funds
+            ]
+        )
+
+
+def calculate_summary_asset_value(
+    month: datetime,
+    portfolio: str | None,
+    country: str | None,
+    override_cache: bool,
+    source: str | None,
+    properties_source: str | None,
+) -> AssetValue:
+    # Start loading transactions, properties and NAV prices in parallel
+    loader = PortfolioLoaderService(override_cache, source, properties_source)
+
+    # Get transactions
+    mf_data_service: MFDataService = loader.mf_data_service()
+    mf_txn_table: TransactionTable = mf_data_service.mf_txn_table()
+
+    # Get properties
+    mf_api_client: MFApiClient = loader.mf_api_client()
+    mf_properties: dict[str, MFProperty] = loader.mf_properties()
+
+    # Results not affected by changes since the last run are reused from cache
+    result_cache_service = ResultCacheService(
+        mf_txn_table, mf_properties, mf_api_client
+    )
+
+    asset_value: AssetValue = result_cache_service.calculate_mf_asset_value(
+        month=month,
+        assets_to_include=ASSETS,
+        portfolio=portfolio,
+        country=country,
+        fund_level=True,
+    )
+    result_cache_service.save()
+
+    return asset_value
 
 
 def generate_portfolio_label(portfolio: str, country: str) -> str:
@@ -147,6 +252,16 @@ def generate_portfolio_label(portfolio: str, country: str) -> str:
     return label
 
 
+def format_fund_data(fund_data: AssetValue.Data) -> tuple[str, ...]:
+    return (
+        format_inr(fund_data.invested_value),
+        format_inr(fund_data.current_value),
+        format_inr(fund_data.current_value - fund_data.invested_value),
+        format_inr(fund_data.realized),
+        str(round(fund_data.xirr * 100, 2)) + "%",
+    )
+
+
 def sort_list(split_map, total_value):
     sorted_split_list: list[tuple] = sorted(
         split_map.items(), key=lambda item: item[1], reverse=True
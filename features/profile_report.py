@@ -0,0 +1,92 @@
+"""
+features.profile_report
+~~~~~~~~~~~~~~
+
+This module contains a method which prints and saves the time spent in each phase of a run.
+
+"""
+
+import logging
+from argparse import Namespace
+
+from utils import files, profiler
+from utils.functions import print_header, print_table
+
+_FOLDER_NAME = "profile"
+
+
+def report_profile(args: Namespace) -> None:
+    # Parse arguments
+    command: str = args.command
+    trace_path: str | None = args.profile_trace
+    cprofile_path: str | None = args.profile_cprofile
+
+    profile: dict = profiler.finish()
+    run: dict = profile["spans"]
+
+    # Print wall and CPU time of each phase, nested under the phase it ran in
+    print_header(f"Profile of {command}:")
+    print_table(
+        [("", "Calls", "Wall", "CPU", "% of run")]
+        + [
+            (
+                # Tables strip leading spaces, so depth is marked with dots
+                "· " * depth + span["name"],
+                span["calls"],
+                format_duration(span["wall"]),
+                format_duration(span["cpu"]),
+                f"{span['wall'] / run['wall']:.1%}" if run["wall"] > 0 else "",
+            )
+            for depth, span in flatten_spans(run)
+        ]
+    )
+
+    # Print calls of hot functions, which are too frequent to be phases of their own
+    counters: dict[str, dict] = {
+        name: counter
+        for name, counter in profile["counters"].items()
+        if counter["calls"] > 0
+    }
+    if len(counters) > 0:
+        print_header("Hot Functions:")
+        print_table(
+            [("", "Calls", "Wall", "Per Call")]
+            + [
+                (
+                    name,
+                    counter["calls"],
+                    format_duration(counter["wall"]),
+                    format_duration(counter["wall"] / max(counter["calls"], 1)),
+                )
+                for name, counter in counters.items()
+            ]
+        )
+
+    files.save_file_as_json(_FOLDER_NAME, command, profile)
+    logging.info(
+        "Saved profile to %s", files.get_json_file_path(_FOLDER_NAME, command)
+    )
+
+    if trace_path is not None:
+        profiler.save_trace(trace_path)
+        logging.info("Saved trace to %s", trace_path)
+    if cprofile_path is not None:
+        profiler.save_cprofile(cprofile_path)
+        logging.info("Saved cProfile statistics to %s", cprofile_path)
+
+
+def flatten_spans(span: dict, depth=0) -> list[tuple[int, dict]]:
+    """Returns the spans of a tree depth first, with the slowest children first"""
+    spans: list[tuple[int, dict]] = [(depth, span)]
+    for child in sorted(span["children"], key=lambda child: -child["wall"]):
+        spans.extend(flatten_spans(child, depth + 1))
+    return spans
+
+
+def format_duration(seconds: float) -> str:
+    """Formats a duration in the largest unit which keeps it above 1"""
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.1f}ms"
+    return f"{seconds * 1e6:.1f}µs"
@@ -0,0 +1,61 @@
+"""
+features.serve_reports
+~~~~~~~~~~~~~~
+
+This module contains a method which serves portfolio reports from memory until stopped.
+
+"""
+
+import logging
+import signal
+import sys
+import threading
+from argparse import Namespace
+
+from services.portfolio_state_service import PortfolioStateService
+from services.report_server_service import ReportServerService
+
+
+def serve_reports(args: Namespace) -> None:
+    # Parse arguments
+    host: str = args.host
+    port: int = args.port
+    refresh_minutes: float = args.refresh_minutes
+    source: str | None = args.source
+    properties_source: str | None = args.properties_source
+
+    # Load the portfolio once, every request is served from memory
+    state = PortfolioStateService(source, properties_source)
+    server = ReportServerService(state, host, port)
+
+    stop = threading.Event()
+    if refresh_minutes > 0:
+        threading.Thread(
+            target=refresh_periodically,
+            args=(state, refresh_minutes * 60, stop),
+            name="refresher",
+            daemon=True,
+        ).start()
+
+    # Stop cleanly on termination as well, so the server info file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        state.save()
+        logging.info("Stopped serving reports")
+
+
+def refresh_periodically(
+    state: PortfolioStateService, interval: float, stop: threading.Event
+) -> None:
+    while not stop.wait(interval):
+        try:
+            state.refresh()
+        # Clients exit on connection errors, which must not end the refresher
+        except (Exception, SystemExit):
+            logging.exception("Failed to refresh portfolio, keeping the loaded one")
@@ -0,0 +1,19 @@
+"""
+features.take_snapshot
+~~~~~~~~~~~~~~
+
+This module contains a method which saves the prepared inputs of the portfolio for fast starts.
+
+"""
+
+from argparse import Namespace
+
+from services.snapshot_service import SnapshotService
+
+
+def take_snapshot(args: Namespace) -> None:
+    # Parse arguments
+    source: str | None = args.source
+    properties_source: str | None = args.properties_source
+
+    SnapshotService().take(source, properties_source)
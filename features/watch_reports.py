@@ -0,0 +1,71 @@
+"""
+features.watch_reports
+~~~~~~~~~~~~~~
+
+This module contains a method which keeps a report on screen and redraws it when the portfolio changes.
+
+"""
+
+import logging
+import signal
+import time
+from datetime import datetime
+from typing import Callable
+
+from services.portfolio_state_service import PortfolioStateService
+from utils import dates
+
+# Moves the cursor home and clears the screen, so every draw replaces the last one
+_CLEAR_SCREEN = "\033[H\033[2J"
+
+
+def watch_report(
+    state: PortfolioStateService,
+    draw: Callable[[], None],
+    interval_minutes: float,
+    verbose=False,
+) -> None:
+    """Draws a report from memory, then polls for changes until stopped.
+
+    Every interval the portfolio is refreshed, which checks the modified time of the
+    sources and the age of the NAV histories, and the report is redrawn only if the
+    portfolio changed or another month has ended. Months not affected by a change are
+    reused, and nothing is calculated in between.
+    """
+    # Termination stops like Ctrl+C, which a failed refresh is never mistaken for
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    # Progress of every refresh would scroll the report off the screen
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    last_month: datetime = dates.get_last_month_date()
+    redraw(draw, interval_minutes)
+
+    try:
+        # The first refresh syncs the inputs loaded from cache, the next ones poll
+        while True:
+            try:
+                is_changed: bool = state.refresh()
+
+                if is_changed or dates.get_last_month_date() != last_month:
+                    last_month = dates.get_last_month_date()
+                    redraw(draw, interval_minutes)
+            # A failed refresh must not end the watch, the report drawn last stays
+            except (Exception, SystemExit):
+                logging.exception("Failed to refresh portfolio, keeping the loaded one")
+
+            time.sleep(interval_minutes * 60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state.save()
+
+
+def redraw(draw: Callable[[], None], interval_minutes: float) -> None:
+    print(_CLEAR_SCREEN, end="")
+    draw()
+    print(
+        f"\nUpdated at {datetime.now():%H:%M:%S}, checking for changes every"
+        f" {interval_minutes:g} minutes. Press Ctrl+C to stop."
+    )
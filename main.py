@@ -8,20 +8,15 @@ Run python3 main.py --help for more information.
 """
 
 import logging
+import math
 from argparse import ArgumentParser, ArgumentTypeError, Namespace, _SubParsersAction
 from datetime import datetime
 
 from colorama import init
 from dotenv import load_dotenv
 
-from features.mf_monthly_asset_value import calculate_monthly_asset_value
-from features.mf_summary import calculate_portfolio_summary
-from features.test_connection import test_connection
 from utils import dates, logger
 
-# Load environment variables
-load_dotenv()
-
 # Initialize colorama
 init()
 
@@ -38,6 +33,101 @@ def parse_month_year(date_string):
         ) from exception
 
 
+def parse_source(source_string):
+    if source_string == "sheets":
+        return None
+    if source_string.startswith("csv:"):
+        return source_string
+    raise ArgumentTypeError(
+        f"Not a valid source: '{source_string}'. Expected 'sheets' or 'csv:<path>'"
+    )
+
+
+def parse_positive_int(count_string):
+    try:
+        count: int = int(count_string)
+    except ValueError as exception:
+        raise ArgumentTypeError(
+            f"Not a valid count: '{count_string}'. Expected a whole number"
+        ) from exception
+    if count < 1:
+        raise ArgumentTypeError(
+            f"Not a valid count: '{count_string}'. Expected 1 or more"
+        )
+    return count
+
+
+def parse_positive_float(number_string):
+    try:
+        number: float = float(number_string)
+    except ValueError as exception:
+        raise ArgumentTypeError(
+            f"Not a valid number: '{number_string}'. Expected a decimal number"
+        ) from exception
+    if not math.isfinite(number) or number <= 0:
+        raise ArgumentTypeError(
+            f"Not a valid number: '{number_string}'. Expected more than 0"
+        )
+    return number
+
+
+def add_source_arguments(subparser: ArgumentParser) -> None:
+    subparser.add_argument(
+        "--source",
+        metavar="source",
+        dest="source",
+        type=parse_source,
+        help="read transactions from 'sheets' (default) or a local CSV export as 'csv:<path>'",
+    )
+    subparser.add_argument(
+        "--properties-source",
+        metavar="source",
+        dest="properties_source",
+        type=parse_source,
+        help="read properties from 'sheets' (default) or a local CSV export as 'csv:<path>'",
+    )
+
+
+def add_profile_arguments(subparser: ArgumentParser) -> None:
+    subparser.add_argument(
+        "--profile",
+        dest="profile",
+        action="store_true",
+        help="print the time spent in each phase and save it as profile/<command>.json",
+    )
+    subparser.add_argument(
+        "--profile-trace",
+        metavar="path",
+        dest="profile_trace",
+        type=str,
+        help="save the phases as a Chrome trace file, implies --profile",
+    )
+    subparser.add_argument(
+        "--profile-cprofile",
+        metavar="path",
+        dest="profile_cprofile",
+        type=str,
+        help="save function level statistics as a cProfile file, implies --profile",
+    )
+
+
+def add_watch_arguments(subparser: ArgumentParser) -> None:
+    subparser.add_argument(
+        "--watch",
+        dest="watch",
+        action="store_true",
+        help="keep the report on screen and redraw it whenever the portfolio changes",
+    )
+    subparser.add_argument(
+        "--interval",
+        metavar="minutes",
+        dest="interval_minutes",
+        type=parse_positive_float,
+        default=5,
+        help="minutes between checks for changes with --watch, defaulted to 5",
+    )
+
+
 parser = ArgumentParser(
     description="A Python script that analyzes investment portfolio data from a Google Sheet"
 )
@@ -56,6 +146,7 @@ parser_test.add_argument(
     action="store_true",
     help="verbose mode for detailed logging",
 )
+add_profile_arguments(parser_test)
 
 parser_assetvalue: ArgumentParser = subparsers.add_parser(
     "assetvalue", help="generate month-on-month asset value"
@@ -98,6 +189,26 @@ parser_assetvalue.add_argument(
     action="store_true",
     help="calculate data for only equity funds",
 )
+parser_assetvalue.add_argument(
+    "-a",
+    "--attribution",
+    action="store_true",
+    help="split monthly change in value into new money and market movement",
+)
+parser_assetvalue.add_argument(
+    "--export",
+    metavar="path",
+    dest="export_path",
+    type=str,
+    help="export attribution as .csv or .json file, implies --attribution",
+)
+add_source_arguments(parser_assetvalue)
+parser_assetvalue.add_argument(
+    "--local",
+    dest="local",
+    action="store_true",
+    help="calculate locally even if a report server is running",
+)
 parser_assetvalue.add_argument(
     "--nocache",
     dest="override_cache",
@@ -110,6 +221,8 @@ parser_assetvalue.add_argument(
     action="store_true",
     help="verbose mode for detailed logging",
 )
+add_watch_arguments(parser_assetvalue)
+add_profile_arguments(parser_assetvalue)
 
 parser_summary: ArgumentParser = subparsers.add_parser(
     "summary", help="generate portfolio summary"
@@ -139,6 +252,13 @@ parser_summary.add_argument(
     type=str,
     help="filter by country name",
 )
+add_source_arguments(parser_summary)
+parser_summary.add_argument(
+    "--local",
+    dest="local",
+    action="store_true",
+    help="calculate locally even if a report server is running",
+)
 parser_summary.add_argument(
     "--nocache",
     dest="override_cache",
@@ -151,6 +271,417 @@ parser_summary.add_argument(
     action="store_true",
     help="verbose mode for detailed logging",
 )
+add_watch_arguments(parser_summary)
+add_profile_arguments(parser_summary)
+
+parser_risk: ArgumentParser = subparsers.add_parser(
+    "risk", help="generate portfolio and fund risk metrics"
+)
+parser_risk.add_argument(
+    "-f",
+    "--from",
+    metavar="date",
+    dest="from_date",
+    type=parse_month_year,
+    default=None,
+    help="starting date in MMM-yyyy format, defaulted to first transaction",
+)
+parser_risk.add_argument(
+    "-t",
+    "--to",
+    metavar="date",
+    dest="to_date",
+    type=parse_month_year,
+    default=last_month_date,
+    help="ending date in MMM-yyyy format, defaulted to last month",
+)
+parser_risk.add_argument(
+    "-r",
+    "--riskfree",
+    metavar="rate",
+    dest="risk_free_rate",
+    type=float,
+    default=6.5,
+    help="annual risk free rate in percent, defaulted to 6.5",
+)
+parser_risk.add_argument(
+    "-p",
+    "--portfolio",
+    metavar="name",
+    dest="portfolio",
+    type=str,
+    help="filter by portfolio name",
+)
+parser_risk.add_argument(
+    "-c",
+    "--country",
+    metavar="name",
+    dest="country",
+    type=str,
+    help="filter by country name",
+)
+add_source_arguments(parser_risk)
+parser_risk.add_argument(
+    "--nocache",
+    dest="override_cache",
+    action="store_true",
+    help="invalidate cache and fetch latest values",
+)
+parser_risk.add_argument(
+    "--verbose",
+    dest="verbose",
+    action="store_true",
+    help="verbose mode for detailed logging",
+)
+add_profile_arguments(parser_risk)
+
+parser_project: ArgumentParser = subparsers.add_parser(
+    "project", help="simulate future portfolio value"
+)
+parser_project.add_argument(
+    "-d",
+    "--date",
+    metavar="date",
+    dest="date",
+    type=parse_month_year,
+    default=last_month_date,
+    help="date of holdings in MMM-yyyy format, defaulted to last month",
+)
+parser_project.add_argument(
+    "-y",
+    "--years",
+    metavar="years",
+    dest="years",
+    type=parse_positive_int,
+    default=20,
+    help="number of years to simulate, defaulted to 20",
+)
+parser_project.add_argument(
+    "-s",
+    "--sip",
+    metavar="amount",
+    dest="sip",
+    type=float,
+    default=0,
+    help="monthly SIP amount invested in the current allocation",
+)
+parser_project.add_argument(
+    "--target",
+    metavar="amount",
+    dest="target",
+    type=float,
+    help="target value to calculate probability of reaching",
+)
+parser_project.add_argument(
+    "-n",
+    "--paths",
+    metavar="count",
+    dest="paths",
+    type=parse_positive_int,
+    default=10000,
+    help="number of simulated paths, defaulted to 10000",
+)
+parser_project.add_argument(
+    "--frequency",
+    dest="frequency",
+    choices=["daily", "monthly"],
+    default="monthly",
+    help="frequency of historical returns to sample, defaulted to monthly",
+)
+parser_project.add_argument(
+    "-w",
+    "--workers",
+    metavar="count",
+    dest="workers",
+    type=parse_positive_int,
+    default=1,
+    help="number of processes to spread batches of paths across",
+)
+parser_project.add_argument(
+    "--seed",
+    metavar="seed",
+    dest="seed",
+    type=int,
+    help="seed for reproducible simulations",
+)
+parser_project.add_argument(
+    "-p",
+    "--portfolio",
+    metavar="name",
+    dest="portfolio",
+    type=str,
+    help="filter by portfolio name",
+)
+parser_project.add_argument(
+    "-c",
+    "--country",
+    metavar="name",
+    dest="country",
+    type=str,
+    help="filter by country name",
+)
+add_source_arguments(parser_project)
+parser_project.add_argument(
+    "--nocache",
+    dest="override_cache",
+    action="store_true",
+    help="invalidate cache and fetch latest values",
+)
+parser_project.add_argument(
+    "--verbose",
+    dest="verbose",
+    action="store_true",
+    help="verbose mode for detailed logging",
+)
+add_profile_arguments(parser_project)
+
+parser_correlation: ArgumentParser = subparsers.add_parser(
+    "correlation", help="generate correlation of returns between held funds"
+)
+parser_correlation.add_argument(
+    "-f",
+    "--from",
+    metavar="date",
+    dest="from_date",
+    type=parse_month_year,
+    default=None,
+    help="starting date in MMM-yyyy format, defaulted to common NAV history",
+)
+parser_correlation.add_argument(
+    "-t",
+    "--to",
+    metavar="date",
+    dest="to_date",
+    type=parse_month_year,
+    default=last_month_date,
+    help="ending date in MMM-yyyy format, defaulted to last month",
+)
+parser_correlation.add_argument(
+    "--frequency",
+    dest="frequency",
+    choices=["daily", "monthly"],
+    default="monthly",
+    help="frequency of returns to correlate, defaulted to monthly",
+)
+parser_correlation.add_argument(
+    "-p",
+    "--portfolio",
+    metavar="name",
+    dest="portfolio",
+    type=str,
+    help="filter by portfolio name",
+)
+parser_correlation.add_argument(
+    "-c",
+    "--country",
+    metavar="name",
+    dest="country",
+    type=str,
+    help="filter by country name",
+)
+add_source_arguments(parser_correlation)
+parser_correlation.add_argument(
+    "--nocache",
+    dest="override_cache",
+    action="store_true",
+    help="invalidate cache and fetch latest values",
+)
+parser_correlation.add_argument(
+    "--verbose",
+    dest="verbose",
+    action="store_true",
+    help="verbose mode for detailed logging",
+)
+add_profile_arguments(parser_correlation)
+
+parser_snapshot: ArgumentParser = subparsers.add_parser(
+    "snapshot", help="save cached inputs as one bundle which later runs start from"
+)
+add_source_arguments(parser_snapshot)
+parser_snapshot.add_argument(
+    "--verbose",
+    dest="verbose",
+    action="store_true",
+    help="verbose mode for detailed logging",
+)
+add_profile_arguments(parser_snapshot)
+
+parser_batch: ArgumentParser = subparsers.add_parser(
+    "batch", help="generate summaries of all portfolios of a manifest in one run"
+)
+parser_batch.add_argument(
+    "manifest",
+    metavar="manifest",
+    type=str,
+    help="JSON file listing the portfolios and their sheet settings",
+)
+parser_batch.add_argument(
+    "-d",
+    "--date",
+    metavar="date",
+    dest="date",
+    type=parse_month_year,
+    default=last_month_date,
+    help="date in MMM-yyyy format, defaulted to last month",
+)
+parser_batch.add_argument(
+    "--workers",
+    metavar="count",
+    dest="workers",
+    type=parse_positive_int,
+    default=8,
+    help="number of portfolios calculated in parallel, defaulted to 8",
+)
+parser_batch.add_argument(
+    "--output",
+    metavar="folder",
+    dest="output_folder",
+    type=str,
+    help="save the summary of each portfolio as a .json file in a folder",
+)
+parser_batch.add_argument(
+    "--processes",
+    dest="processes",
+    action="store_true",
+    help="calculate portfolios on worker processes sharing NAVs in memory",
+)
+parser_batch.add_argument(
+    "--nocache",
+    dest="override_cache",
+    action="store_true",
+    help="invalidate cache and fetch latest values",
+)
+parser_batch.add_argument(
+    "--verbose",
+    dest="verbose",
+    action="store_true",
+    help="verbose mode for detailed logging",
+)
+add_profile_arguments(parser_batch)
+
+parser_serve: ArgumentParser = subparsers.add_parser(
+    "serve", help="serve reports over a local HTTP API from memory"
+)
+parser_serve.add_argument(
+    "--host",
+    metavar="host",
+    dest="host",
+    type=str,
+    default="127.0.0.1",
+    help="address to listen on, defaulted to 127.0.0.1",
+)
+parser_serve.add_argument(
+    "--port",
+    metavar="port",
+    dest="port",
+    type=int,
+    default=8765,
+    help="port to listen on, defaulted to 8765",
+)
+parser_serve.add_argument(
+    "--refresh",
+    metavar="minutes",
+    dest="refresh_minutes",
+    type=float,
+    default=15,
+    help="minutes between syncs of sheet and NAV data, 0 to disable, defaulted to 15",
+)
+add_source_arguments(parser_serve)
+parser_serve.add_argument(
+    "--verbose",
+    dest="verbose",
+    action="store_true",
+    help="verbose mode for detailed logging",
+)
+add_profile_arguments(parser_serve)
+
+parser_cache: ArgumentParser = subparsers.add_parser(
+    "cache", help="inspect, verify and prune the cache folders"
+)
+cache_subparsers: _SubParsersAction = parser_cache.add_subparsers(
+    dest="cache_command",
+    required=True,
+    help="type of cache command to be executed",
+)
+
+parser_cache_stats: ArgumentParser = cache_subparsers.add_parser(
+    "stats", help="show cache sizes, NAV date ranges and hit/miss counters"
+)
+parser_cache_stats.add_argument(
+    "--reset-counters",
+    dest="reset_counters",
+    action="store_true",
+    help="reset hit/miss counters after showing them",
+)
+
+parser_cache_verify: ArgumentParser = cache_subparsers.add_parser(
+    "verify", help="detect corrupt or partially written cache files"
+)
+
+parser_cache_prune: ArgumentParser = cache_subparsers.add_parser(
+    "prune", help="remove cache files matching every given selection"
+)
+parser_cache_prune.add_argument(
+    "--folder",
+    metavar="name",
+    dest="folder_name",
+    type=str,
+    help="select files of a cache folder, e.g. mf_api_response or results",
+)
+parser_cache_prune.add_argument(
+    "-p",
+    "--portfolio",
+    metavar="name",
+    dest="portfolio",
+    type=str,
+    help="select files of a portfolio of a batch manifest",
+)
+parser_cache_prune.add_argument(
+    "--scheme",
+    metavar="amfi_code",
+    dest="amfi_codes",
+    type=int,
+    action="append",
+    help="select the NAV history of a scheme, can be repeated",
+)
+parser_cache_prune.add_argument(
+    "--older-than",
+    metavar="days",
+    dest="older_than_days",
+    type=float,
+    help="select files written more than a number of days ago",
+)
+parser_cache_prune.add_argument(
+    "--corrupt",
+    dest="corrupt",
+    action="store_true",
+    help="select corrupt or partially written files",
+)
+parser_cache_prune.add_argument(
+    "--legacy",
+    dest="legacy",
+    action="store_true",
+    help="select .json files written before the current cache format",
+)
+parser_cache_prune.add_argument(
+    "--dry-run",
+    dest="dry_run",
+    action="store_true",
+    help="list the selected files without removing them",
+)
+
+for parser_cache_command in [
+    parser_cache_stats,
+    parser_cache_verify,
+    parser_cache_prune,
+]:
+    parser_cache_command.add_argument(
+        "--verbose",
+        dest="verbose",
+        action="store_true",
+        help="verbose mode for detailed logging",
+    )
+    add_profile_arguments(parser_cache_command)
 
 # Get arguments
 args: Namespace = parser.parse_args()
@@ -160,12 +691,67 @@ logger.setup_logging(args.verbose)
 
 logging.debug("CLI Args: %s", args)
 
+# Load environment variables, which configure the portfolio read by the services
+load_dotenv()
+
+# Profiling starts before features are imported, so their hot functions are wrapped
+if args.profile or args.profile_trace is not None or args.profile_cprofile is not None:
+    import atexit
+
+    from utils import profiler
+
+    profiler.enable(
+        args.command,
+        trace=args.profile_trace is not None,
+        cprofile=args.profile_cprofile is not None,
+    )
+
+    from features.profile_report import report_profile
+
+    # Reported at exit, so runs ending with sys.exit are reported too
+    atexit.register(report_profile, args)
+
+# Features are imported on dispatch, so a command only loads the libraries it uses
 if args.command == "assetvalue":
+    from features.mf_monthly_asset_value import calculate_monthly_asset_value
+
     calculate_monthly_asset_value(args)
 elif args.command == "test":
+    from features.test_connection import test_connection
+
     test_connection()
 elif args.command == "summary":
+    from features.mf_summary import calculate_portfolio_summary
+
     calculate_portfolio_summary(args)
+elif args.command == "risk":
+    from features.mf_risk import calculate_risk_metrics
+
+    calculate_risk_metrics(args)
+elif args.command == "project":
+    from features.mf_projection import project_portfolio_value
+
+    project_portfolio_value(args)
+elif args.command == "correlation":
+    from features.mf_correlation import calculate_fund_correlation
+
+    calculate_fund_correlation(args)
+elif args.command == "snapshot":
+    from features.take_snapshot import take_snapshot
+
+    take_snapshot(args)
+elif args.command == "batch":
+    from features.batch_reports import calculate_batch_summaries
+
+    calculate_batch_summaries(args)
+elif args.command == "serve":
+    from features.serve_reports import serve_reports
+
+    serve_reports(args)
+elif args.command == "cache":
+    from features.cache_report import inspect_cache
+
+    inspect_cache(args)
 else:
     raise ArgumentTypeError(
         f"Unsupported command '{args.command}'. Run --help for more information."
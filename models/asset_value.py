@@ -2,9 +2,7 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Self
 
-from numpy import absolute
-
-from utils.dates import to_month_year
+from utils.dates import to_datestring, to_datetime, to_month_year
 
 
 class AssetValue:
@@ -49,6 +47,27 @@ class AssetValue:
         def country(self: Self) -> str:
             return self._country
 
+        def to_dict(self: Self) -> dict[str:str]:
+            """Serialize the object to dict"""
+            return {
+                "price": str(self._price),
+                "qty": str(self._qty),
+                "asset": self._asset,
+                "portfolio": self._portfolio,
+                "country": self._country,
+            }
+
+        @classmethod
+        def from_dict(cls, data: dict) -> "AssetValue.Meta":
+            """Create a Meta object from a dictionary"""
+            return cls(
+                price=Decimal(data["price"]),
+                qty=Decimal(data["qty"]),
+                asset=data["asset"],
+                portfolio=data["portfolio"],
+                country=data["country"],
+            )
+
         def __repr__(self: Self) -> str:
             return f"Meta(price={self._price}, qty={self._qty}, asset='{self._asset}', portfolio='{self._portfolio}', country='{self._country}')"
 
@@ -128,6 +147,40 @@ class AssetValue:
         def cash_pct(self: Self) -> Decimal:
             return self._cash_pct
 
+        # Fields kept as calculated, rounding leaves some as int or float and others as Decimal
+        _FIELDS: tuple[str, ...] = (
+            "invested_value",
+            "current_value",
+            "absolute",
+            "xirr",
+            "realized",
+            "equity_pct",
+            "debt_pct",
+            "cash_pct",
+        )
+
+        def to_dict(self: Self) -> dict:
+            """Serialize the object to dict, Decimals as strings and other numbers as they are"""
+            data: dict = {"month": to_datestring(self._month)}
+            for field in self._FIELDS:
+                value = getattr(self, "_" + field)
+                data[field] = str(value) if isinstance(value, Decimal) else value
+            return data
+
+        @classmethod
+        def from_dict(cls, data: dict) -> "AssetValue.Data":
+            """Create a Data object from a dictionary, values are restored as they were calculated"""
+            instance: AssetValue.Data = cls.__new__(cls)
+            instance._month = to_datetime(data["month"])
+            for field in cls._FIELDS:
+                value = data[field]
+                setattr(
+                    instance,
+                    "_" + field,
+                    Decimal(value) if isinstance(value, str) else value,
+                )
+            return instance
+
         def __str__(self: Self) -> str:
             return "\t".join(
                 [
@@ -151,10 +204,16 @@ class AssetValue:
             )
 
     def __init__(
-        self: Self, meta_dict: dict[str, "AssetValue.Meta"], data: "AssetValue.Data"
+        self: Self,
+        meta_dict: dict[str, "AssetValue.Meta"],
+        data: "AssetValue.Data",
+        fund_data_dict: dict[str, "AssetValue.Data"] | None = None,
     ) -> None:
         self._meta_dict: dict[str, AssetValue.Meta] = meta_dict
         self._data: AssetValue.Data = data
+        self._fund_data_dict: dict[str, AssetValue.Data] = (
+            fund_data_dict if fund_data_dict is not None else {}
+        )
 
     @property
     def meta_dict(self: Self) -> dict[str, "AssetValue.Meta"]:
@@ -164,5 +223,35 @@ class AssetValue:
     def data(self: Self) -> "AssetValue.Data":
         return self._data
 
+    @property
+    def fund_data_dict(self: Self) -> dict[str, "AssetValue.Data"]:
+        """Values and returns of each fund, including funds which have been fully sold"""
+        return self._fund_data_dict
+
+    def to_dict(self: Self) -> dict:
+        """Serialize the object to dict"""
+        return {
+            "meta_dict": {fund: meta.to_dict() for fund, meta in self._meta_dict.items()},
+            "data": self._data.to_dict(),
+            "fund_data_dict": {
+                fund: data.to_dict() for fund, data in self._fund_data_dict.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AssetValue":
+        """Create an AssetValue object from a dictionary"""
+        return cls(
+            meta_dict={
+                fund: AssetValue.Meta.from_dict(meta)
+                for fund, meta in data["meta_dict"].items()
+            },
+            data=AssetValue.Data.from_dict(data["data"]),
+            fund_data_dict={
+                fund: AssetValue.Data.from_dict(fund_data)
+                for fund, fund_data in data["fund_data_dict"].items()
+            },
+        )
+
     def __repr__(self: Self) -> str:
-        return f"AssetValue(meta_dict={self._meta_dict}, data={self._data})"
+        return f"AssetValue(meta_dict={self._meta_dict}, data={self._data}, fund_data_dict={self._fund_data_dict})"
@@ -0,0 +1,114 @@
+"""
+models.attribution
+~~~~~~~~~~~~~~
+
+This module contains an Attribution model class.
+
+"""
+
+from datetime import datetime
+from typing import Self
+
+from utils.dates import to_month_year
+
+
+class Attribution:
+    """A class representing the split of the change in value between two months"""
+
+    class Split:
+        def __init__(self: Self, new_money: float, market: float) -> None:
+            self._new_money: float = new_money
+            self._market: float = market
+
+        @property
+        def new_money(self: Self) -> float:
+            """Change in units valued at the price of the later month"""
+            return self._new_money
+
+        @property
+        def market(self: Self) -> float:
+            """Units of the earlier month valued at the change in price"""
+            return self._market
+
+        @property
+        def total(self: Self) -> float:
+            return self._new_money + self._market
+
+        def __repr__(self: Self) -> str:
+            return f"Split(new_money={self._new_money}, market={self._market})"
+
+    def __init__(
+        self: Self,
+        from_month: datetime,
+        to_month: datetime,
+        by_fund: dict[str, "Attribution.Split"],
+        by_asset: dict[str, "Attribution.Split"],
+        by_portfolio: dict[str, "Attribution.Split"],
+        by_country: dict[str, "Attribution.Split"],
+    ) -> None:
+        self._from_month: datetime = from_month
+        self._to_month: datetime = to_month
+        self._by_fund: dict[str, Attribution.Split] = by_fund
+        self._by_asset: dict[str, Attribution.Split] = by_asset
+        self._by_portfolio: dict[str, Attribution.Split] = by_portfolio
+        self._by_country: dict[str, Attribution.Split] = by_country
+
+    @property
+    def from_month(self: Self) -> datetime:
+        return self._from_month
+
+    @property
+    def to_month(self: Self) -> datetime:
+        return self._to_month
+
+    @property
+    def by_fund(self: Self) -> dict[str, "Attribution.Split"]:
+        return self._by_fund
+
+    @property
+    def by_asset(self: Self) -> dict[str, "Attribution.Split"]:
+        return self._by_asset
+
+    @property
+    def by_portfolio(self: Self) -> dict[str, "Attribution.Split"]:
+        return self._by_portfolio
+
+    @property
+    def by_country(self: Self) -> dict[str, "Attribution.Split"]:
+        return self._by_country
+
+    @property
+    def total(self: Self) -> "Attribution.Split":
+        return Attribution.Split(
+            new_money=sum(split.new_money for split in self._by_fund.values()),
+            market=sum(split.market for split in self._by_fund.values()),
+        )
+
+    def to_rows(self: Self) -> list[dict]:
+        """Serialize the attribution to a list of flat rows, one per dimension and key"""
+        rows: list[dict] = []
+        for dimension, splits in (
+            ("fund", self._by_fund),
+            ("asset", self._by_asset),
+            ("portfolio", self._by_portfolio),
+            ("country", self._by_country),
+        ):
+            for key, split in splits.items():
+                rows.append(
+                    {
+                        "from_month": to_month_year(self._from_month),
+                        "to_month": to_month_year(self._to_month),
+                        "dimension": dimension,
+                        "key": key,
+                        "new_money": round(split.new_money, 2),
+                        "market": round(split.market, 2),
+                        "total": round(split.total, 2),
+                    }
+                )
+        return rows
+
+    def __repr__(self: Self) -> str:
+        return (
+            f"Attribution(from_month='{self._from_month}', to_month='{self._to_month}', by_fund={self._by_fund}, "
+            f"by_asset={self._by_asset}, by_portfolio={self._by_portfolio}, by_country={self._by_country})"
+        )
@@ -0,0 +1,71 @@
+"""
+models.cache_entry
+~~~~~~~~~~~~~~
+
+This module contains a CacheEntry model class.
+
+"""
+
+import os
+from datetime import datetime
+from typing import Self
+
+
+class CacheEntry:
+    """A class representing a file in a cache folder"""
+
+    # Written through the cache codecs
+    CACHE = "cache"
+    # Left behind by a write which did not complete
+    PARTIAL = "partial"
+    # Written before the cache codecs, no longer read
+    LEGACY = "legacy"
+
+    _folder_name: str
+    _file_name: str
+    _kind: str
+    _size: int
+    _modified_time: datetime
+
+    def __init__(
+        self: Self,
+        folder_name: str,
+        file_name: str,
+        kind: str,
+        size: int,
+        modified_time: datetime,
+    ) -> None:
+        self._folder_name = folder_name
+        self._file_name = file_name
+        self._kind = kind
+        self._size = size
+        self._modified_time = modified_time
+
+    @property
+    def folder_name(self: Self) -> str:
+        return self._folder_name
+
+    @property
+    def file_name(self: Self) -> str:
+        return self._file_name
+
+    @property
+    def kind(self: Self) -> str:
+        return self._kind
+
+    @property
+    def size(self: Self) -> int:
+        return self._size
+
+    @property
+    def modified_time(self: Self) -> datetime:
+        return self._modified_time
+
+    @property
+    def name(self: Self) -> str:
+        """Returns the name of the entry without its extension"""
+        return self._file_name.split(".", 1)[0]
+
+    @property
+    def path(self: Self) -> str:
+        return os.path.join(self._folder_name, self._file_name)
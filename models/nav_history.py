@@ -0,0 +1,88 @@
+"""
+models.nav_history
+~~~~~~~~~~~~~~
+
+This module contains a NavHistory model class.
+
+"""
+
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from typing import Self, Sequence
+
+from models.mf_price import MFPrice
+from utils.dates import to_datestring
+
+
+class NavHistory:
+    """A class representing the NAV history of a mutual fund as a date index and NAV values.
+
+    Dates are day ordinals in ascending order, so the NAV on a date is found by
+    bisection instead of a scan. NAVs are kept as the strings published by the API,
+    encoded and NUL separated in one buffer, and are only split on first lookup. Both can
+    be views into a mapped file.
+    """
+
+    __slots__ = ("_days", "_encoded_navs", "_navs")
+
+    _SEPARATOR = b"\x00"
+
+    def __init__(
+        self: Self, days: Sequence[int], encoded_navs: bytes | memoryview
+    ) -> None:
+        self._days: Sequence[int] = days
+        self._encoded_navs: bytes | memoryview = encoded_navs
+        self._navs: list[str] | None = None
+
+    @classmethod
+    def from_prices(cls, pricing_data: list[MFPrice]) -> "NavHistory":
+        """Create a NavHistory from NAVs of the API, which are sorted with the latest date first"""
+        ascending: list[MFPrice] = sorted(
+            reversed(pricing_data), key=lambda price: price.date
+        )
+
+        return cls(
+            array("i", (price.date.toordinal() for price in ascending)),
+            cls._SEPARATOR.join(price.nav.encode("utf-8") for price in ascending),
+        )
+
+    @property
+    def days(self: Self) -> Sequence[int]:
+        return self._days
+
+    @property
+    def encoded_navs(self: Self) -> bytes | memoryview:
+        return self._encoded_navs
+
+    def nav_on(self: Self, date: datetime) -> str | None:
+        """Returns the latest NAV published on or before a date"""
+        index: int = bisect_right(self._days, date.toordinal()) - 1
+        if index < 0:
+            return None
+        return self.navs()[index]
+
+    def latest_date(self: Self) -> datetime | None:
+        if len(self._days) == 0:
+            return None
+        return datetime.fromordinal(self._days[-1])
+
+    def to_prices(self: Self) -> list[MFPrice]:
+        """Converts the history back to MFPrice objects, with the latest date first"""
+        return [
+            MFPrice(date=to_datestring(datetime.fromordinal(day)), nav=nav)
+            for day, nav in zip(reversed(self._days), reversed(self.navs()))
+        ]
+
+    def navs(self: Self) -> list[str]:
+        """Returns the NAVs in ascending order of date"""
+        if self._navs is None:
+            self._navs = (
+                str(self._encoded_navs, "utf-8").split("\x00")
+                if len(self._days) > 0
+                else []
+            )
+        return self._navs
+
+    def __len__(self: Self) -> int:
+        return len(self._days)
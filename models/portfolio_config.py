@@ -0,0 +1,201 @@
+"""
+models.portfolio_config
+~~~~~~~~~~~~~~
+
+This module contains a PortfolioConfig model class.
+
+"""
+
+import os
+import re
+from typing import Mapping, Self
+
+from utils.functions import to_num
+
+
+class PortfolioConfig:
+    """A class representing the spreadsheet, column mappings and cache folder of a portfolio.
+
+    The default portfolio is configured by environment variables and cached in the current
+    folder. A portfolio of a batch manifest takes the same settings in lower case, falls
+    back to the environment for the ones it leaves out, and is cached in a folder of its own.
+    """
+
+    # Mapped columns of each worksheet, in the order the models expect them
+    _TRANSACTION_COLUMNS: list[str] = [
+        "fund_name",
+        "buy_sell",
+        "units",
+        "buy_date",
+        "buy_price",
+        "sell_date",
+        "sell_price",
+    ]
+    _PROPERTY_COLUMNS: list[str] = [
+        "fund_name",
+        "amfi_code",
+        "portfolio",
+        "asset",
+        "country",
+    ]
+
+    _DEFAULT_NAME = "default"
+    _FOLDER_NAME = "portfolios"
+
+    # Portfolio names are used as folder names
+    _NAME_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+
+    _default: "PortfolioConfig | None" = None
+
+    def __init__(
+        self: Self,
+        name: str,
+        sheet_id: str | None,
+        credentials_file: str | None,
+        transactions_worksheet_name: str | None,
+        transactions_first_row: int | None,
+        transaction_columns: dict[str, int | None],
+        properties_worksheet_name: str | None,
+        properties_first_row: int | None,
+        property_columns: dict[str, int | None],
+        source: str | None = None,
+        properties_source: str | None = None,
+        folder_name: str = "",
+    ) -> None:
+        self._name: str = name
+        self._sheet_id: str | None = sheet_id
+        self._credentials_file: str | None = credentials_file
+        self._transactions_worksheet_name: str | None = transactions_worksheet_name
+        self._transactions_first_row: int | None = transactions_first_row
+        self._transaction_columns: dict[str, int | None] = transaction_columns
+        self._properties_worksheet_name: str | None = properties_worksheet_name
+        self._properties_first_row: int | None = properties_first_row
+        self._property_columns: dict[str, int | None] = property_columns
+        self._source: str | None = source
+        self._properties_source: str | None = properties_source
+        self._folder_name: str = folder_name
+
+    @property
+    def name(self: Self) -> str:
+        return self._name
+
+    @property
+    def sheet_id(self: Self) -> str | None:
+        return self._sheet_id
+
+    @property
+    def credentials_file(self: Self) -> str | None:
+        return self._credentials_file
+
+    @property
+    def transactions_worksheet_name(self: Self) -> str | None:
+        return self._transactions_worksheet_name
+
+    @property
+    def transactions_first_row(self: Self) -> int | None:
+        return self._transactions_first_row
+
+    @property
+    def transaction_columns(self: Self) -> dict[str, int | None]:
+        return self._transaction_columns
+
+    @property
+    def properties_worksheet_name(self: Self) -> str | None:
+        return self._properties_worksheet_name
+
+    @property
+    def properties_first_row(self: Self) -> int | None:
+        return self._properties_first_row
+
+    @property
+    def property_columns(self: Self) -> dict[str, int | None]:
+        return self._property_columns
+
+    @property
+    def source(self: Self) -> str | None:
+        return self._source
+
+    @property
+    def properties_source(self: Self) -> str | None:
+        return self._properties_source
+
+    def cache_folder(self: Self, folder_name: str) -> str:
+        """Returns the folder of this portfolio in which a service keeps its cache"""
+        return os.path.join(self._folder_name, folder_name)
+
+    @classmethod
+    def default(cls) -> "PortfolioConfig":
+        """Returns the portfolio configured by environment variables, read on first use"""
+        if cls._default is None:
+            cls._default = cls._from_settings(cls._DEFAULT_NAME, os.environ)
+        return cls._default
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PortfolioConfig":
+        """Create a PortfolioConfig object from a portfolio of a batch manifest"""
+        name = data.get("name")
+        if not isinstance(name, str) or cls._NAME_PATTERN.fullmatch(name) is None:
+            raise ValueError(
+                f"Not a valid portfolio name: {name!r}. Expected letters, digits, '_', '.' or '-'"
+            )
+
+        settings: dict[str, str] = dict(os.environ) | {
+            key.upper(): str(value) for key, value in data.items() if value is not None
+        }
+
+        return cls._from_settings(
+            name,
+            settings,
+            source=cls._parse_source(data.get("source")),
+            properties_source=cls._parse_source(data.get("properties_source")),
+            folder_name=os.path.join(cls._FOLDER_NAME, name),
+        )
+
+    @classmethod
+    def _from_settings(
+        cls,
+        name: str,
+        settings: Mapping[str, str],
+        source: str | None = None,
+        properties_source: str | None = None,
+        folder_name: str = "",
+    ) -> "PortfolioConfig":
+        return cls(
+            name=name,
+            sheet_id=settings.get("SHEET_ID"),
+            credentials_file=settings.get("CREDENTIALS_FILE"),
+            transactions_worksheet_name=settings.get("TRANSACTIONS_WORKSHEET_NAME"),
+            transactions_first_row=cls._to_int(settings.get("TRANSACTIONS_FIRST_ROW")),
+            transaction_columns={
+                column: to_num(settings.get(f"TRANSACTIONS_{column.upper()}_COL"))
+                for column in cls._TRANSACTION_COLUMNS
+            },
+            properties_worksheet_name=settings.get("PROPERTIES_WORKSHEET_NAME"),
+            properties_first_row=cls._to_int(settings.get("PROPERTIES_FIRST_ROW")),
+            property_columns={
+                column: to_num(settings.get(f"PROPERTIES_{column.upper()}_COL"))
+                for column in cls._PROPERTY_COLUMNS
+            },
+            source=source,
+            properties_source=properties_source,
+            folder_name=folder_name,
+        )
+
+    @staticmethod
+    def _to_int(value: str | None) -> int | None:
+        return int(value) if value is not None else None
+
+    @staticmethod
+    def _parse_source(value: str | None) -> str | None:
+        """Parses a source the same way as the command line, 'sheets' or 'csv:<path>'"""
+        if value is None or value == "sheets":
+            return None
+        if isinstance(value, str) and value.startswith("csv:"):
+            return value
+        raise ValueError(
+            f"Not a valid source: {value!r}. Expected 'sheets' or 'csv:<path>'"
+        )
+
+    def __str__(self):
+        attrs: str = ", ".join([f"{key}={value}" for key, value in vars(self).items()])
+        return "{" + attrs + "}"
@@ -0,0 +1,51 @@
+"""
+models.portfolio_snapshot
+~~~~~~~~~~~~~~
+
+This module contains a PortfolioSnapshot model class.
+
+"""
+
+from datetime import datetime
+from typing import Self
+
+from models.mf_property import MFProperty
+from models.nav_history import NavHistory
+from models.transaction_table import TransactionTable
+
+
+class PortfolioSnapshot:
+    """A class representing the prepared inputs of a portfolio, as loaded from a snapshot bundle"""
+
+    _txn_table: TransactionTable
+    _mf_properties: dict[str, MFProperty]
+    _nav_histories: dict[int, NavHistory]
+    _taken_at: datetime
+
+    def __init__(
+        self: Self,
+        txn_table: TransactionTable,
+        mf_properties: dict[str, MFProperty],
+        nav_histories: dict[int, NavHistory],
+        taken_at: datetime,
+    ) -> None:
+        self._txn_table = txn_table
+        self._mf_properties = mf_properties
+        self._nav_histories = nav_histories
+        self._taken_at = taken_at
+
+    @property
+    def txn_table(self: Self) -> TransactionTable:
+        return self._txn_table
+
+    @property
+    def mf_properties(self: Self) -> dict[str, MFProperty]:
+        return self._mf_properties
+
+    @property
+    def nav_histories(self: Self) -> dict[int, NavHistory]:
+        return self._nav_histories
+
+    @property
+    def taken_at(self: Self) -> datetime:
+        return self._taken_at
@@ -0,0 +1,87 @@
+"""
+models.projection
+~~~~~~~~~~~~~~
+
+This module contains a Projection model class.
+
+"""
+
+from typing import Self
+
+PERCENTILES: tuple[int, ...] = (10, 25, 50, 75, 90)
+
+
+class Projection:
+    """A class representing the simulated distribution of future portfolio value"""
+
+    class Year:
+        def __init__(
+            self: Self,
+            year: int,
+            invested_value: float,
+            percentiles: dict[int, float],
+            target_probability: float | None,
+        ) -> None:
+            self._year: int = year
+            self._invested_value: float = invested_value
+            self._percentiles: dict[int, float] = percentiles
+            self._target_probability: float | None = target_probability
+
+        @property
+        def year(self: Self) -> int:
+            return self._year
+
+        @property
+        def invested_value(self: Self) -> float:
+            """Current value plus all SIP amounts invested up to this year"""
+            return self._invested_value
+
+        @property
+        def percentiles(self: Self) -> dict[int, float]:
+            return self._percentiles
+
+        @property
+        def target_probability(self: Self) -> float | None:
+            """Share of paths at or above the target value at the end of this year"""
+            return self._target_probability
+
+        def __repr__(self: Self) -> str:
+            return (
+                f"Year(year={self._year}, invested_value={self._invested_value}, "
+                f"percentiles={self._percentiles}, target_probability={self._target_probability})"
+            )
+
+    def __init__(
+        self: Self,
+        start_value: float,
+        paths: int,
+        history_length: int,
+        years: list["Projection.Year"],
+    ) -> None:
+        self._start_value: float = start_value
+        self._paths: int = paths
+        self._history_length: int = history_length
+        self._years: list[Projection.Year] = years
+
+    @property
+    def start_value(self: Self) -> float:
+        return self._start_value
+
+    @property
+    def paths(self: Self) -> int:
+        return self._paths
+
+    @property
+    def history_length(self: Self) -> int:
+        """Number of historical returns the paths were sampled from"""
+        return self._history_length
+
+    @property
+    def years(self: Self) -> list["Projection.Year"]:
+        return self._years
+
+    def __repr__(self: Self) -> str:
+        return (
+            f"Projection(start_value={self._start_value}, paths={self._paths}, "
+            f"history_length={self._history_length}, years={self._years})"
+        )
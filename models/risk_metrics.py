@@ -0,0 +1,87 @@
+"""
+models.risk_metrics
+~~~~~~~~~~~~~~
+
+This module contains a RiskMetrics model class.
+
+"""
+
+from datetime import datetime
+from typing import Self
+
+
+class RiskMetrics:
+    """A class representing the risk metrics of a NAV or value series"""
+
+    def __init__(
+        self: Self,
+        observations: int,
+        volatility: float,
+        downside_deviation: float,
+        sharpe: float | None,
+        sortino: float | None,
+        max_drawdown: float,
+        peak_date: datetime | None,
+        trough_date: datetime | None,
+        recovery_date: datetime | None,
+    ) -> None:
+        self._observations: int = observations
+        self._volatility: float = volatility
+        self._downside_deviation: float = downside_deviation
+        self._sharpe: float | None = sharpe
+        self._sortino: float | None = sortino
+        self._max_drawdown: float = max_drawdown
+        self._peak_date: datetime | None = peak_date
+        self._trough_date: datetime | None = trough_date
+        self._recovery_date: datetime | None = recovery_date
+
+    @property
+    def observations(self: Self) -> int:
+        return self._observations
+
+    @property
+    def volatility(self: Self) -> float:
+        return self._volatility
+
+    @property
+    def downside_deviation(self: Self) -> float:
+        return self._downside_deviation
+
+    @property
+    def sharpe(self: Self) -> float | None:
+        return self._sharpe
+
+    @property
+    def sortino(self: Self) -> float | None:
+        return self._sortino
+
+    @property
+    def max_drawdown(self: Self) -> float:
+        return self._max_drawdown
+
+    @property
+    def peak_date(self: Self) -> datetime | None:
+        return self._peak_date
+
+    @property
+    def trough_date(self: Self) -> datetime | None:
+        return self._trough_date
+
+    @property
+    def recovery_date(self: Self) -> datetime | None:
+        return self._recovery_date
+
+    @property
+    def recovery_days(self: Self) -> int | None:
+        """Calendar days taken to climb back from the trough to the previous peak"""
+        if self._trough_date is None or self._recovery_date is None:
+            return None
+        return (self._recovery_date - self._trough_date).days
+
+    def __repr__(self: Self) -> str:
+        return (
+            f"RiskMetrics(observations={self._observations}, volatility={self._volatility}, "
+            f"downside_deviation={self._downside_deviation}, sharpe={self._sharpe}, sortino={self._sortino}, "
+            f"max_drawdown={self._max_drawdown}, peak_date='{self._peak_date}', trough_date='{self._trough_date}', "
+            f"recovery_date='{self._recovery_date}')"
+        )
@@ -0,0 +1,142 @@
+"""
+models.shared_nav_store
+~~~~~~~~~~~~~~
+
+This module contains a SharedNavStore model class.
+
+"""
+
+from array import array
+from multiprocessing import shared_memory
+from typing import Self
+
+from models.nav_history import NavHistory
+
+
+class SharedNavStore:
+    """A class representing NAV histories of many schemes published in one shared memory segment.
+
+    For every scheme the segment holds its dates as int32 day ordinals and the NAV
+    strings published by the API, NUL separated, both in ascending order of date. NAVs
+    are kept as text, so workers value them as Decimal exactly as the batch process
+    would. A small descriptor of segment name and scheme -> offset and length is all a
+    worker process needs to attach, so starting a worker transfers no NAV data, and
+    workers read the segment through views without copies.
+
+    The process which publishes the store owns the segment and unlinks it on close.
+    """
+
+    # Regions of a scheme start on 8 byte boundaries, so its days can be viewed in place
+    _ALIGNMENT = 8
+
+    class Scheme:
+        """Location of the NAV history of one scheme in the segment"""
+
+        __slots__ = ("offset", "length", "text_offset", "text_length")
+
+        def __init__(
+            self: Self, offset: int, length: int, text_offset: int, text_length: int
+        ) -> None:
+            self.offset: int = offset
+            self.length: int = length
+            self.text_offset: int = text_offset
+            self.text_length: int = text_length
+
+    def __init__(
+        self: Self,
+        memory: shared_memory.SharedMemory,
+        schemes: dict[int, "SharedNavStore.Scheme"],
+        is_owner: bool,
+    ) -> None:
+        self._memory: shared_memory.SharedMemory = memory
+        self._schemes: dict[int, SharedNavStore.Scheme] = schemes
+        self._is_owner: bool = is_owner
+
+    @classmethod
+    def publish(cls, nav_histories: dict[int, NavHistory]) -> "SharedNavStore":
+        """Copies NAV histories into a new shared memory segment owned by this process"""
+        schemes: dict[int, SharedNavStore.Scheme] = {}
+
+        size = 0
+        for amfi_code, nav_history in nav_histories.items():
+            length: int = len(nav_history)
+            offset: int = cls._align(size)
+            text_offset: int = offset + length * 4
+            text_length: int = len(nav_history.encoded_navs)
+
+            schemes[amfi_code] = cls.Scheme(
+                offset=offset,
+                length=length,
+                text_offset=text_offset,
+                text_length=text_length,
+            )
+            size = text_offset + text_length
+
+        # A segment cannot be empty
+        memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+        try:
+            for amfi_code, nav_history in nav_histories.items():
+                scheme: SharedNavStore.Scheme = schemes[amfi_code]
+
+                memory.buf[scheme.offset : scheme.text_offset] = array(
+                    "i", nav_history.days
+                ).tobytes()
+                text_end: int = scheme.text_offset + scheme.text_length
+                memory.buf[scheme.text_offset : text_end] = nav_history.encoded_navs
+        except BaseException:
+            memory.close()
+            memory.unlink()
+            raise
+
+        return cls(memory, schemes, is_owner=True)
+
+    @classmethod
+    def attach(
+        cls, descriptor: tuple[str, dict[int, "SharedNavStore.Scheme"]]
+    ) -> "SharedNavStore":
+        """Attaches to a segment published by another process"""
+        name, schemes = descriptor
+        return cls(shared_memory.SharedMemory(name=name), schemes, is_owner=False)
+
+    @property
+    def descriptor(self: Self) -> tuple[str, dict[int, "SharedNavStore.Scheme"]]:
+        """Returns the segment name and scheme table, which is passed to worker processes"""
+        return self._memory.name, self._schemes
+
+    @property
+    def size(self: Self) -> int:
+        return self._memory.size
+
+    def nav_history(self: Self, amfi_code: int) -> NavHistory:
+        """Returns the NAV history of a scheme as views into the segment"""
+        scheme: SharedNavStore.Scheme = self._schemes[amfi_code]
+        buffer: memoryview = self._memory.buf
+
+        return NavHistory(
+            buffer[scheme.offset : scheme.offset + scheme.length * 4].cast("i"),
+            buffer[scheme.text_offset : scheme.text_offset + scheme.text_length],
+        )
+
+    def nav_histories(self: Self) -> dict[int, NavHistory]:
+        return {amfi_code: self.nav_history(amfi_code) for amfi_code in self._schemes}
+
+    def close(self: Self) -> None:
+        """Detaches from the segment, and removes it if this process published it.
+
+        Views returned by the store must be released first, the segment cannot be
+        unmapped while they are in use.
+        """
+        self._memory.close()
+        if self._is_owner:
+            self._memory.unlink()
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(self: Self, *exc_info) -> None:
+        self.close()
+
+    @classmethod
+    def _align(cls, offset: int) -> int:
+        return offset + (-offset % cls._ALIGNMENT)
@@ -0,0 +1,229 @@
+"""
+models.transaction_table
+~~~~~~~~~~~~~~
+
+This module contains a TransactionTable model class.
+
+"""
+
+from array import array
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator, Self
+
+from enums.TransactionType import TransactionType
+from models.mf_transaction import BuySellType, MFTransaction
+from utils.dates import to_datestring, to_ordinals
+
+# Side flags of the side column
+SIDE_BUY = 0
+SIDE_SELL = 1
+SIDE_UNKNOWN = 2
+# Sells not written as SELL are held until sold, but not realized once sold
+SIDE_SELL_OTHER_CASE = 3
+
+_SIDES: dict[str, int] = {
+    TransactionType.BUY.value: SIDE_BUY,
+    TransactionType.SELL.value: SIDE_SELL,
+}
+_SIDE_NAMES: tuple[str, ...] = (
+    TransactionType.BUY.value,
+    TransactionType.SELL.value,
+    "",
+    TransactionType.SELL.value.capitalize(),
+)
+
+
+def _to_side(buy_sell: str) -> int:
+    """Returns the side flag of a buy/sell value, buys are matched in any case"""
+    if buy_sell == TransactionType.SELL.value:
+        return SIDE_SELL
+    side: int = _SIDES.get(buy_sell.upper(), SIDE_UNKNOWN)
+    return SIDE_SELL_OTHER_CASE if side == SIDE_SELL else side
+
+
+class TransactionTable:
+    """A class representing a ledger of mutual fund transactions as parallel typed columns.
+
+    Fund names are interned to int codes, sides are stored as flags, units and prices as
+    floats and dates as day ordinals, which takes a fraction of the memory of MFTransaction
+    objects and lets the engines loop over plain numbers.
+    """
+
+    __slots__ = (
+        "_funds",
+        "_fund_codes_by_name",
+        "_fund_codes",
+        "_sides",
+        "_units",
+        "_buy_prices",
+        "_sell_prices",
+        "_buy_days",
+        "_sell_days",
+    )
+
+    class Row:
+        """A view of one transaction of the table, with the same properties as MFTransaction"""
+
+        __slots__ = ("_table", "_index")
+
+        def __init__(self: Self, table: "TransactionTable", index: int) -> None:
+            self._table: TransactionTable = table
+            self._index: int = index
+
+        @property
+        def fund(self: Self) -> str:
+            return self._table._funds[self._table._fund_codes[self._index]]
+
+        @property
+        def buy_sell(self: Self) -> BuySellType:
+            return _SIDE_NAMES[self._table._sides[self._index]]
+
+        @property
+        def units(self: Self) -> Decimal:
+            return Decimal(repr(self._table._units[self._index]))
+
+        @property
+        def buy_date(self: Self) -> datetime:
+            return datetime.fromordinal(self._table._buy_days[self._index])
+
+        @property
+        def buy_price(self: Self) -> Decimal:
+            return Decimal(repr(self._table._buy_prices[self._index]))
+
+        @property
+        def sell_date(self: Self) -> datetime:
+            return datetime.fromordinal(self._table._sell_days[self._index])
+
+        @property
+        def sell_price(self: Self) -> Decimal:
+            return Decimal(repr(self._table._sell_prices[self._index]))
+
+        def to_dict(self: Self) -> dict[str:str]:
+            """Serialize the row to dict, in the same format as MFTransaction"""
+            return {
+                "fund": self.fund,
+                "buy_sell": self.buy_sell,
+                "units": str(self.units),
+                "buy_date": to_datestring(self.buy_date),
+                "buy_price": str(self.buy_price),
+                "sell_date": to_datestring(self.sell_date),
+                "sell_price": str(self.sell_price),
+            }
+
+        def __str__(self: Self) -> str:
+            attrs: str = ", ".join([f"{key}={value}" for key, value in self.to_dict().items()])
+            return "{" + attrs + "}"
+
+    def __init__(self: Self) -> None:
+        self._funds: list[str] = []
+        self._fund_codes_by_name: dict[str, int] = {}
+        self._fund_codes: array = array("i")
+        self._sides: array = array("b")
+        self._units: array = array("d")
+        self._buy_prices: array = array("d")
+        self._sell_prices: array = array("d")
+        self._buy_days: array = array("i")
+        self._sell_days: array = array("i")
+
+    @classmethod
+    def from_transactions(
+        cls, txn_list: "list[MFTransaction] | TransactionTable"
+    ) -> "TransactionTable":
+        """Create a TransactionTable from MFTransaction objects, a table is returned as is"""
+        if isinstance(txn_list, TransactionTable):
+            return txn_list
+
+        table = cls()
+        for txn in txn_list:
+            table.append(txn)
+        return table
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list[str]]) -> "TransactionTable":
+        """Create a TransactionTable from columns of serialized transactions, without creating MFTransaction objects"""
+        table = cls()
+
+        for fund in columns["fund"]:
+            fund_code: int | None = table._fund_codes_by_name.get(fund)
+            if fund_code is None:
+                fund_code = len(table._funds)
+                table._fund_codes_by_name[fund] = fund_code
+                table._funds.append(fund)
+            table._fund_codes.append(fund_code)
+
+        table._sides = array("b", map(_to_side, columns["buy_sell"]))
+        table._units = array("d", map(float, columns["units"]))
+        table._buy_prices = array("d", map(float, columns["buy_price"]))
+        table._sell_prices = array("d", map(float, columns["sell_price"]))
+        table._buy_days = to_ordinals(columns["buy_date"])
+        table._sell_days = to_ordinals(columns["sell_date"])
+
+        return table
+
+    def append(self: Self, txn: MFTransaction) -> None:
+        """Appends a transaction as a new row"""
+        fund_code: int | None = self._fund_codes_by_name.get(txn.fund)
+        if fund_code is None:
+            fund_code = len(self._funds)
+            self._fund_codes_by_name[txn.fund] = fund_code
+            self._funds.append(txn.fund)
+
+        self._fund_codes.append(fund_code)
+        self._sides.append(_to_side(txn.buy_sell))
+        self._units.append(float(txn.units))
+        self._buy_prices.append(float(txn.buy_price))
+        self._sell_prices.append(float(txn.sell_price))
+        self._buy_days.append(txn.buy_date.toordinal())
+        self._sell_days.append(txn.sell_date.toordinal())
+
+    def to_transactions(self: Self) -> list[MFTransaction]:
+        """Converts the rows back to MFTransaction objects"""
+        return [MFTransaction.from_dict(row.to_dict()) for row in self]
+
+    @property
+    def funds(self: Self) -> list[str]:
+        """Fund names, indexed by fund code"""
+        return self._funds
+
+    @property
+    def fund_codes(self: Self) -> array:
+        return self._fund_codes
+
+    @property
+    def sides(self: Self) -> array:
+        return self._sides
+
+    @property
+    def units(self: Self) -> array:
+        return self._units
+
+    @property
+    def buy_prices(self: Self) -> array:
+        return self._buy_prices
+
+    @property
+    def sell_prices(self: Self) -> array:
+        return self._sell_prices
+
+    @property
+    def buy_days(self: Self) -> array:
+        return self._buy_days
+
+    @property
+    def sell_days(self: Self) -> array:
+        return self._sell_days
+
+    def __len__(self: Self) -> int:
+        return len(self._fund_codes)
+
+    def __getitem__(self: Self, index: int) -> "TransactionTable.Row":
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Transaction index out of range")
+        return TransactionTable.Row(self, index)
+
+    def __iter__(self: Self) -> Iterator["TransactionTable.Row"]:
+        for index in range(len(self)):
+            yield TransactionTable.Row(self, index)
@@ -11,131 +11,156 @@ from datetime import datetime
 from decimal import Decimal
 from typing import Self
 
-from xirr.math import listsXirr
-
 from apis.mf_api_client import MFApiClient
 from enums.Asset import Asset
-from enums.TransactionType import TransactionType
 from models.asset_value import AssetValue
 from models.mf_property import MFProperty
 from models.mf_transaction import MFTransaction
+from models.transaction_table import (
+    SIDE_BUY,
+    SIDE_SELL,
+    SIDE_SELL_OTHER_CASE,
+    TransactionTable,
+)
+from utils import profiler
+from utils.dates import add_month
+from utils.xirr import batch_xirr, solve_xirr
+
+# Sums of units and values are kept to this many decimal places
+_DECIMAL_PLACES = 6
 
 
 class AssetValueService:
     """Returns details of asset value in a month"""
 
+    @profiler.timed("valuation")
     def calculate_mf_asset_value(
         self: Self,
-        txn_list: list[MFTransaction],
+        txn_list: list[MFTransaction] | TransactionTable,
         mf_properties: dict[str:MFProperty],
         mf_api_client: MFApiClient,
         month: datetime,
         assets_to_include: list[str],
         portfolio=None,
         country=None,
+        fund_level=False,
     ) -> AssetValue:
-        # Contains the units, nav, asset type of each fund
-        fund_map: dict[str:"AssetValue.Meta"] = {}
+        """Returns the asset value of the portfolio in a month.
 
-        # Cashflow values for XIRR
-        cashflow_values: list[float] = []
-        cashflow_dates: list[datetime] = []
+        Cashflows, invested value and realized profit are split by fund as transactions are
+        processed, so with fund_level set the returns of every fund are available from the
+        same pass and their XIRRs are solved together in one batch.
 
-        # Contains the total buy value
-        invested_value: Decimal = Decimal(0)
+        Transactions are read from the columns of a TransactionTable, pass one to avoid
+        converting the list again for every month.
+        """
+        txn_table: TransactionTable = TransactionTable.from_transactions(txn_list)
 
-        # Contains the total realized profit
-        realized_profit: Decimal = Decimal(0)
+        # Property of each fund code, None if the fund is filtered out
+        fund_properties: list[MFProperty | None] = [
+            self.filter_property(
+                fund, mf_properties[fund], assets_to_include, portfolio, country
+            )
+            for fund in txn_table.funds
+        ]
 
-        logging.debug("Processing %s transactions...", len(txn_list))
+        # Units held and nav price of each fund code
+        fund_qty: dict[int, float] = {}
+        fund_price: dict[int, Decimal] = {}
 
-        for txn in txn_list:
-            mf_property: MFProperty = mf_properties[txn.fund]
+        # Cashflow dates and values for XIRR of each fund code
+        fund_cashflows: dict[int, tuple[list[datetime], list[float]]] = {}
 
-            # Filter by asset type
-            if mf_property.asset.lower() not in assets_to_include:
-                logging.debug(
-                    "Skipping %s due to asset type %s", txn.fund, mf_property.asset
-                )
-                continue
+        # Contains the buy value of each fund code
+        fund_invested: dict[int, float] = {}
 
-            # Filter by portfolio
-            if (
-                portfolio is not None
-                and mf_property.portfolio.lower() != portfolio.lower()
-            ):
-                logging.debug(
-                    "Skipping %s due to portfolio %s", txn.fund, mf_property.portfolio
-                )
-                continue
+        # Contains the realized profit of each fund code
+        fund_realized: dict[int, float] = {}
 
-            # Filter by country
-            if country is not None and mf_property.country.lower() != country.lower():
-                logging.debug(
-                    "Skipping %s due to country %s", txn.fund, mf_property.country
-                )
+        # Dates are compared as day ordinals and converted back only for cashflows
+        month_day: int = month.toordinal()
+        dates: dict[int, datetime] = {}
+
+        logging.debug("Processing %s transactions...", len(txn_table))
+
+        for fund_code, side, units, buy_price, sell_price, buy_day, sell_day in zip(
+            txn_table.fund_codes,
+            txn_table.sides,
+            txn_table.units,
+            txn_table.buy_prices,
+            txn_table.sell_prices,
+            txn_table.buy_days,
+            txn_table.sell_days,
+        ):
+            mf_property: MFProperty | None = fund_properties[fund_code]
+
+            # Filter by asset type, portfolio and country
+            if mf_property is None or buy_day >= month_day:
                 continue
 
             # Two types of transactions will be eligible
             # 1 -> Transaction which has not been sold at any date and has been bought after current date
             # 2 -> Transaction has been sold, but was bought before the current date and sold after the current date
-            if (
-                txn.buy_sell.upper() == TransactionType.BUY.value
-                and txn.buy_date < month
-            ) or (
-                txn.buy_sell.upper() == TransactionType.SELL.value
-                and txn.buy_date < month
-                and txn.sell_date > month
+            if side == SIDE_BUY or (
+                (side == SIDE_SELL or side == SIDE_SELL_OTHER_CASE)
+                and sell_day > month_day
             ):
                 # Calculate nav price at date
-                current_price: Decimal
-
-                if txn.fund in fund_map:
-                    current_price = fund_map[txn.fund].price
-                    fund_map[txn.fund].add_qty(txn.units)
+                if fund_code in fund_qty:
+                    fund_qty[fund_code] += units
                 else:
-                    current_price = mf_api_client.get_nav_price(
+                    fund_price[fund_code] = mf_api_client.get_nav_price(
                         mf_property.amfi_code, month
                     )
-                    fund_map[txn.fund] = AssetValue.Meta(
-                        price=current_price,
-                        qty=txn.units,
-                        asset=mf_property.asset,
-                        portfolio=mf_property.portfolio,
-                        country=mf_property.country,
-                    )
+                    fund_qty[fund_code] = units
 
-                buy_value: Decimal = txn.units * txn.buy_price
-                current_value: Decimal = txn.units * current_price
+                buy_value: float = units * buy_price
+                current_value: float = units * float(fund_price[fund_code])
 
                 # Add to invested value
-                invested_value += buy_value
+                fund_invested[fund_code] = fund_invested.get(fund_code, 0.0) + buy_value
 
                 # Add cashflow values for XIRR
-                cashflow_values.append(float(buy_value) * -1)
-                cashflow_dates.append(txn.buy_date)
-                cashflow_values.append(float(current_value))
+                cashflow_dates, cashflow_values = self._get_cashflows(
+                    fund_cashflows, fund_code
+                )
+                cashflow_values.append(buy_value * -1)
+                cashflow_dates.append(self._to_date(dates, buy_day))
+                cashflow_values.append(current_value)
                 cashflow_dates.append(month)
 
             # These transactions are NOT eligible but are added to cashflows for XIRR and realized profits
             # These transactions are those transactions that have been bought and sold before the current date
             # Hence they are not part of the asset value at the current date but will be used to calculate realized profit and XIRR
-            elif (
-                txn.buy_sell == TransactionType.SELL.value
-                and txn.buy_date < month
-                and txn.sell_date < month
-            ):
-                buy_value: Decimal = txn.units * txn.buy_price
-                sell_value: Decimal = txn.units * txn.sell_price
+            elif side == SIDE_SELL and sell_day < month_day:
+                buy_value: float = units * buy_price
+                sell_value: float = units * sell_price
 
                 # Add to realized profits
-                realized_profit += sell_value - buy_value
+                fund_realized[fund_code] = (
+                    fund_realized.get(fund_code, 0.0) + sell_value - buy_value
+                )
 
                 # Add cashflow values for XIRR
-                cashflow_values.append(float(buy_value) * -1)
-                cashflow_dates.append(txn.buy_date)
-                cashflow_values.append(float(sell_value))
-                cashflow_dates.append(txn.sell_date)
+                cashflow_dates, cashflow_values = self._get_cashflows(
+                    fund_cashflows, fund_code
+                )
+                cashflow_values.append(buy_value * -1)
+                cashflow_dates.append(self._to_date(dates, buy_day))
+                cashflow_values.append(sell_value)
+                cashflow_dates.append(self._to_date(dates, sell_day))
+
+        # Contains the units, nav, asset type of each fund
+        fund_map: dict[str:"AssetValue.Meta"] = {}
+        for fund_code, qty in fund_qty.items():
+            mf_property: MFProperty = fund_properties[fund_code]
+            fund_map[txn_table.funds[fund_code]] = AssetValue.Meta(
+                price=fund_price[fund_code],
+                qty=self._to_decimal(qty),
+                asset=mf_property.asset,
+                portfolio=mf_property.portfolio,
+                country=mf_property.country,
+            )
 
         # Calculate equity/debt/cash split
         equity_value: Decimal = Decimal(0)
@@ -158,20 +183,162 @@ class AssetValueService:
 
             current_value += value
 
+        # Portfolio cashflows are the cashflows of all funds together
+        portfolio_cashflow: tuple[list[datetime], list[float]] = ([], [])
+        for cashflow_dates, cashflow_values in fund_cashflows.values():
+            portfolio_cashflow[0].extend(cashflow_dates)
+            portfolio_cashflow[1].extend(cashflow_values)
+
         # Calculate XIRR
-        xirr: float | None = listsXirr(cashflow_dates, cashflow_values)
-        xirr = xirr if xirr is not None else 0
+        fund_data_dict: dict[str, AssetValue.Data] = {}
+        if fund_level:
+            fund_codes: list[int] = list(fund_cashflows.keys())
+            xirr_list: list[float] = batch_xirr(
+                [portfolio_cashflow] + [fund_cashflows[code] for code in fund_codes]
+            )
+            xirr: float = xirr_list[0]
+
+            for fund_code, fund_xirr in zip(fund_codes, xirr_list[1:]):
+                fund: str = txn_table.funds[fund_code]
+                fund_data_dict[fund] = self._create_fund_data(
+                    month,
+                    fund_map.get(fund),
+                    self._to_decimal(fund_invested.get(fund_code, 0.0)),
+                    self._to_decimal(fund_realized.get(fund_code, 0.0)),
+                    fund_xirr,
+                )
+        else:
+            xirr: float = solve_xirr(portfolio_cashflow)
 
         return AssetValue(
             meta_dict=fund_map,
             data=AssetValue.Data(
                 month=month,
-                invested_value=invested_value,
+                invested_value=self._to_decimal(sum(fund_invested.values(), 0.0)),
                 current_value=current_value,
                 xirr=str(xirr),
-                realized=realized_profit,
+                realized=self._to_decimal(sum(fund_realized.values(), 0.0)),
                 equity_value=equity_value,
                 debt_value=debt_value,
                 cash_value=cash_value,
             ),
+            fund_data_dict=fund_data_dict,
+        )
+
+    @profiler.timed("benchmark")
+    def calculate_benchmark_asset_values(
+        self: Self,
+        benchmark_txn_list: list[MFTransaction] | TransactionTable,
+        mf_properties: dict[str, MFProperty],
+        mf_api_client: MFApiClient,
+        amfi_code: int,
+        from_date: datetime,
+        to_date: datetime,
+        assets_to_include: list[str],
+    ) -> list[AssetValue]:
+        """Returns the monthly asset values of the portfolio had its equity been invested in a benchmark fund"""
+        benchmark_txn_table: TransactionTable = TransactionTable.from_transactions(
+            benchmark_txn_list
+        )
+
+        # Benchmark transactions belong to a fund which is not part of the properties
+        benchmark_properties: dict[str, MFProperty] = dict(mf_properties)
+        benchmark_properties["Benchmark"] = MFProperty(
+            amfi_code, "Benchmark", "Equity", "India"
+        )
+
+        benchmark_asset_values: list[AssetValue] = []
+
+        month: datetime = from_date
+        while month <= to_date:
+            benchmark_asset_values.append(
+                self.calculate_mf_asset_value(
+                    txn_list=benchmark_txn_table,
+                    mf_properties=benchmark_properties,
+                    mf_api_client=mf_api_client,
+                    month=month,
+                    assets_to_include=assets_to_include,
+                )
+            )
+            month = add_month(month)
+
+        return benchmark_asset_values
+
+    def filter_property(
+        self: Self,
+        fund: str,
+        mf_property: MFProperty,
+        assets_to_include: list[str],
+        portfolio: str | None,
+        country: str | None,
+    ) -> MFProperty | None:
+        """Returns the property of a fund, or None if its transactions are filtered out"""
+        # Filter by asset type
+        if mf_property.asset.lower() not in assets_to_include:
+            logging.debug("Skipping %s due to asset type %s", fund, mf_property.asset)
+            return None
+
+        # Filter by portfolio
+        if portfolio is not None and mf_property.portfolio.lower() != portfolio.lower():
+            logging.debug("Skipping %s due to portfolio %s", fund, mf_property.portfolio)
+            return None
+
+        # Filter by country
+        if country is not None and mf_property.country.lower() != country.lower():
+            logging.debug("Skipping %s due to country %s", fund, mf_property.country)
+            return None
+
+        return mf_property
+
+    def _get_cashflows(
+        self: Self,
+        fund_cashflows: dict[int, tuple[list[datetime], list[float]]],
+        fund_code: int,
+    ) -> tuple[list[datetime], list[float]]:
+        if fund_code not in fund_cashflows:
+            fund_cashflows[fund_code] = ([], [])
+        return fund_cashflows[fund_code]
+
+    def _to_date(self: Self, dates: dict[int, datetime], day: int) -> datetime:
+        """Converts a day ordinal to a datetime, reusing the dates already converted"""
+        date: datetime | None = dates.get(day)
+        if date is None:
+            date = dates[day] = datetime.fromordinal(day)
+        return date
+
+    def _to_decimal(self: Self, value: float) -> Decimal:
+        """Converts a float sum back to Decimal, dropping the float rounding noise"""
+        return Decimal(repr(round(value, _DECIMAL_PLACES)))
+
+    def _create_fund_data(
+        self: Self,
+        month: datetime,
+        meta: "AssetValue.Meta | None",
+        invested_value: Decimal,
+        realized: Decimal,
+        xirr: float,
+    ) -> AssetValue.Data:
+        """Creates the values of a fund, a fully sold fund has no meta and no current value"""
+        current_value: Decimal = (
+            meta.qty * meta.price if meta is not None else Decimal(0)
+        )
+        asset: str = meta.asset.lower() if meta is not None else ""
+
+        return AssetValue.Data(
+            month=month,
+            invested_value=invested_value,
+            current_value=current_value,
+            xirr=str(xirr),
+            realized=realized,
+            equity_value=(
+                current_value
+                if asset in (Asset.EQUITY.value, Asset.ELSS.value)
+                else Decimal(0)
+            ),
+            debt_value=current_value if asset == Asset.DEBT.value else Decimal(0),
+            cash_value=(
+                current_value
+                if asset in (Asset.LIQUID.value, Asset.ARBITRAGE.value)
+                else Decimal(0)
+            ),
         )
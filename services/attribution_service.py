@@ -0,0 +1,136 @@
+"""
+services.attribution_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which splits the monthly change in value into new money and market movement.
+
+"""
+
+from typing import Self
+
+import numpy as np
+
+from models.asset_value import AssetValue
+from models.attribution import Attribution
+
+
+class AttributionService:
+    """Splits the change in value between consecutive months by fund, asset, portfolio and country"""
+
+    def calculate_attribution(
+        self: Self, asset_values: list[AssetValue]
+    ) -> list[Attribution]:
+        """Returns the attribution of every pair of consecutive months.
+
+        Units and prices of every fund are laid out as funds x months matrices, so the
+        change of each month is split as the change in units times price (new money)
+        and the units times the change in price (market) in a single array operation.
+        """
+        if len(asset_values) < 2:
+            return []
+
+        funds: list[str] = sorted(
+            {fund for asset_value in asset_values for fund in asset_value.meta_dict}
+        )
+        fund_index: dict[str, int] = {fund: i for i, fund in enumerate(funds)}
+
+        # Units and prices of each fund in each month, price is NaN if the fund is not held
+        units = np.zeros((len(funds), len(asset_values)))
+        prices = np.full((len(funds), len(asset_values)), np.nan)
+
+        # Classification of each fund is taken from the latest month it was held
+        fund_meta: dict[str, AssetValue.Meta] = {}
+
+        for month_index, asset_value in enumerate(asset_values):
+            for fund, meta in asset_value.meta_dict.items():
+                units[fund_index[fund], month_index] = float(meta.qty)
+                prices[fund_index[fund], month_index] = float(meta.price)
+                fund_meta[fund] = meta
+
+        previous_units: np.ndarray = units[:, :-1]
+        current_units: np.ndarray = units[:, 1:]
+
+        # A fund missing in one of the months is valued at the price of the other month
+        previous_prices: np.ndarray = np.where(
+            np.isnan(prices[:, :-1]), prices[:, 1:], prices[:, :-1]
+        )
+        current_prices: np.ndarray = np.where(
+            np.isnan(prices[:, 1:]), prices[:, :-1], prices[:, 1:]
+        )
+
+        new_money: np.ndarray = np.nan_to_num(
+            (current_units - previous_units) * current_prices
+        )
+        market: np.ndarray = np.nan_to_num(
+            previous_units * (current_prices - previous_prices)
+        )
+
+        attributions: list[Attribution] = []
+        for pair_index in range(len(asset_values) - 1):
+            by_fund: dict[str, Attribution.Split] = {
+                fund: Attribution.Split(
+                    new_money=float(new_money[i, pair_index]),
+                    market=float(market[i, pair_index]),
+                )
+                for i, fund in enumerate(funds)
+                if units[i, pair_index] != 0 or units[i, pair_index + 1] != 0
+            }
+
+            attributions.append(
+                Attribution(
+                    from_month=asset_values[pair_index].data.month,
+                    to_month=asset_values[pair_index + 1].data.month,
+                    by_fund=by_fund,
+                    by_asset=self._group(by_fund, fund_meta, lambda m: m.asset),
+                    by_portfolio=self._group(
+                        by_fund, fund_meta, lambda m: m.portfolio
+                    ),
+                    by_country=self._group(by_fund, fund_meta, lambda m: m.country),
+                )
+            )
+
+        return attributions
+
+    def total_attribution(self: Self, attributions: list[Attribution]) -> Attribution:
+        """Adds up the attribution of consecutive months into one attribution for the range"""
+        return Attribution(
+            from_month=attributions[0].from_month,
+            to_month=attributions[-1].to_month,
+            by_fund=self._add(attributions, lambda a: a.by_fund),
+            by_asset=self._add(attributions, lambda a: a.by_asset),
+            by_portfolio=self._add(attributions, lambda a: a.by_portfolio),
+            by_country=self._add(attributions, lambda a: a.by_country),
+        )
+
+    def _group(
+        self: Self,
+        by_fund: dict[str, Attribution.Split],
+        fund_meta: dict[str, AssetValue.Meta],
+        key,
+    ) -> dict[str, Attribution.Split]:
+        grouped: dict[str, Attribution.Split] = {}
+        for fund, split in by_fund.items():
+            name: str = key(fund_meta[fund])
+            if name in grouped:
+                grouped[name] = Attribution.Split(
+                    new_money=grouped[name].new_money + split.new_money,
+                    market=grouped[name].market + split.market,
+                )
+            else:
+                grouped[name] = split
+        return grouped
+
+    def _add(
+        self: Self, attributions: list[Attribution], splits
+    ) -> dict[str, Attribution.Split]:
+        added: dict[str, Attribution.Split] = {}
+        for attribution in attributions:
+            for name, split in splits(attribution).items():
+                if name in added:
+                    added[name] = Attribution.Split(
+                        new_money=added[name].new_money + split.new_money,
+                        market=added[name].market + split.market,
+                    )
+                else:
+                    added[name] = split
+        return added
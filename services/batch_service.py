@@ -0,0 +1,268 @@
+"""
+services.batch_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which calculates reports of many portfolios in one run.
+
+"""
+
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Self
+
+from apis.mf_api_client import MFApiClient
+from models.asset_value import AssetValue
+from models.mf_property import MFProperty
+from models.nav_history import NavHistory
+from models.portfolio_config import PortfolioConfig
+from models.shared_nav_store import SharedNavStore
+from models.transaction_table import TransactionTable
+from services.mf_data_service import MFDataService
+from services.mf_properties_service import MFPropertiesService
+from services.result_cache_service import ResultCacheService
+
+
+class BatchService:
+    """Calculates the portfolios of a manifest on a worker pool, sharing one NAV store.
+
+    Every portfolio is loaded and calculated by one worker, with services scoped to its own
+    spreadsheet, column mappings and cache folder. NAV histories are loaded into a single
+    api client by a separate pool as soon as the properties of a portfolio arrive, so a
+    scheme held by many portfolios is read once and the run grows with the number of
+    distinct schemes rather than the number of portfolios.
+
+    With processes, the NAV histories of all portfolios are loaded first and published
+    in shared memory, and portfolios are calculated on a process pool whose workers
+    attach to it. Workers read NAVs in place, so their memory does not grow with the
+    NAV store and starting one transfers only the table of schemes.
+    """
+
+    # NAV histories are loaded from disk or network, not bound by CPU
+    _NAV_WORKERS = 8
+
+    def __init__(
+        self: Self,
+        configs: list[PortfolioConfig],
+        workers: int,
+        override_cache=False,
+        processes=False,
+    ) -> None:
+        self._configs: list[PortfolioConfig] = configs
+        self._workers: int = workers
+        self._override_cache: bool = override_cache
+        self._processes: bool = processes
+
+        # Cached NAVs are cleared once for the whole batch, before any prefetch starts
+        self._mf_api_client = MFApiClient(override_cache)
+
+        self._amfi_codes: set[int] = set()
+        self._lock = threading.Lock()
+
+    def calculate_summaries(
+        self: Self, month: datetime
+    ) -> list[tuple[PortfolioConfig, AssetValue | None]]:
+        """Returns the asset value of every portfolio in a month, None for the ones which failed"""
+        if self._processes:
+            results: list[tuple[PortfolioConfig, AssetValue | None]] = (
+                self._calculate_in_processes(month)
+            )
+        else:
+            results: list[tuple[PortfolioConfig, AssetValue | None]] = (
+                self._calculate_in_threads(month)
+            )
+
+        logging.info(
+            "Calculated %s portfolios holding %s distinct schemes",
+            len(self._configs),
+            len(self._amfi_codes),
+        )
+
+        return results
+
+    def _calculate_in_threads(
+        self: Self, month: datetime
+    ) -> list[tuple[PortfolioConfig, AssetValue | None]]:
+        # Portfolio workers wait for NAV histories, so those must load on a pool of their own
+        with ThreadPoolExecutor(
+            max_workers=self._NAV_WORKERS, thread_name_prefix="nav"
+        ) as nav_executor, ThreadPoolExecutor(
+            max_workers=self._workers, thread_name_prefix="portfolio"
+        ) as executor:
+            futures: list[Future] = [
+                executor.submit(self._calculate_summary, config, month, nav_executor)
+                for config in self._configs
+            ]
+
+            return self._collect_results(self._configs, futures)
+
+    def _calculate_in_processes(
+        self: Self, month: datetime
+    ) -> list[tuple[PortfolioConfig, AssetValue | None]]:
+        # Inputs are synced and NAV histories loaded in this process, before any worker starts
+        with ThreadPoolExecutor(
+            max_workers=self._NAV_WORKERS, thread_name_prefix="nav"
+        ) as nav_executor, ThreadPoolExecutor(
+            max_workers=self._workers, thread_name_prefix="portfolio"
+        ) as executor:
+            futures: list[Future] = [
+                executor.submit(self._load_portfolio, config, nav_executor)
+                for config in self._configs
+            ]
+
+            loaded: list[tuple[PortfolioConfig, bool | None]] = self._collect_results(
+                self._configs, futures
+            )
+
+        nav_histories: dict[int, NavHistory] = {}
+        for amfi_code in sorted(self._amfi_codes):
+            nav_history: NavHistory | None = self._mf_api_client.nav_history(amfi_code)
+            if nav_history is not None:
+                nav_histories[amfi_code] = nav_history
+
+        # Portfolios which could not be loaded are reported as failed without calculating
+        configs: list[PortfolioConfig] = [
+            config for config, is_loaded in loaded if is_loaded
+        ]
+        results: dict[str, AssetValue | None] = {
+            config.name: None for config, is_loaded in loaded if not is_loaded
+        }
+
+        with SharedNavStore.publish(nav_histories) as nav_store:
+            logging.info(
+                "Published NAV histories of %s schemes in %s bytes of shared memory",
+                len(nav_histories),
+                nav_store.size,
+            )
+
+            with ProcessPoolExecutor(
+                max_workers=self._workers,
+                initializer=_attach_nav_store,
+                initargs=(nav_store.descriptor,),
+            ) as executor:
+                futures: list[Future] = [
+                    executor.submit(_calculate_in_worker, config, month)
+                    for config in configs
+                ]
+
+                for config, result in self._collect_results(configs, futures):
+                    results[config.name] = result
+
+        return [(config, results[config.name]) for config in self._configs]
+
+    def _collect_results(
+        self: Self, configs: list[PortfolioConfig], futures: list[Future]
+    ) -> list[tuple[PortfolioConfig, Any]]:
+        """Waits for the futures of portfolios, with None as the result of the ones which failed"""
+        results: list[tuple[PortfolioConfig, Any]] = []
+
+        for config, future in zip(configs, futures):
+            try:
+                results.append((config, future.result()))
+            # Services exit on invalid sheets or credentials, which must not end the batch
+            except (Exception, SystemExit):
+                logging.exception("Failed to calculate portfolio %s", config.name)
+                results.append((config, None))
+
+        return results
+
+    def _load_portfolio(
+        self: Self, config: PortfolioConfig, nav_executor: ThreadPoolExecutor
+    ) -> bool:
+        """Syncs the inputs of a portfolio to its cache, and starts loading its NAV histories"""
+        logging.debug("Loading portfolio %s", config.name)
+
+        mf_properties: dict[str, MFProperty] = MFPropertiesService(
+            self._override_cache, config.properties_source, config
+        ).mf_properties()
+        self._prefetch(mf_properties, nav_executor)
+
+        MFDataService(self._override_cache, config.source, config).mf_txn_table()
+
+        return True
+
+    def _prefetch(
+        self: Self,
+        mf_properties: dict[str, MFProperty],
+        nav_executor: ThreadPoolExecutor,
+    ) -> None:
+        # Schemes already loaded or loading for another portfolio are not loaded again
+        amfi_codes: set[int] = {
+            mf_property.amfi_code for mf_property in mf_properties.values()
+        }
+        self._mf_api_client.prefetch_nav_prices(list(amfi_codes), nav_executor)
+        with self._lock:
+            self._amfi_codes |= amfi_codes
+
+    def _calculate_summary(
+        self: Self,
+        config: PortfolioConfig,
+        month: datetime,
+        nav_executor: ThreadPoolExecutor,
+    ) -> AssetValue:
+        logging.debug("Calculating portfolio %s", config.name)
+
+        mf_properties: dict[str, MFProperty] = MFPropertiesService(
+            self._override_cache, config.properties_source, config
+        ).mf_properties()
+        self._prefetch(mf_properties, nav_executor)
+
+        mf_txn_table: TransactionTable = MFDataService(
+            self._override_cache, config.source, config
+        ).mf_txn_table()
+
+        return _calculate_asset_value(
+            config, month, mf_properties, mf_txn_table, self._mf_api_client
+        )
+
+
+# NAV store of a worker process, attached once as the worker starts
+_nav_store: SharedNavStore | None = None
+_worker_mf_api_client: MFApiClient | None = None
+
+
+def _attach_nav_store(descriptor: tuple[str, dict]) -> None:
+    """Initializes a worker process with an api client reading NAVs from shared memory"""
+    global _nav_store, _worker_mf_api_client
+
+    _nav_store = SharedNavStore.attach(descriptor)
+    _worker_mf_api_client = MFApiClient()
+    _worker_mf_api_client.add_nav_histories(_nav_store.nav_histories())
+
+
+def _calculate_in_worker(config: PortfolioConfig, month: datetime) -> AssetValue:
+    """Calculates a portfolio from the inputs synced to its cache by the batch process"""
+    logging.debug("Calculating portfolio %s", config.name)
+
+    mf_properties: dict[str, MFProperty] = MFPropertiesService(
+        False, config.properties_source, config
+    ).mf_properties()
+    mf_txn_table: TransactionTable = MFDataService(
+        False, config.source, config
+    ).mf_txn_table()
+
+    return _calculate_asset_value(
+        config, month, mf_properties, mf_txn_table, _worker_mf_api_client
+    )
+
+
+def _calculate_asset_value(
+    config: PortfolioConfig,
+    month: datetime,
+    mf_properties: dict[str, MFProperty],
+    mf_txn_table: TransactionTable,
+    mf_api_client: MFApiClient,
+) -> AssetValue:
+    result_cache_service = ResultCacheService(
+        mf_txn_table, mf_properties, mf_api_client, config
+    )
+
+    asset_value: AssetValue = result_cache_service.calculate_mf_asset_value(
+        month=month,
+        assets_to_include=["equity", "elss", "debt", "arbitrage"],
+        fund_level=True,
+    )
+    result_cache_service.save()
+
+    return asset_value
@@ -0,0 +1,195 @@
+"""
+services.cache_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which inspects, verifies and prunes the cache folders.
+
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Self
+
+from apis.mf_api_client import MFApiClient
+from models.cache_entry import CacheEntry
+from utils import files
+
+
+class CacheService:
+    """Lists the files of all cache folders, including the folders of batch portfolios.
+
+    Files written through the cache codecs are entries, files left behind by a write which
+    did not complete are partial, and .json files written before the codecs are legacy.
+    """
+
+    # Cache folders of the services, NAV histories and return matrices are shared
+    _SHARED_FOLDER_NAMES: list[str] = ["mf_api_response", "nav_matrix"]
+    _PORTFOLIO_FOLDER_NAMES: list[str] = ["sheet_data", "results", "snapshot"]
+
+    # Folder of the portfolios of a batch manifest, as in PortfolioConfig
+    _PORTFOLIOS_FOLDER_NAME = "portfolios"
+
+    _NAV_FOLDER_NAME = "mf_api_response"
+
+    # Younger partial files may belong to a write of another run still in progress
+    _PARTIAL_GRACE_SECONDS = 60
+
+    def __init__(self: Self) -> None:
+        self._mf_api_client = MFApiClient()
+
+    def folder_names(self: Self) -> list[str]:
+        """Returns every cache folder which exists"""
+        folder_names: list[str] = (
+            self._SHARED_FOLDER_NAMES + self._PORTFOLIO_FOLDER_NAMES
+        )
+
+        portfolios_path: str = files.get_folder_path(self._PORTFOLIOS_FOLDER_NAME)
+        if os.path.isdir(portfolios_path):
+            for portfolio in sorted(os.listdir(portfolios_path)):
+                folder_names += [
+                    os.path.join(self._PORTFOLIOS_FOLDER_NAME, portfolio, folder_name)
+                    for folder_name in self._PORTFOLIO_FOLDER_NAMES
+                ]
+
+        return [
+            folder_name
+            for folder_name in folder_names
+            if os.path.isdir(files.get_folder_path(folder_name))
+        ]
+
+    def entries(self: Self) -> list[CacheEntry]:
+        entries: list[CacheEntry] = []
+
+        for folder_name in self.folder_names():
+            folder_path: str = files.get_folder_path(folder_name)
+
+            for file_name in sorted(os.listdir(folder_path)):
+                kind: str | None = self._kind(file_name)
+                file_path: str = os.path.join(folder_path, file_name)
+                if kind is None or not os.path.isfile(file_path):
+                    continue
+
+                stat: os.stat_result = os.stat(file_path)
+                entries.append(
+                    CacheEntry(
+                        folder_name=folder_name,
+                        file_name=file_name,
+                        kind=kind,
+                        size=stat.st_size,
+                        modified_time=datetime.fromtimestamp(stat.st_mtime),
+                    )
+                )
+
+        return entries
+
+    def nav_entries(self: Self, entries: list[CacheEntry]) -> dict[int, CacheEntry]:
+        """Returns the cached NAV histories by AMFI code"""
+        return {
+            int(entry.name): entry
+            for entry in entries
+            if entry.folder_name == self._NAV_FOLDER_NAME
+            and entry.kind == CacheEntry.CACHE
+            and entry.name.isdigit()
+        }
+
+    def nav_range(
+        self: Self, amfi_code: int
+    ) -> tuple[int, datetime, datetime] | None:
+        """Returns the number of cached NAVs of a scheme with the first and last date"""
+        return self._mf_api_client.cached_nav_range(amfi_code)
+
+    def verify(self: Self, entries: list[CacheEntry]) -> dict[str, str]:
+        """Returns what is wrong with each entry which cannot be read, by path"""
+        problems: dict[str, str] = {}
+        now: datetime = datetime.now()
+
+        for entry in entries:
+            if entry.kind == CacheEntry.PARTIAL:
+                age: float = (now - entry.modified_time).total_seconds()
+                if age >= self._PARTIAL_GRACE_SECONDS:
+                    problems[entry.path] = "left behind by an incomplete write"
+            elif entry.kind == CacheEntry.CACHE:
+                problem: str | None = files.verify_cache_file(
+                    files.get_folder_path(entry.path)
+                )
+                if problem is not None:
+                    problems[entry.path] = problem
+
+        return problems
+
+    def select(
+        self: Self,
+        entries: list[CacheEntry],
+        folder_name: str | None = None,
+        portfolio: str | None = None,
+        amfi_codes: list[int] | None = None,
+        older_than_days: float | None = None,
+        corrupt=False,
+        legacy=False,
+    ) -> list[CacheEntry]:
+        """Returns the entries matching every given selection"""
+        problems: dict[str, str] = self.verify(entries) if corrupt else {}
+        scheme_names: set[str] | None = (
+            {str(amfi_code) for amfi_code in amfi_codes}
+            if amfi_codes is not None
+            else None
+        )
+        now: datetime = datetime.now()
+
+        selected: list[CacheEntry] = []
+        for entry in entries:
+            # Folders of batch portfolios are portfolios/<name>/<folder>
+            folder_parts: list[str] = entry.folder_name.split(os.sep)
+            age_days: float = (now - entry.modified_time).total_seconds() / 86400
+
+            if folder_name is not None and folder_parts[-1] != folder_name:
+                continue
+            if portfolio is not None and folder_parts[:2] != [
+                self._PORTFOLIOS_FOLDER_NAME,
+                portfolio,
+            ]:
+                continue
+            if scheme_names is not None and (
+                entry.folder_name != self._NAV_FOLDER_NAME
+                or entry.name not in scheme_names
+            ):
+                continue
+            if older_than_days is not None and age_days < older_than_days:
+                continue
+            if corrupt and entry.path not in problems:
+                continue
+            if legacy and entry.kind != CacheEntry.LEGACY:
+                continue
+            selected.append(entry)
+
+        return selected
+
+    def prune(self: Self, entries: list[CacheEntry], dry_run=False) -> int:
+        """Deletes entries, returns the number of bytes freed"""
+        size = 0
+
+        for entry in entries:
+            if not dry_run:
+                try:
+                    os.remove(files.get_folder_path(entry.path))
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logging.warning("Could not remove %s: %s", entry.path, e)
+                    continue
+
+                logging.debug("Removed %s", entry.path)
+
+            size += entry.size
+
+        return size
+
+    def _kind(self: Self, file_name: str) -> str | None:
+        if file_name.endswith(".tmp"):
+            return CacheEntry.PARTIAL
+        if file_name.endswith(".cache"):
+            return CacheEntry.CACHE
+        if file_name.endswith(".json"):
+            return CacheEntry.LEGACY
+        return None
@@ -6,135 +6,308 @@ This module contains a service class which reads and stores MF Data sheet.
 
 """
 
+import hashlib
 import logging
 import os
 import sys
+from datetime import datetime
 from decimal import Decimal
 from typing import Self
 
-from gspread.spreadsheet import Spreadsheet
-from gspread.worksheet import Worksheet
-
-from apis.google_sheets_client import GoogleSheetsClient
+from apis.csv_client import CsvClient, is_csv_source
 from apis.mf_api_client import MFApiClient
 from models.mf_property import MFProperty
 from models.mf_transaction import MFTransaction
-from utils import dates, files
-from utils.functions import to_num
+from models.portfolio_config import PortfolioConfig
+from models.transaction_table import TransactionTable
+from services.sheet_loader_service import SheetLoaderService
+from utils import cache_counters, dates, files, profiler
 
 
 class MFDataService:
     """This service file reads and stores MF Data sheet locally"""
 
-    _sheet = None
-    _worksheet = None
-    _mf_txn_data: list[MFTransaction]
-
-    _WORKSHEET_NAME: str | None = os.environ.get("TRANSACTIONS_WORKSHEET_NAME")
-
-    _FIRST_ROW: int | None = int(os.environ.get("TRANSACTIONS_FIRST_ROW"))
-    _FUND_NAME_COL: int | None = to_num(os.environ.get("TRANSACTIONS_FUND_NAME_COL"))
-    _BUY_SELL_COL: int | None = to_num(os.environ.get("TRANSACTIONS_BUY_SELL_COL"))
-    _UNITS_COL: int | None = to_num(os.environ.get("TRANSACTIONS_UNITS_COL"))
-    _BUY_DATE_COL: int | None = to_num(os.environ.get("TRANSACTIONS_BUY_DATE_COL"))
-    _BUY_PRICE_COL: int | None = to_num(os.environ.get("TRANSACTIONS_BUY_PRICE_COL"))
-    _SELL_DATE_COL: int | None = to_num(os.environ.get("TRANSACTIONS_SELL_DATE_COL"))
-    _SELL_PRICE_COL: int | None = to_num(os.environ.get("TRANSACTIONS_SELL_PRICE_COL"))
+    _mf_txn_data: list[MFTransaction] | None
+    _mf_txn_table: TransactionTable | None
 
     _FOLDER_NAME = "sheet_data"
     _FILE_NAME = "mf_txn_data"
+    _SYNC_FILE_NAME = "mf_txn_sync"
+
+    # Bumped whenever the format of the cached transactions changes
+    _SCHEMA_VERSION = 1
+
+    # Fields of a serialized transaction, each cached as a column
+    _FIELDS: list[str] = [
+        "fund",
+        "buy_sell",
+        "units",
+        "buy_date",
+        "buy_price",
+        "sell_date",
+        "sell_price",
+    ]
+
+    @profiler.timed("transactions.load")
+    def __init__(
+        self,
+        override_cache=False,
+        source: str | None = None,
+        config: PortfolioConfig | None = None,
+        txn_table: TransactionTable | None = None,
+    ) -> None:
+        config = config if config is not None else PortfolioConfig.default()
+
+        self._source: str | None = source
+        self._config: PortfolioConfig = config
+        self._worksheet_name: str | None = config.transactions_worksheet_name
+        self._first_row: int | None = config.transactions_first_row
+        # Mapped columns in the order MFTransaction expects them
+        self._columns: list[int | None] = list(config.transaction_columns.values())
+        self._folder_name: str = config.cache_folder(self._FOLDER_NAME)
+
+        self._changed_funds: dict[str, datetime] = {}
+        self._mf_txn_table: TransactionTable | None = None
+
+        # Transactions which are already prepared, as taken from a snapshot
+        if txn_table is not None:
+            txn_data: TransactionTable = txn_table
+        elif is_csv_source(source):
+            txn_data: list[MFTransaction] = self._fetch_data_from_csv(source)
+        elif override_cache is True:
+            txn_data: list[MFTransaction] | TransactionTable = (
+                self._fetch_data_from_sheets()
+            )
+        else:
+            txn_data: list[MFTransaction] | TransactionTable = (
+                self._fetch_data_from_cache()
+            )
 
-    def __init__(self, override_cache=False) -> None:
-        if override_cache is True:
-            self._mf_txn_data: list[MFTransaction] = self._fetch_data_from_sheets()
+        # Unchanged cached transactions are loaded straight into a table
+        if isinstance(txn_data, TransactionTable):
+            self._mf_txn_data = None
+            self._mf_txn_table = txn_data
         else:
-            self._mf_txn_data: list[MFTransaction] = self._fetch_data_from_cache()
+            self._mf_txn_data = txn_data
 
-    def _fetch_data_from_sheets(self):
+    def _fetch_data_from_sheets(self) -> list[MFTransaction] | TransactionTable:
         if (
-            self._WORKSHEET_NAME is None
-            or self._FIRST_ROW is None
-            or self._FUND_NAME_COL is None
-            or self._BUY_SELL_COL is None
-            or self._UNITS_COL is None
-            or self._BUY_DATE_COL is None
-            or self._BUY_PRICE_COL is None
-            or self._SELL_DATE_COL is None
-            or self._SELL_PRICE_COL is None
+            self._worksheet_name is None
+            or self._first_row is None
+            or any(column is None for column in self._columns)
         ):
             logging.error(
                 "One or more environment variables are not set for MF Transaction Sheet"
             )
             sys.exit(1)
 
-        logging.info("Fetching %s from Google Sheets...", self._WORKSHEET_NAME)
+        sheet_loader = SheetLoaderService(self._config)
 
-        if self._sheet is None:
-            self._sheet: Spreadsheet = GoogleSheetsClient().get_sheet()
+        sync_state: dict | None = files.read_cache_file(
+            self._folder_name, self._SYNC_FILE_NAME, self._SCHEMA_VERSION
+        )
+        cached_columns: dict[str, list[str]] | None = files.read_cache_file(
+            self._folder_name, self._FILE_NAME, self._SCHEMA_VERSION
+        )
 
-        if self._worksheet is None:
-            self._worksheet: Worksheet = self._sheet.worksheet(self._WORKSHEET_NAME)
+        if cached_columns is None or sync_state is None:
+            sync_state = {"modified_time": None, "fingerprints": []}
+            cached_columns = {field: [] for field in self._FIELDS}
 
-        rows: list[list] = self._worksheet.get_all_values()
+        # Nothing to download if the spreadsheet has not been modified since last sync,
+        # nor has the worksheet, first row or column mapping the rows were read with
+        modified_time: str | None = sheet_loader.get_modified_time()
+        layout: dict = self._layout()
+        if (
+            modified_time is not None
+            and modified_time == sync_state["modified_time"]
+            and layout == sync_state.get("layout")
+        ):
+            logging.info("%s has not changed since last sync", self._worksheet_name)
+            cache_counters.record("sheet_data", cache_counters.HIT)
+            return TransactionTable.from_columns(cached_columns)
+
+        rows: list[list] = sheet_loader.get_rows(self._worksheet_name)
+        cache_counters.record("sheet_data", cache_counters.FETCH)
+        json_data: list[dict] = files.columns_to_rows(cached_columns)
+
+        # Cached transactions which can be reused, grouped by fingerprint of their sheet row
+        cached_entries: dict[str, list[dict]] = {}
+        for fingerprint, value in zip(sync_state["fingerprints"], json_data):
+            cached_entries.setdefault(fingerprint, []).append(value)
+
+        entries: list[tuple[str, MFTransaction]] = []
+        added_txn_list: list[MFTransaction] = []
+
+        # Rows contain only the mapped columns, starting from the specified row
+        for row in rows:
+            fingerprint: str = self._fingerprint(row)
+
+            if len(cached_entries.get(fingerprint, [])) > 0:
+                txn = MFTransaction.from_dict(cached_entries[fingerprint].pop())
+            else:
+                fund, buy_sell, units, buy_date, buy_price, sell_date, sell_price = row
+                txn = MFTransaction(
+                    fund=fund,
+                    buy_sell=buy_sell,
+                    units=units,
+                    buy_date=buy_date,
+                    buy_price=buy_price,
+                    sell_date=sell_date,
+                    sell_price=sell_price,
+                )
+                added_txn_list.append(txn)
 
-        txn_list: list[MFTransaction] = []
+            entries.append((fingerprint, txn))
 
-        # Data begins from the specified row
-        for row in rows[self._FIRST_ROW :]:
-            txn_list.append(
-                MFTransaction(
-                    fund=row[self._FUND_NAME_COL],
-                    buy_sell=row[self._BUY_SELL_COL],
-                    units=row[self._UNITS_COL],
-                    buy_date=row[self._BUY_DATE_COL],
-                    buy_price=row[self._BUY_PRICE_COL],
-                    sell_date=row[self._SELL_DATE_COL],
-                    sell_price=row[self._SELL_PRICE_COL],
-                )
-            )
+        # Cached transactions whose rows were edited or deleted
+        removed_txn_list: list[MFTransaction] = [
+            MFTransaction.from_dict(value)
+            for values in cached_entries.values()
+            for value in values
+        ]
+
+        self._changed_funds = self._earliest_change_by_fund(
+            added_txn_list + removed_txn_list
+        )
 
         logging.info(
-            "Fetched %s transactions from sheet %s", len(txn_list), self._WORKSHEET_NAME
+            "Fetched %s transactions from sheet %s, %s added and %s removed since last sync",
+            len(entries),
+            self._worksheet_name,
+            len(added_txn_list),
+            len(removed_txn_list),
         )
 
         # Sort transactions based on buy date
-        sorted_txn_list: list[MFTransaction] = sorted(
-            txn_list, key=lambda x: (x.buy_date, x.fund)
+        entries.sort(key=lambda x: (x[1].buy_date, x[1].fund))
+        sorted_txn_list: list[MFTransaction] = [txn for _, txn in entries]
+
+        fingerprints: list[str] = [fingerprint for fingerprint, _ in entries]
+
+        # Save file to cache only if a transaction has changed or moved, as the
+        # fingerprints are matched to the cached transactions by position
+        if fingerprints != sync_state["fingerprints"]:
+            serialized_list: list[dict] = self._serialize(sorted_txn_list)
+            files.save_cache_file(
+                self._folder_name,
+                self._FILE_NAME,
+                files.rows_to_columns(serialized_list, self._FIELDS),
+                self._SCHEMA_VERSION,
+                codec="record",
+            )
+            logging.debug("Saved %s transactions to cache", len(serialized_list))
+
+        files.save_cache_file(
+            self._folder_name,
+            self._SYNC_FILE_NAME,
+            {
+                "modified_time": modified_time,
+                "layout": layout,
+                "fingerprints": fingerprints,
+            },
+            self._SCHEMA_VERSION,
         )
 
-        serialized_list: list[dict] = self._serialize(sorted_txn_list)
+        return sorted_txn_list
 
-        # Save file to cache
-        files.save_file_as_json(self._FOLDER_NAME, self._FILE_NAME, serialized_list)
-        logging.debug("Saved %s transactions to cache", len(serialized_list))
+    def source_file_path(self: Self) -> str:
+        """Returns the file transactions are read from, the CSV export or the cache"""
+        if is_csv_source(self._source):
+            return os.path.abspath(CsvClient(self._source).file_path)
+        return files.get_cache_file_path(self._folder_name, self._FILE_NAME)
+
+    def _layout(self: Self) -> dict:
+        """Returns where rows are read from, as cached rows are valid only for it"""
+        return {
+            "worksheet_name": self._worksheet_name,
+            "first_row": self._first_row,
+            "columns": self._columns,
+        }
+
+    def _fingerprint(self: Self, row: tuple[str, ...]) -> str:
+        """Returns a short hash of the mapped columns of a sheet row"""
+        return hashlib.sha1("\x1f".join(row).encode("utf-8")).hexdigest()[:16]
+
+    def _earliest_change_by_fund(
+        self: Self, txn_list: list[MFTransaction]
+    ) -> dict[str, datetime]:
+        changed_funds: dict[str, datetime] = {}
+        for txn in txn_list:
+            if txn.fund not in changed_funds or txn.buy_date < changed_funds[txn.fund]:
+                changed_funds[txn.fund] = txn.buy_date
+        return changed_funds
+
+    def _fetch_data_from_csv(self: Self, source: str) -> list[MFTransaction]:
+        if self._first_row is None or any(column is None for column in self._columns):
+            logging.error(
+                "One or more environment variables are not set for MF Transaction Sheet"
+            )
+            sys.exit(1)
 
-        return sorted_txn_list
+        logging.info("Fetching transactions from %s...", source)
+
+        # Rows are streamed from the file straight into transactions
+        txn_list: list[MFTransaction] = [
+            MFTransaction(
+                fund=fund,
+                buy_sell=buy_sell,
+                units=units,
+                buy_date=buy_date,
+                buy_price=buy_price,
+                sell_date=sell_date,
+                sell_price=sell_price,
+            )
+            for fund, buy_sell, units, buy_date, buy_price, sell_date, sell_price in CsvClient(
+                source
+            ).iter_rows(self._first_row, self._columns)
+        ]
+
+        logging.info("Fetched %s transactions from %s", len(txn_list), source)
+
+        # Sort transactions based on buy date
+        txn_list.sort(key=lambda x: (x.buy_date, x.fund))
 
-    def _fetch_data_from_cache(self):
-        logging.info("Fetching %s from cache...", self._WORKSHEET_NAME)
+        return txn_list
+
+    def _fetch_data_from_cache(self) -> list[MFTransaction] | TransactionTable:
+        logging.info("Fetching %s from cache...", self._worksheet_name)
 
-        json_data: list[dict] | None = files.read_file_as_json(
-            self._FOLDER_NAME, self._FILE_NAME
+        cached_columns: dict[str, list[str]] | None = files.read_cache_file(
+            self._folder_name, self._FILE_NAME, self._SCHEMA_VERSION
         )
 
-        if json_data is None:
-            logging.warning("Did not find %s in cache", self._WORKSHEET_NAME)
+        if cached_columns is None:
+            logging.warning("Did not find %s in cache", self._worksheet_name)
+            cache_counters.record("sheet_data", cache_counters.MISS)
             return self._fetch_data_from_sheets()
 
-        txn_list: list[MFTransaction] = [
-            MFTransaction.from_dict(value) for value in json_data
-        ]
+        cache_counters.record("sheet_data", cache_counters.HIT)
+        txn_table: TransactionTable = TransactionTable.from_columns(cached_columns)
 
-        logging.info("Fetched %s transactions from cache", len(txn_list))
+        logging.info("Fetched %s transactions from cache", len(txn_table))
 
-        return txn_list
+        return txn_table
 
     def _serialize(self: Self, txn_list: list[MFTransaction]) -> list[dict]:
         return [value.to_dict() for value in txn_list]
 
     def mf_txn_data(self: Self) -> list[MFTransaction]:
+        if self._mf_txn_data is None:
+            self._mf_txn_data = self._mf_txn_table.to_transactions()
         return self._mf_txn_data
 
+    def mf_txn_table(self: Self) -> TransactionTable:
+        """Returns transactions as a compact column table, releasing the transaction objects"""
+        if self._mf_txn_table is None:
+            self._mf_txn_table = TransactionTable.from_transactions(self._mf_txn_data)
+            self._mf_txn_data = None
+        return self._mf_txn_table
+
+    def changed_funds(self: Self) -> dict[str, datetime]:
+        """Returns the funds changed by the last sync with the buy date of their earliest changed transaction"""
+        return self._changed_funds
+
     def benchmark_txn_data(
         self: Self,
         mf_properties: dict[str, MFProperty],
@@ -149,10 +322,12 @@ class MFDataService:
         mf_api_client: MFApiClient,
         amfi_code: int,
     ) -> list[MFTransaction]:
-        actual_txn_list: list[MFTransaction] = self.mf_txn_data()
-
-        if actual_txn_list is None:
-            actual_txn_list = self._fetch_data_from_cache()
+        # Rows of the table have the same properties as transactions
+        actual_txn_list: list[MFTransaction] | TransactionTable = (
+            self._mf_txn_table
+            if self._mf_txn_table is not None
+            else self.mf_txn_data()
+        )
 
         benchmark_txn_list: list[MFTransaction] = []
 
@@ -204,3 +379,4 @@ class MFDataService:
             )
 
         return benchmark_txn_list
+
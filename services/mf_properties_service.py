@@ -11,106 +11,206 @@ import os
 import sys
 from typing import Self
 
-from gspread.spreadsheet import Spreadsheet
-from gspread.worksheet import Worksheet
-
-from apis.google_sheets_client import GoogleSheetsClient
+from apis.csv_client import CsvClient, is_csv_source
 from models.mf_property import MFProperty
-from utils import files
-from utils.functions import to_num
+from models.portfolio_config import PortfolioConfig
+from services.sheet_loader_service import SheetLoaderService
+from utils import cache_counters, files, profiler
 from utils.logger import setup_logging
 
 
 class MFPropertiesService:
     """This service file reads and stores MF Properties sheet locally"""
 
-    _sheet = None
-    _worksheet = None
     _mf_properties: dict[str, MFProperty]
 
-    _WORKSHEET_NAME: str | None = os.environ.get("PROPERTIES_WORKSHEET_NAME")
-
-    _FIRST_ROW: int | None = int(os.environ.get("PROPERTIES_FIRST_ROW"))
-    _FUND_NAME_COL: int | None = to_num(os.environ.get("PROPERTIES_FUND_NAME_COL"))
-    _AMFI_CODE_COL: int | None = to_num(os.environ.get("PROPERTIES_AMFI_CODE_COL"))
-    _PORTFOLIO_COL: int | None = to_num(os.environ.get("PROPERTIES_PORTFOLIO_COL"))
-    _ASSET_COL: int | None = to_num(os.environ.get("PROPERTIES_ASSET_COL"))
-    _COUNTRY_COL: int | None = to_num(os.environ.get("PROPERTIES_COUNTRY_COL"))
-
     _FOLDER_NAME = "sheet_data"
     _FILE_NAME = "mf_properties"
-
-    def __init__(self, override_cache=False) -> None:
-        if override_cache is True:
+    _SYNC_FILE_NAME = "mf_properties_sync"
+
+    # Bumped whenever the format of the cached properties changes
+    _SCHEMA_VERSION = 1
+
+    @profiler.timed("properties.load")
+    def __init__(
+        self,
+        override_cache=False,
+        source: str | None = None,
+        config: PortfolioConfig | None = None,
+    ) -> None:
+        config = config if config is not None else PortfolioConfig.default()
+
+        self._source: str | None = source
+        self._config: PortfolioConfig = config
+        self._worksheet_name: str | None = config.properties_worksheet_name
+        self._first_row: int | None = config.properties_first_row
+        self._column_map: dict[str, int | None] = config.property_columns
+        # Mapped columns in the order MFProperty expects them
+        self._columns: list[int | None] = list(config.property_columns.values())
+        self._folder_name: str = config.cache_folder(self._FOLDER_NAME)
+
+        self._changed_funds: set[str] = set()
+
+        if is_csv_source(source):
+            self._mf_properties: dict[str, MFProperty] = self._fetch_data_from_csv(
+                source
+            )
+        elif override_cache is True:
             self._mf_properties: dict[str, MFProperty] = self._fetch_data_from_sheets()
         else:
             self._mf_properties: dict[str, MFProperty] = self._fetch_data_from_cache()
 
     def _fetch_data_from_sheets(self: Self) -> dict[str, MFProperty]:
         if (
-            self._WORKSHEET_NAME is None
-            or self._FIRST_ROW is None
-            or self._FUND_NAME_COL is None
-            or self._AMFI_CODE_COL is None
-            or self._ASSET_COL is None
+            self._worksheet_name is None
+            or self._first_row is None
+            or self._is_missing_columns()
         ):
             logging.error(
                 "One or more environment variables are not set for MF Properties Sheet"
             )
             sys.exit(1)
 
-        logging.info("Fetching %s from Google Sheets...", self._WORKSHEET_NAME)
+        sheet_loader = SheetLoaderService(self._config)
 
-        if self._sheet is None:
-            self._sheet: Spreadsheet = GoogleSheetsClient().get_sheet()
+        sync_state: dict | None = files.read_cache_file(
+            self._folder_name, self._SYNC_FILE_NAME, self._SCHEMA_VERSION
+        )
+        json_data: dict[str, dict] | None = files.read_cache_file(
+            self._folder_name, self._FILE_NAME, self._SCHEMA_VERSION
+        )
 
-        if self._worksheet is None:
-            self._worksheet: Worksheet = self._sheet.worksheet(self._WORKSHEET_NAME)
+        # Nothing to download if the spreadsheet has not been modified since last sync,
+        # nor has the worksheet, first row or column mapping the rows were read with
+        modified_time: str | None = sheet_loader.get_modified_time()
+        layout: dict = self._layout()
+        if (
+            json_data is not None
+            and sync_state is not None
+            and modified_time is not None
+            and modified_time == sync_state["modified_time"]
+            and layout == sync_state.get("layout")
+        ):
+            logging.info("%s has not changed since last sync", self._worksheet_name)
+            cache_counters.record("sheet_data", cache_counters.HIT)
+            return {
+                key: MFProperty.from_dict(value) for key, value in json_data.items()
+            }
 
-        rows: list[list] = self._worksheet.get_all_values()
+        rows: list[list] = sheet_loader.get_rows(self._worksheet_name)
+        cache_counters.record("sheet_data", cache_counters.FETCH)
 
         mf_properties: dict[str, MFProperty] = {}
 
-        # Data begins from the 4th row
-        for row in rows[4:]:
-            if row[self._FUND_NAME_COL]:
-                mf_properties[row[self._FUND_NAME_COL]] = MFProperty(
-                    amfi_code=row[self._AMFI_CODE_COL],
-                    portfolio=row[self._PORTFOLIO_COL],
-                    asset=row[self._ASSET_COL],
-                    country=row[self._COUNTRY_COL],
+        # Rows contain only the mapped columns, starting from the specified row
+        for fund, amfi_code, portfolio, asset, country in rows:
+            if fund:
+                mf_properties[fund] = MFProperty(
+                    amfi_code=int(amfi_code),
+                    portfolio=portfolio,
+                    asset=asset,
+                    country=country,
                 )
 
         logging.info(
             "Fetched %s properties from sheet %s",
             len(mf_properties),
-            self._WORKSHEET_NAME,
+            self._worksheet_name,
         )
 
         serialized_dict: dict[str, str] = self._serialize(mf_properties)
 
+        # Funds which were added, removed or edited since last sync
+        previous_dict: dict[str, dict] = json_data if json_data is not None else {}
+        self._changed_funds = {
+            key
+            for key in serialized_dict.keys() | previous_dict.keys()
+            if serialized_dict.get(key) != previous_dict.get(key)
+        }
+
         # Save file to cache
-        files.save_file_as_json(self._FOLDER_NAME, self._FILE_NAME, serialized_dict)
+        files.save_cache_file(
+            self._folder_name, self._FILE_NAME, serialized_dict, self._SCHEMA_VERSION
+        )
+        files.save_cache_file(
+            self._folder_name,
+            self._SYNC_FILE_NAME,
+            {"modified_time": modified_time, "layout": layout},
+            self._SCHEMA_VERSION,
+        )
         logging.debug("Saved %s properties to cache", len(serialized_dict))
 
         return mf_properties
 
+    def source_file_path(self: Self) -> str:
+        """Returns the file properties are read from, the CSV export or the cache"""
+        if is_csv_source(self._source):
+            return os.path.abspath(CsvClient(self._source).file_path)
+        return files.get_cache_file_path(self._folder_name, self._FILE_NAME)
+
+    def _layout(self: Self) -> dict:
+        """Returns where rows are read from, as cached rows are valid only for it"""
+        return {
+            "worksheet_name": self._worksheet_name,
+            "first_row": self._first_row,
+            "columns": self._columns,
+        }
+
+    def _is_missing_columns(self: Self) -> bool:
+        """Returns True if a required column is not mapped, portfolio and country are optional"""
+        return (
+            self._column_map["fund_name"] is None
+            or self._column_map["amfi_code"] is None
+            or self._column_map["asset"] is None
+        )
+
+    def _fetch_data_from_csv(self: Self, source: str) -> dict[str, MFProperty]:
+        if (
+            self._first_row is None
+            or self._is_missing_columns()
+        ):
+            logging.error(
+                "One or more environment variables are not set for MF Properties Sheet"
+            )
+            sys.exit(1)
+
+        logging.info("Fetching properties from %s...", source)
+
+        mf_properties: dict[str, MFProperty] = {
+            fund: MFProperty(
+                amfi_code=int(amfi_code),
+                portfolio=portfolio,
+                asset=asset,
+                country=country,
+            )
+            for fund, amfi_code, portfolio, asset, country in CsvClient(
+                source
+            ).iter_rows(self._first_row, self._columns)
+            if fund
+        }
+
+        logging.info("Fetched %s properties from %s", len(mf_properties), source)
+
+        return mf_properties
+
     def _fetch_data_from_cache(self: Self) -> dict[str, MFProperty]:
-        logging.info("Fetching %s from cache...", self._WORKSHEET_NAME)
+        logging.info("Fetching %s from cache...", self._worksheet_name)
 
-        json_data: dict[str, str] | None = files.read_file_as_json(
-            self._FOLDER_NAME, self._FILE_NAME
+        json_data: dict[str, dict] | None = files.read_cache_file(
+            self._folder_name, self._FILE_NAME, self._SCHEMA_VERSION
         )
 
         if json_data is None:
-            logging.warning("Did not find %s in cache", self._WORKSHEET_NAME)
+            logging.warning("Did not find %s in cache", self._worksheet_name)
+            cache_counters.record("sheet_data", cache_counters.MISS)
             return self._fetch_data_from_sheets()
 
+        cache_counters.record("sheet_data", cache_counters.HIT)
         mf_properties: dict[str, MFProperty] = {
             key: MFProperty.from_dict(value) for key, value in json_data.items()
         }
 
-        logging.info("Fetched %s properties from cache", self._WORKSHEET_NAME)
+        logging.info("Fetched %s properties from cache", self._worksheet_name)
 
         return mf_properties
 
@@ -119,3 +219,8 @@ class MFPropertiesService:
 
     def mf_properties(self: Self) -> dict[str, MFProperty]:
         return self._mf_properties
+
+    def changed_funds(self: Self) -> set[str]:
+        """Returns the funds whose properties were changed by the last sync"""
+        return self._changed_funds
+
@@ -0,0 +1,204 @@
+"""
+services.nav_matrix_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which aligns NAV histories of many funds on a common date grid.
+
+"""
+
+import hashlib
+import logging
+import os
+from datetime import datetime
+from typing import Literal, Self
+
+import numpy as np
+
+from apis.mf_api_client import MFApiClient
+from models.mf_price import MFPrice
+from utils import cache_counters, files
+
+Frequency = Literal["daily", "monthly"]
+
+# datetime.toordinal() of 01-01-1970, the epoch of numpy datetime64
+_EPOCH_ORDINAL: int = datetime(1970, 1, 1).toordinal()
+
+
+class NavMatrixService:
+    """Builds funds x dates arrays of NAVs and returns from the cached NAV histories"""
+
+    _FOLDER_NAME = "nav_matrix"
+
+    # Bumped whenever the layout of the cached matrices changes
+    _SCHEMA_VERSION = 1
+
+    def __init__(self: Self, mf_api_client: MFApiClient) -> None:
+        self._mf_api_client: MFApiClient = mf_api_client
+
+    def nav_matrix(
+        self: Self,
+        amfi_codes: list[int],
+        frequency: Frequency = "daily",
+        to_date: datetime | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the date ordinals of the grid and a funds x dates array of NAVs.
+
+        The grid is the union of all NAV dates (or the last NAV date of each month),
+        restricted to the window in which every fund has a NAV. Missing NAVs are
+        carried forward from the previous date of the same fund.
+        """
+        fund_dates: list[np.ndarray] = []
+        fund_navs: list[np.ndarray] = []
+
+        for amfi_code in amfi_codes:
+            ordinals, navs = self._nav_history(amfi_code)
+            if to_date is not None:
+                mask: np.ndarray = ordinals <= to_date.toordinal()
+                ordinals, navs = ordinals[mask], navs[mask]
+            fund_dates.append(ordinals)
+            fund_navs.append(navs)
+
+        if len(fund_dates) == 0 or any(len(ordinals) == 0 for ordinals in fund_dates):
+            return np.empty(0, dtype=np.int64), np.empty((len(amfi_codes), 0))
+
+        # Common window starts when the youngest fund has its first NAV
+        start: int = max(int(ordinals[0]) for ordinals in fund_dates)
+        grid: np.ndarray = np.unique(np.concatenate(fund_dates))
+        grid = grid[grid >= start]
+
+        if frequency == "monthly":
+            grid = self._month_ends(grid)
+
+        matrix = np.empty((len(amfi_codes), len(grid)))
+        for i, (ordinals, navs) in enumerate(zip(fund_dates, fund_navs)):
+            # Position of the latest NAV on or before each grid date
+            positions: np.ndarray = np.searchsorted(ordinals, grid, side="right") - 1
+            matrix[i] = navs[positions]
+
+        logging.debug(
+            "Aligned NAVs of %s funds on %s %s dates", len(amfi_codes), len(grid), frequency
+        )
+
+        return grid, matrix
+
+    def return_matrix(
+        self: Self,
+        amfi_codes: list[int],
+        frequency: Frequency = "daily",
+        to_date: datetime | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the date ordinals and a funds x dates array of simple returns ending on those dates.
+
+        The aligned returns of the full history are cached per set of funds and frequency,
+        and rebuilt only when one of the NAV histories is newer than the cache.
+        """
+        grid, returns = self._fetch_returns_from_cache(amfi_codes, frequency)
+
+        if to_date is not None:
+            mask: np.ndarray = grid <= to_date.toordinal()
+            grid, returns = grid[mask], returns[:, mask]
+
+        return grid, returns
+
+    def _fetch_returns_from_cache(
+        self: Self, amfi_codes: list[int], frequency: Frequency
+    ) -> tuple[np.ndarray, np.ndarray]:
+        file_name: str = self._cache_file_name(amfi_codes, frequency)
+        file_path: str = files.get_cache_file_path(self._FOLDER_NAME, file_name)
+
+        if os.path.exists(file_path):
+            cache_time: float = os.path.getmtime(file_path)
+            nav_times: list[float | None] = [
+                self._mf_api_client.nav_cache_modified_time(amfi_code)
+                for amfi_code in amfi_codes
+            ]
+            is_stale: bool = any(
+                nav_time is None or nav_time > cache_time for nav_time in nav_times
+            )
+
+            cached: dict[str, np.ndarray] | None = (
+                files.read_cache_file(self._FOLDER_NAME, file_name, self._SCHEMA_VERSION)
+                if not is_stale
+                else None
+            )
+
+            if cached is not None:
+                # Rows are cached in sorted order of AMFI code
+                rows: dict[int, int] = {
+                    int(code): i for i, code in enumerate(cached["amfi_codes"])
+                }
+                order: list[int] = [rows[amfi_code] for amfi_code in amfi_codes]
+                logging.debug("Fetched %s return matrix from cache", frequency)
+                cache_counters.record("nav_matrix", cache_counters.HIT)
+                return cached["grid"], cached["returns"][order]
+
+        cache_counters.record("nav_matrix", cache_counters.MISS)
+        return self._fetch_returns_from_navs(amfi_codes, frequency, file_name)
+
+    def _fetch_returns_from_navs(
+        self: Self, amfi_codes: list[int], frequency: Frequency, file_name: str
+    ) -> tuple[np.ndarray, np.ndarray]:
+        sorted_codes: list[int] = sorted(amfi_codes)
+        grid, matrix = self.nav_matrix(sorted_codes, frequency)
+
+        if matrix.shape[1] < 2:
+            grid, returns = np.empty(0, dtype=np.int64), np.empty((len(amfi_codes), 0))
+        else:
+            grid, returns = grid[1:], matrix[:, 1:] / matrix[:, :-1] - 1
+
+        # Arrays are pickled out of band, so loading them does not copy their data
+        files.save_cache_file(
+            self._FOLDER_NAME,
+            file_name,
+            {
+                "amfi_codes": np.array(sorted_codes),
+                "grid": np.ascontiguousarray(grid),
+                "returns": np.ascontiguousarray(returns),
+            },
+            self._SCHEMA_VERSION,
+            codec="pickle",
+        )
+        logging.debug("Saved %s return matrix to cache", frequency)
+
+        rows: dict[int, int] = {code: i for i, code in enumerate(sorted_codes)}
+        return grid, returns[[rows[amfi_code] for amfi_code in amfi_codes]]
+
+    def _cache_file_name(self: Self, amfi_codes: list[int], frequency: Frequency) -> str:
+        """Returns a file name unique to the set of funds and frequency"""
+        key: str = ",".join(str(code) for code in sorted(set(amfi_codes)))
+        return frequency + "_" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def _nav_history(self: Self, amfi_code: int) -> tuple[np.ndarray, np.ndarray]:
+        """Returns date ordinals and NAVs of a fund in ascending order of date"""
+        pricing_data: list[MFPrice] | None = self._mf_api_client.fetch_nav_prices(
+            amfi_code
+        )
+
+        if pricing_data is None:
+            logging.warning("No NAV data found for AMFI code %s", amfi_code)
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # NAV data is sorted with the latest date first
+        ordinals = np.fromiter(
+            (price.date.toordinal() for price in reversed(pricing_data)),
+            dtype=np.int64,
+            count=len(pricing_data),
+        )
+        navs = np.fromiter(
+            (float(price.nav) for price in reversed(pricing_data)),
+            dtype=np.float64,
+            count=len(pricing_data),
+        )
+
+        # Funds may publish a zero NAV on holidays, those are dropped
+        valid: np.ndarray = navs > 0
+
+        return ordinals[valid], navs[valid]
+
+    def _month_ends(self: Self, grid: np.ndarray) -> np.ndarray:
+        """Keeps the last date of every month in the grid"""
+        months: np.ndarray = (
+            (grid - _EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]")
+        )
+        is_last: np.ndarray = np.append(months[1:] != months[:-1], True)
+        return grid[is_last]
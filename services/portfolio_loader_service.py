@@ -0,0 +1,97 @@
+"""
+services.portfolio_loader_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which loads the inputs of a feature concurrently.
+
+"""
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Self
+
+from apis.mf_api_client import MFApiClient
+from models.mf_property import MFProperty
+from models.portfolio_snapshot import PortfolioSnapshot
+from services.mf_data_service import MFDataService
+from services.mf_properties_service import MFPropertiesService
+from services.snapshot_service import SnapshotService
+
+
+class PortfolioLoaderService:
+    """Loads transactions, properties and NAV histories in parallel.
+
+    Transactions and properties are fetched at the same time, and NAV histories of the
+    funds are prefetched as soon as properties arrive. Each getter only waits for the
+    input it returns, so calculations can start while the rest is still loading. If a
+    snapshot of the same sources is still valid, all inputs are taken from it instead.
+    """
+
+    # Loading is bound by network and disk, not CPU
+    _MAX_WORKERS = 8
+
+    def __init__(
+        self: Self,
+        override_cache=False,
+        source: str | None = None,
+        properties_source: str | None = None,
+    ) -> None:
+        # Cached NAVs are cleared up front, before any prefetch starts
+        self._mf_api_client = MFApiClient(override_cache)
+
+        self._snapshot: PortfolioSnapshot | None = (
+            SnapshotService().load(source, properties_source)
+            if not override_cache
+            else None
+        )
+        if self._snapshot is not None:
+            self._mf_api_client.add_nav_histories(self._snapshot.nav_histories)
+            self._mf_data_service = MFDataService(
+                source=source, txn_table=self._snapshot.txn_table
+            )
+            return
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._MAX_WORKERS, thread_name_prefix="loader"
+        )
+
+        self._properties_future: Future = self._executor.submit(
+            MFPropertiesService, override_cache, properties_source
+        )
+        self._data_future: Future = self._executor.submit(
+            MFDataService, override_cache, source
+        )
+        self._properties_future.add_done_callback(self._prefetch_nav_prices)
+
+    def _prefetch_nav_prices(self: Self, properties_future: Future) -> None:
+        if properties_future.exception() is not None:
+            return
+
+        mf_properties: dict[str, MFProperty] = properties_future.result().mf_properties()
+
+        self._mf_api_client.prefetch_nav_prices(
+            list({mf_property.amfi_code for mf_property in mf_properties.values()}),
+            self._executor,
+        )
+
+    def mf_data_service(self: Self) -> MFDataService:
+        """Returns the transactions service once transactions are loaded"""
+        if self._snapshot is not None:
+            return self._mf_data_service
+
+        mf_data_service: MFDataService = self._data_future.result()
+        logging.debug("Transactions loaded")
+        return mf_data_service
+
+    def mf_properties(self: Self) -> dict[str, MFProperty]:
+        """Returns the mutual fund properties once they are loaded"""
+        if self._snapshot is not None:
+            return self._snapshot.mf_properties
+
+        mf_properties_service: MFPropertiesService = self._properties_future.result()
+        logging.debug("Properties loaded")
+        return mf_properties_service.mf_properties()
+
+    def mf_api_client(self: Self) -> MFApiClient:
+        """Returns the api client, which waits for each prefetched NAV history on first use"""
+        return self._mf_api_client
@@ -0,0 +1,262 @@
+"""
+services.portfolio_state_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which keeps the inputs and results of a portfolio in memory.
+
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Self
+
+from apis.csv_client import CsvClient, is_csv_source
+from apis.mf_api_client import MFApiClient
+from models.asset_value import AssetValue
+from models.mf_property import MFProperty
+from models.transaction_table import TransactionTable
+from services.asset_value_service import AssetValueService
+from services.mf_data_service import MFDataService
+from services.mf_properties_service import MFPropertiesService
+from services.portfolio_loader_service import PortfolioLoaderService
+from services.result_cache_service import ResultCacheService
+from services.sheet_loader_service import SheetLoaderService
+from utils import dates
+
+
+class PortfolioStateService:
+    """Keeps transactions, properties, NAV histories and calculated months of a portfolio resident.
+
+    Inputs are loaded once and every report is calculated from memory, with monthly
+    results reused across requests. A refresh syncs the sheets and downloads NAV histories
+    older than a maximum age, and swaps in the new inputs only if something changed.
+    Reports are calculated one at a time, as the services they use are not thread safe.
+
+    Each source is stamped with the modified time of its spreadsheet or CSV file, and a
+    source whose stamp has not changed since the last refresh is not synced again.
+    """
+
+    # NAV histories are published once a day, older downloads are refreshed
+    _NAV_MAX_AGE: float = 12 * 60 * 60
+
+    def __init__(
+        self: Self,
+        source: str | None = None,
+        properties_source: str | None = None,
+    ) -> None:
+        self._source: str | None = source
+        self._properties_source: str | None = properties_source
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._asset_value_service = AssetValueService()
+
+        # CSV exports are read whole, so they are stamped as loaded, before reading
+        self._source_stamp: str | None = (
+            self._stamp(source) if is_csv_source(source) else None
+        )
+        self._properties_source_stamp: str | None = (
+            self._stamp(properties_source) if is_csv_source(properties_source) else None
+        )
+
+        loader = PortfolioLoaderService(False, source, properties_source)
+
+        self._mf_data_service: MFDataService = loader.mf_data_service()
+        self._mf_txn_table: TransactionTable = self._mf_data_service.mf_txn_table()
+        self._mf_api_client: MFApiClient = loader.mf_api_client()
+        self._mf_properties: dict[str, MFProperty] = loader.mf_properties()
+        self._result_cache_service = ResultCacheService(
+            self._mf_txn_table, self._mf_properties, self._mf_api_client
+        )
+
+        # Benchmark transactions and fund names by AMFI code, built on first request
+        self._benchmark_txn_tables: dict[int, TransactionTable] = {}
+        self._benchmark_names: dict[int, str] = {}
+
+        self._loaded_at: datetime = datetime.now()
+        self._refreshed_at: datetime = self._loaded_at
+
+    @property
+    def source(self: Self) -> str | None:
+        return self._source
+
+    @property
+    def properties_source(self: Self) -> str | None:
+        return self._properties_source
+
+    def status(self: Self) -> dict:
+        """Returns the size of the resident portfolio and when it was loaded and refreshed"""
+        with self._lock:
+            return {
+                "transactions": len(self._mf_txn_table),
+                "funds": len(self._mf_properties),
+                "loaded_at": self._loaded_at.isoformat(timespec="seconds"),
+                "refreshed_at": self._refreshed_at.isoformat(timespec="seconds"),
+            }
+
+    def asset_value(
+        self: Self,
+        month: datetime,
+        assets_to_include: list[str],
+        portfolio: str | None = None,
+        country: str | None = None,
+        fund_level: bool = False,
+    ) -> AssetValue:
+        """Returns the asset value of the portfolio in a month"""
+        with self._lock:
+            return self._result_cache_service.calculate_mf_asset_value(
+                month=month,
+                assets_to_include=assets_to_include,
+                portfolio=portfolio,
+                country=country,
+                fund_level=fund_level,
+            )
+
+    def asset_values(
+        self: Self, from_date: datetime, to_date: datetime, assets_to_include: list[str]
+    ) -> list[AssetValue]:
+        """Returns the asset value of the portfolio in every month of a range"""
+        mf_asset_values: list[AssetValue] = []
+
+        with self._lock:
+            month: datetime = from_date
+            while month <= to_date:
+                mf_asset_values.append(
+                    self._result_cache_service.calculate_mf_asset_value(
+                        month=month, assets_to_include=assets_to_include
+                    )
+                )
+                month = dates.add_month(month)
+
+        return mf_asset_values
+
+    def benchmark_asset_values(
+        self: Self,
+        amfi_code: int,
+        from_date: datetime,
+        to_date: datetime,
+        assets_to_include: list[str],
+    ) -> tuple[str, list[AssetValue]]:
+        """Returns the name of a benchmark fund and the monthly asset values of the portfolio invested in it"""
+        with self._lock:
+            if amfi_code not in self._benchmark_names:
+                self._benchmark_names[amfi_code] = self._mf_api_client.get_fund_name(
+                    amfi_code
+                )
+            if amfi_code not in self._benchmark_txn_tables:
+                self._benchmark_txn_tables[amfi_code] = TransactionTable.from_transactions(
+                    self._mf_data_service.benchmark_txn_data(
+                        self._mf_properties, self._mf_api_client, amfi_code
+                    )
+                )
+
+            return (
+                self._benchmark_names[amfi_code],
+                self._asset_value_service.calculate_benchmark_asset_values(
+                    benchmark_txn_list=self._benchmark_txn_tables[amfi_code],
+                    mf_properties=self._mf_properties,
+                    mf_api_client=self._mf_api_client,
+                    amfi_code=amfi_code,
+                    from_date=from_date,
+                    to_date=to_date,
+                    assets_to_include=assets_to_include,
+                ),
+            )
+
+    def refresh(self: Self) -> bool:
+        """Syncs the sheets and stale NAV histories, returns True if the portfolio changed.
+
+        Inputs are loaded without holding the lock, so reports are served from the current
+        inputs until the new ones are swapped in.
+        """
+        # A refresh requested over the API waits for the one of the refresher, if running
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self: Self) -> bool:
+        logging.info("Refreshing portfolio...")
+
+        SheetLoaderService().reset()
+
+        source_stamp: str | None = self._stamp(self._source)
+        properties_source_stamp: str | None = self._stamp(self._properties_source)
+
+        # Sources which have not changed keep their loaded inputs
+        if source_stamp is not None and source_stamp == self._source_stamp:
+            mf_data_service: MFDataService = self._mf_data_service
+            is_txn_changed: bool = False
+        else:
+            mf_data_service = MFDataService(True, self._source)
+            # CSV exports have no sync state, so a changed file is always reloaded
+            is_txn_changed = (
+                len(mf_data_service.changed_funds()) > 0
+                or is_csv_source(self._source)
+            )
+
+        if (
+            properties_source_stamp is not None
+            and properties_source_stamp == self._properties_source_stamp
+        ):
+            mf_properties: dict[str, MFProperty] = self._mf_properties
+            is_properties_changed: bool = False
+        else:
+            mf_properties_service = MFPropertiesService(True, self._properties_source)
+            mf_properties = mf_properties_service.mf_properties()
+            is_properties_changed = (
+                len(mf_properties_service.changed_funds()) > 0
+                or is_csv_source(self._properties_source)
+            )
+
+        amfi_codes: set[int] = {
+            mf_property.amfi_code for mf_property in mf_properties.values()
+        }
+        refreshed_codes: list[int] = self._mf_api_client.refresh_nav_prices(
+            sorted(amfi_codes | set(self._benchmark_names.keys())),
+            self._NAV_MAX_AGE,
+        )
+
+        is_changed: bool = (
+            is_txn_changed or is_properties_changed or len(refreshed_codes) > 0
+        )
+
+        with self._lock:
+            self._refreshed_at = datetime.now()
+            self._source_stamp = source_stamp
+            self._properties_source_stamp = properties_source_stamp
+
+            if not is_changed:
+                logging.info("Portfolio has not changed since last refresh")
+                self._result_cache_service.save()
+                return False
+
+            # Results are saved first, so the new cache drops only the ones affected by the changes
+            self._result_cache_service.save()
+
+            self._mf_data_service = mf_data_service
+            self._mf_txn_table = mf_data_service.mf_txn_table()
+            self._mf_properties = mf_properties
+            self._result_cache_service = ResultCacheService(
+                self._mf_txn_table, self._mf_properties, self._mf_api_client
+            )
+            self._benchmark_txn_tables = {}
+
+        logging.info("Refreshed portfolio with %s transactions", len(self._mf_txn_table))
+        return True
+
+    def _stamp(self: Self, source: str | None) -> str | None:
+        """Returns a stamp which changes whenever a source is modified, None if unknown"""
+        if is_csv_source(source):
+            try:
+                stat: os.stat_result = os.stat(CsvClient(source).file_path)
+            except OSError:
+                return None
+            return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+        # The spreadsheet holds both worksheets, its modified time is a single request
+        return SheetLoaderService().get_modified_time()
+
+    def save(self: Self) -> None:
+        """Saves the calculated months to cache"""
+        with self._lock:
+            self._result_cache_service.save()
@@ -0,0 +1,146 @@
+"""
+services.projection_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which simulates future portfolio value.
+
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Self
+
+import numpy as np
+
+from models.projection import PERCENTILES, Projection
+
+# Trading days compounded into one simulated month when sampling daily returns
+TRADING_DAYS_PER_MONTH = 21
+
+# Paths simulated together, bounds the memory of one batch
+_BATCH_SIZE = 25_000
+
+
+def simulate_batch(
+    portfolio_returns: np.ndarray,
+    steps_per_month: int,
+    start_value: float,
+    monthly_sip: float,
+    months: int,
+    paths: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """Simulates a batch of paths and returns their values at the end of every year.
+
+    Each simulated month compounds historical portfolio returns drawn with replacement,
+    SIP amounts are invested at the start of every month.
+    """
+    rng: np.random.Generator = np.random.default_rng(seed)
+    growth: np.ndarray = 1 + portfolio_returns
+
+    values: np.ndarray = np.full(paths, start_value)
+    year_end_values: np.ndarray = np.empty((paths, months // 12))
+
+    for month in range(months):
+        draws: np.ndarray = rng.integers(
+            0, len(growth), size=(paths, steps_per_month)
+        )
+        monthly_growth: np.ndarray = growth[draws].prod(axis=1)
+
+        values += monthly_sip
+        values *= monthly_growth
+
+        if (month + 1) % 12 == 0:
+            year_end_values[:, month // 12] = values
+
+    return year_end_values
+
+
+class ProjectionService:
+    """Simulates future value paths by bootstrapping historical returns"""
+
+    def project(
+        self: Self,
+        weights: np.ndarray,
+        return_matrix: np.ndarray,
+        start_value: float,
+        years: int,
+        monthly_sip: float,
+        paths: int,
+        daily: bool,
+        target: float | None = None,
+        workers: int = 1,
+        seed: int | None = None,
+    ) -> Projection:
+        """Returns the percentile bands of portfolio value at the end of every year.
+
+        The funds x dates return matrix is collapsed into one portfolio return per date
+        using the current weights, so sampling a date draws the returns of all funds on
+        that date together and their correlation is kept. The portfolio is assumed to be
+        rebalanced to the current weights, and SIP amounts follow the same weights.
+        """
+        portfolio_returns: np.ndarray = weights @ return_matrix
+        months: int = years * 12
+        steps_per_month: int = TRADING_DAYS_PER_MONTH if daily else 1
+
+        # Split paths into batches with independent random streams
+        batch_sizes: list[int] = [_BATCH_SIZE] * (paths // _BATCH_SIZE)
+        if paths % _BATCH_SIZE != 0:
+            batch_sizes.append(paths % _BATCH_SIZE)
+        seeds: list[np.random.SeedSequence] = np.random.SeedSequence(seed).spawn(
+            len(batch_sizes)
+        )
+
+        logging.debug(
+            "Simulating %s paths over %s months in %s batches on %s workers",
+            paths,
+            months,
+            len(batch_sizes),
+            workers,
+        )
+
+        batch_args: list[tuple] = [
+            (
+                portfolio_returns,
+                steps_per_month,
+                start_value,
+                monthly_sip,
+                months,
+                batch_size,
+                batch_seed,
+            )
+            for batch_size, batch_seed in zip(batch_sizes, seeds)
+        ]
+
+        if workers > 1 and len(batch_args) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results: list[np.ndarray] = list(
+                    executor.map(simulate_batch, *zip(*batch_args))
+                )
+        else:
+            results: list[np.ndarray] = [simulate_batch(*args) for args in batch_args]
+
+        year_end_values: np.ndarray = np.concatenate(results)
+        bands: np.ndarray = np.percentile(year_end_values, PERCENTILES, axis=0)
+
+        return Projection(
+            start_value=start_value,
+            paths=paths,
+            history_length=len(portfolio_returns),
+            years=[
+                Projection.Year(
+                    year=year + 1,
+                    invested_value=start_value + monthly_sip * 12 * (year + 1),
+                    percentiles={
+                        percentile: float(bands[i, year])
+                        for i, percentile in enumerate(PERCENTILES)
+                    },
+                    target_probability=(
+                        float(np.mean(year_end_values[:, year] >= target))
+                        if target is not None
+                        else None
+                    ),
+                )
+                for year in range(years)
+            ],
+        )
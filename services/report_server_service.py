@@ -0,0 +1,212 @@
+"""
+services.report_server_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which serves portfolio reports as JSON over HTTP.
+
+"""
+
+import json
+import logging
+import os
+import secrets
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Self
+from urllib.parse import parse_qs, urlsplit
+
+from apis.report_server_client import ReportServerClient
+from models.asset_value import AssetValue
+from services.portfolio_state_service import PortfolioStateService
+from utils import dates, files
+
+# Asset types of the reports, same as the CLI
+ALL_ASSETS: list[str] = ["equity", "elss", "debt", "arbitrage"]
+EQUITY_ASSETS: list[str] = ["equity", "elss"]
+
+DEFAULT_BENCHMARK = 120716
+
+
+class ReportRequestError(Exception):
+    """Raised for a request with missing or invalid parameters"""
+
+
+class ReportServerService:
+    """Serves reports of a resident portfolio on the loopback interface.
+
+    Endpoints are GET /health, /summary, /assetvalue and /benchmark and POST /refresh,
+    months are passed as MMM-yyyy query parameters like on the command line. Every
+    request must carry the token of the server info file as a bearer token, which only
+    the owner can read, so other local users cannot read the portfolio.
+    """
+
+    def __init__(
+        self: Self, state: PortfolioStateService, host: str = "127.0.0.1", port: int = 0
+    ) -> None:
+        self._state: PortfolioStateService = state
+        self._token: str = secrets.token_urlsafe(32)
+
+        self._routes: dict[tuple[str, str], Callable[[dict[str, str]], dict]] = {
+            ("GET", "/health"): self._health,
+            ("GET", "/summary"): self._summary,
+            ("GET", "/assetvalue"): self._asset_value,
+            ("GET", "/benchmark"): self._benchmark,
+            ("POST", "/refresh"): self._refresh,
+        }
+
+        self._server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+        self._server.daemon_threads = True
+        self._server.report_server = self
+
+    @property
+    def address(self: Self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def serve_forever(self: Self) -> None:
+        """Serves requests until shutdown, with the server info file present meanwhile"""
+        host, port = self.address
+
+        files.save_private_file_as_json(
+            ReportServerClient.FOLDER_NAME,
+            ReportServerClient.FILE_NAME,
+            {
+                "host": host,
+                "port": port,
+                "pid": os.getpid(),
+                "token": self._token,
+                "source": self._state.source,
+                "properties_source": self._state.properties_source,
+            },
+        )
+        logging.info("Serving reports on http://%s:%s", host, port)
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._remove_server_file()
+
+    def shutdown(self: Self) -> None:
+        """Stops serving requests, to be called from another thread"""
+        self._server.shutdown()
+
+    def handle(
+        self: Self, method: str, path: str, authorization: str | None
+    ) -> tuple[int, dict]:
+        """Returns the status code and JSON body of the response to a request"""
+        url = urlsplit(path)
+
+        if not secrets.compare_digest(authorization or "", "Bearer " + self._token):
+            return 401, {"error": "Missing or invalid token"}
+
+        route: Callable[[dict[str, str]], dict] | None = self._routes.get(
+            (method, url.path)
+        )
+        if route is None:
+            return 404, {"error": f"No endpoint {method} {url.path}"}
+
+        params: dict[str, str] = {
+            key: values[-1] for key, values in parse_qs(url.query).items()
+        }
+
+        try:
+            return 200, route(params)
+        except ReportRequestError as e:
+            return 400, {"error": str(e)}
+        # A failed report must not take the server down, clients exit on connection errors
+        except (Exception, SystemExit) as e:
+            logging.exception("Failed to serve %s %s", method, path)
+            return 500, {"error": str(e)}
+
+    def _health(self: Self, params: dict[str, str]) -> dict:
+        return {"status": "ok"} | self._state.status()
+
+    def _summary(self: Self, params: dict[str, str]) -> dict:
+        asset_value: AssetValue = self._state.asset_value(
+            month=self._month(params, "date"),
+            assets_to_include=ALL_ASSETS,
+            portfolio=params.get("portfolio"),
+            country=params.get("country"),
+            fund_level=True,
+        )
+        return {"asset_value": asset_value.to_dict()}
+
+    def _asset_value(self: Self, params: dict[str, str]) -> dict:
+        asset_values: list[AssetValue] = self._state.asset_values(
+            from_date=self._month(params, "from"),
+            to_date=self._month(params, "to"),
+            assets_to_include=self._assets(params),
+        )
+        return {"asset_values": [asset_value.to_dict() for asset_value in asset_values]}
+
+    def _benchmark(self: Self, params: dict[str, str]) -> dict:
+        try:
+            amfi_code = int(params.get("amfi_code", DEFAULT_BENCHMARK))
+        except ValueError as e:
+            raise ReportRequestError(f"Not a valid AMFI code: {e}") from e
+
+        name, asset_values = self._state.benchmark_asset_values(
+            amfi_code=amfi_code,
+            from_date=self._month(params, "from"),
+            to_date=self._month(params, "to"),
+            assets_to_include=self._assets(params),
+        )
+        return {
+            "name": name,
+            "asset_values": [asset_value.to_dict() for asset_value in asset_values],
+        }
+
+    def _refresh(self: Self, params: dict[str, str]) -> dict:
+        return {"changed": self._state.refresh()} | self._state.status()
+
+    def _month(self: Self, params: dict[str, str], key: str) -> datetime:
+        """Parses a MMM-yyyy month parameter, defaulted to last month"""
+        if key not in params:
+            return dates.get_last_month_date()
+
+        try:
+            return datetime.strptime(params[key], "%b-%Y")
+        except ValueError as e:
+            raise ReportRequestError(
+                f"Not a valid {key}: '{params[key]}'. Expected format: 'MMM-yyyy'"
+            ) from e
+
+    def _assets(self: Self, params: dict[str, str]) -> list[str]:
+        return EQUITY_ASSETS if params.get("equity") == "true" else ALL_ASSETS
+
+    def _remove_server_file(self: Self) -> None:
+        try:
+            os.remove(
+                files.get_json_file_path(
+                    ReportServerClient.FOLDER_NAME, ReportServerClient.FILE_NAME
+                )
+            )
+        except FileNotFoundError:
+            pass
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """Passes requests to the report server and writes its JSON responses"""
+
+    server_version = "PortfolioReports/1.0"
+
+    def do_GET(self: Self) -> None:
+        self._respond("GET")
+
+    def do_POST(self: Self) -> None:
+        self._respond("POST")
+
+    def _respond(self: Self, method: str) -> None:
+        status, body = self.server.report_server.handle(
+            method, self.path, self.headers.get("Authorization")
+        )
+        payload: bytes = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self: Self, format: str, *args) -> None:
+        logging.debug("%s - %s", self.address_string(), format % args)
@@ -0,0 +1,330 @@
+"""
+services.result_cache_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which caches calculated monthly asset values.
+
+"""
+
+import hashlib
+import logging
+from datetime import datetime
+from typing import Self
+
+from apis.mf_api_client import MFApiClient
+from models.asset_value import AssetValue
+from models.mf_property import MFProperty
+from models.portfolio_config import PortfolioConfig
+from models.transaction_table import TransactionTable
+from services.asset_value_service import AssetValueService
+from utils import cache_counters, files, profiler
+
+
+class ResultCacheService:
+    """Caches monthly asset values and invalidates only the results affected by changed inputs.
+
+    Along with the results, the cache keeps a digest of the transactions of every fund in
+    every month and of the properties of every fund. When the inputs differ from the
+    digests, a result is dropped only if a changed fund is part of it, and for changed
+    transactions only if the month is after the earliest change. Results of a month newer
+    than the latest NAV of a held fund are not cached, as a NAV refresh would change them.
+    """
+
+    _FOLDER_NAME = "results"
+    _FILE_NAME = "asset_values"
+
+    # Bumped whenever the calculation changes, so results of older versions are dropped
+    _VERSION = 1
+
+    def __init__(
+        self: Self,
+        txn_table: TransactionTable,
+        mf_properties: dict[str, MFProperty],
+        mf_api_client: MFApiClient,
+        config: PortfolioConfig | None = None,
+    ) -> None:
+        config = config if config is not None else PortfolioConfig.default()
+
+        self._folder_name: str = config.cache_folder(self._FOLDER_NAME)
+        self._txn_table: TransactionTable = txn_table
+        self._mf_properties: dict[str, MFProperty] = mf_properties
+        self._mf_api_client: MFApiClient = mf_api_client
+        self._asset_value_service = AssetValueService()
+
+        # Earliest buy date of each fund
+        self._first_buy_days: dict[str, int] = {}
+        for fund_code, buy_day in zip(txn_table.fund_codes, txn_table.buy_days):
+            fund: str = txn_table.funds[fund_code]
+            if buy_day < self._first_buy_days.get(fund, buy_day + 1):
+                self._first_buy_days[fund] = buy_day
+
+        self._transaction_digests: dict[str, dict[str, str]] = (
+            self._digest_transactions()
+        )
+        self._property_digests: dict[str, str] = {
+            fund: self._digest_property(mf_property)
+            for fund, mf_property in mf_properties.items()
+        }
+
+        self._results: dict[str, dict] = self._load_results()
+        self._is_modified = False
+        self._hits = 0
+        self._misses = 0
+
+    def calculate_mf_asset_value(
+        self: Self,
+        month: datetime,
+        assets_to_include: list[str],
+        portfolio=None,
+        country=None,
+        fund_level=False,
+    ) -> AssetValue:
+        """Returns the asset value of the portfolio in a month, calculated only if it is not cached"""
+        key: str = self._filter_key(assets_to_include, portfolio, country, fund_level)
+        month_key: str = str(month.toordinal())
+
+        group: dict = self._results.setdefault(
+            key,
+            {
+                "filter": {
+                    "assets": sorted(asset.lower() for asset in assets_to_include),
+                    "portfolio": portfolio,
+                    "country": country,
+                },
+                "months": {},
+            },
+        )
+
+        entry: dict | None = group["months"].get(month_key)
+        if entry is not None:
+            self._hits += 1
+            return AssetValue.from_dict(entry["asset_value"])
+
+        self._misses += 1
+        asset_value: AssetValue = self._asset_value_service.calculate_mf_asset_value(
+            txn_list=self._txn_table,
+            mf_properties=self._mf_properties,
+            mf_api_client=self._mf_api_client,
+            month=month,
+            assets_to_include=assets_to_include,
+            portfolio=portfolio,
+            country=country,
+            fund_level=fund_level,
+        )
+
+        if self._is_final(asset_value, month):
+            group["months"][month_key] = {
+                "funds": sorted(self._involved_funds(group["filter"], month)),
+                "asset_value": asset_value.to_dict(),
+            }
+            self._is_modified = True
+
+        return asset_value
+
+    @profiler.timed("results.save")
+    def save(self: Self) -> None:
+        """Saves the results to cache if any result was added or dropped"""
+        # A resident portfolio saves on every refresh, so lookups are counted only once
+        if self._hits + self._misses > 0:
+            logging.info(
+                "Reused %s of %s monthly results from cache",
+                self._hits,
+                self._hits + self._misses,
+            )
+            cache_counters.record("results", cache_counters.HIT, self._hits)
+            cache_counters.record("results", cache_counters.MISS, self._misses)
+            self._hits = 0
+            self._misses = 0
+
+        if not self._is_modified:
+            return
+
+        files.save_cache_file(
+            self._folder_name,
+            self._FILE_NAME,
+            {
+                "transactions": self._transaction_digests,
+                "properties": self._property_digests,
+                "results": self._results,
+            },
+            self._VERSION,
+        )
+        self._is_modified = False
+        logging.debug("Saved monthly results to cache")
+
+    @profiler.timed("results.load")
+    def _load_results(self: Self) -> dict[str, dict]:
+        json_data: dict | None = files.read_cache_file(
+            self._folder_name, self._FILE_NAME, self._VERSION
+        )
+
+        if json_data is None:
+            logging.debug("Did not find monthly results in cache")
+            return {}
+
+        changed_transactions: dict[str, int] = self._changed_transactions(
+            json_data["transactions"]
+        )
+        changed_properties: set[str] = {
+            fund
+            for fund in set(json_data["properties"]) | set(self._property_digests)
+            if json_data["properties"].get(fund) != self._property_digests.get(fund)
+        }
+
+        results: dict[str, dict] = json_data["results"]
+        if len(changed_transactions) == 0 and len(changed_properties) == 0:
+            return results
+
+        logging.info(
+            "Transactions of %s and properties of %s funds changed since results were cached",
+            len(changed_transactions),
+            len(changed_properties),
+        )
+
+        stale_count = 0
+        for group in results.values():
+            for month_key in list(group["months"].keys()):
+                if self._is_stale(
+                    group,
+                    int(month_key),
+                    changed_transactions,
+                    changed_properties,
+                ):
+                    del group["months"][month_key]
+                    stale_count += 1
+
+        logging.info("Dropped %s stale monthly results", stale_count)
+
+        # Digests are updated even if nothing was dropped
+        self._is_modified = True
+        return results
+
+    def _is_stale(
+        self: Self,
+        group: dict,
+        month_day: int,
+        changed_transactions: dict[str, int],
+        changed_properties: set[str],
+    ) -> bool:
+        """Checks if a result depends on a fund whose transactions or properties changed"""
+        involved_funds: set[str] = set(group["months"][str(month_day)]["funds"]) | (
+            self._involved_funds(group["filter"], datetime.fromordinal(month_day))
+        )
+
+        # Only transactions bought before a month are part of its result
+        for fund, changed_day in changed_transactions.items():
+            if changed_day < month_day and fund in involved_funds:
+                return True
+
+        return any(fund in involved_funds for fund in changed_properties)
+
+    def _involved_funds(self: Self, result_filter: dict, month: datetime) -> set[str]:
+        """Returns funds which pass the filter and have transactions before the month"""
+        month_day: int = month.toordinal()
+
+        return {
+            fund
+            for fund, first_buy_day in self._first_buy_days.items()
+            if first_buy_day < month_day
+            and fund in self._mf_properties
+            and self._asset_value_service.filter_property(
+                fund,
+                self._mf_properties[fund],
+                result_filter["assets"],
+                result_filter["portfolio"],
+                result_filter["country"],
+            )
+            is not None
+        }
+
+    def _is_final(self: Self, asset_value: AssetValue, month: datetime) -> bool:
+        """Checks if NAVs of all held funds have been published up to the month"""
+        for fund in asset_value.meta_dict.keys():
+            latest_nav_date: datetime | None = self._mf_api_client.latest_nav_date(
+                self._mf_properties[fund].amfi_code
+            )
+            if latest_nav_date is None or latest_nav_date < month:
+                return False
+        return True
+
+    def _changed_transactions(
+        self: Self, cached_digests: dict[str, dict[str, str]]
+    ) -> dict[str, int]:
+        """Returns funds with changed transactions and the first day of the earliest changed month"""
+        changed: dict[str, int] = {}
+
+        for fund in set(cached_digests) | set(self._transaction_digests):
+            cached: dict[str, str] = cached_digests.get(fund, {})
+            current: dict[str, str] = self._transaction_digests.get(fund, {})
+
+            changed_days: list[int] = [
+                int(month_key)
+                for month_key in set(cached) | set(current)
+                if cached.get(month_key) != current.get(month_key)
+            ]
+            if len(changed_days) > 0:
+                changed[fund] = min(changed_days)
+
+        return changed
+
+    def _digest_transactions(self: Self) -> dict[str, dict[str, str]]:
+        """Returns a digest of the transactions of every fund, by month of buy date"""
+        rows: dict[str, dict[str, list[str]]] = {}
+        month_keys: dict[int, str] = {}
+
+        table: TransactionTable = self._txn_table
+        for fund_code, side, units, buy_price, sell_price, buy_day, sell_day in zip(
+            table.fund_codes,
+            table.sides,
+            table.units,
+            table.buy_prices,
+            table.sell_prices,
+            table.buy_days,
+            table.sell_days,
+        ):
+            month_key: str | None = month_keys.get(buy_day)
+            if month_key is None:
+                month_key = month_keys[buy_day] = str(
+                    datetime.fromordinal(buy_day).replace(day=1).toordinal()
+                )
+
+            rows.setdefault(table.funds[fund_code], {}).setdefault(month_key, []).append(
+                f"{side}|{units!r}|{buy_price!r}|{sell_price!r}|{buy_day}|{sell_day}"
+            )
+
+        # Rows are sorted, so the digest does not depend on the order of the sheet
+        return {
+            fund: {
+                month_key: hashlib.sha1(
+                    "\n".join(sorted(month_rows)).encode("utf-8")
+                ).hexdigest()[:16]
+                for month_key, month_rows in months.items()
+            }
+            for fund, months in rows.items()
+        }
+
+    def _digest_property(self: Self, mf_property: MFProperty) -> str:
+        return "|".join(
+            [
+                str(mf_property.amfi_code),
+                str(mf_property.portfolio),
+                str(mf_property.asset),
+                str(mf_property.country),
+            ]
+        )
+
+    def _filter_key(
+        self: Self,
+        assets_to_include: list[str],
+        portfolio: str | None,
+        country: str | None,
+        fund_level: bool,
+    ) -> str:
+        return "|".join(
+            [
+                ",".join(sorted(asset.lower() for asset in assets_to_include)),
+                portfolio.lower() if portfolio is not None else "",
+                country.lower() if country is not None else "",
+                "funds" if fund_level else "",
+            ]
+        )
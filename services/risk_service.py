@@ -0,0 +1,329 @@
+"""
+services.risk_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which calculates risk metrics of funds and the portfolio.
+
+"""
+
+import heapq
+import logging
+import math
+from datetime import datetime
+from typing import Iterator, Self
+
+from apis.mf_api_client import MFApiClient
+from enums.TransactionType import TransactionType
+from models.mf_price import MFPrice
+from models.mf_property import MFProperty
+from models.mf_transaction import MFTransaction
+from models.risk_metrics import RiskMetrics
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+class RunningRiskStats:
+    """Accumulates risk statistics of a value series one observation at a time.
+
+    Only running totals are kept, so memory does not grow with the length of the series.
+    """
+
+    def __init__(self: Self, risk_free_rate: float) -> None:
+        self._daily_risk_free: float = risk_free_rate / TRADING_DAYS_PER_YEAR
+        self._risk_free_rate: float = risk_free_rate
+
+        self._last_value: float | None = None
+
+        # Welford's running mean and sum of squared deviations of daily returns
+        self._count: int = 0
+        self._mean: float = 0.0
+        self._m2: float = 0.0
+
+        # Sum of squared returns below the daily risk free rate
+        self._downside_sq: float = 0.0
+
+        # Drawdown tracking
+        self._peak_value: float | None = None
+        self._peak_date: datetime | None = None
+        self._max_drawdown: float = 0.0
+        self._max_drawdown_peak_value: float | None = None
+        self._max_drawdown_peak_date: datetime | None = None
+        self._max_drawdown_trough_date: datetime | None = None
+        self._recovery_date: datetime | None = None
+
+    def update(self: Self, date: datetime, value: float) -> None:
+        if value <= 0:
+            return
+
+        if self._last_value is not None:
+            daily_return: float = value / self._last_value - 1
+
+            self._count += 1
+            delta: float = daily_return - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (daily_return - self._mean)
+
+            shortfall: float = daily_return - self._daily_risk_free
+            if shortfall < 0:
+                self._downside_sq += shortfall * shortfall
+
+        self._last_value = value
+
+        # Previous worst drawdown has been recovered
+        if (
+            self._recovery_date is None
+            and self._max_drawdown_peak_value is not None
+            and value >= self._max_drawdown_peak_value
+        ):
+            self._recovery_date = date
+
+        if self._peak_value is None or value >= self._peak_value:
+            self._peak_value = value
+            self._peak_date = date
+            return
+
+        drawdown: float = value / self._peak_value - 1
+        if drawdown < self._max_drawdown:
+            self._max_drawdown = drawdown
+            self._max_drawdown_peak_value = self._peak_value
+            self._max_drawdown_peak_date = self._peak_date
+            self._max_drawdown_trough_date = date
+            self._recovery_date = None
+
+    def result(self: Self) -> RiskMetrics:
+        variance: float = self._m2 / (self._count - 1) if self._count > 1 else 0.0
+        volatility: float = math.sqrt(variance * TRADING_DAYS_PER_YEAR)
+
+        downside_deviation: float = (
+            math.sqrt(self._downside_sq / self._count * TRADING_DAYS_PER_YEAR)
+            if self._count > 0
+            else 0.0
+        )
+
+        excess_return: float = (
+            self._mean * TRADING_DAYS_PER_YEAR - self._risk_free_rate
+        )
+
+        return RiskMetrics(
+            observations=self._count,
+            volatility=volatility,
+            downside_deviation=downside_deviation,
+            sharpe=excess_return / volatility if volatility > 0 else None,
+            sortino=(
+                excess_return / downside_deviation if downside_deviation > 0 else None
+            ),
+            max_drawdown=self._max_drawdown,
+            peak_date=self._max_drawdown_peak_date,
+            trough_date=self._max_drawdown_trough_date,
+            recovery_date=self._recovery_date,
+        )
+
+
+class RiskService:
+    """Calculates risk metrics of each fund and the overall portfolio"""
+
+    def calculate_risk_metrics(
+        self: Self,
+        txn_list: list[MFTransaction],
+        mf_properties: dict[str, MFProperty],
+        mf_api_client: MFApiClient,
+        from_date: datetime | None,
+        to_date: datetime,
+        risk_free_rate: float,
+        assets_to_include: list[str],
+        portfolio=None,
+        country=None,
+    ) -> tuple[RiskMetrics, dict[str, RiskMetrics]]:
+        """Returns the portfolio risk metrics and the risk metrics of each fund.
+
+        Fund metrics are calculated on the NAV series from the first purchase of the fund,
+        while portfolio metrics are calculated on a time weighted index of the holdings,
+        so that fresh purchases and redemptions are not counted as returns.
+        All series are consumed in a single pass over the merged NAV dates.
+        """
+        txn_list = [
+            txn
+            for txn in txn_list
+            if self._is_included(
+                mf_properties[txn.fund], assets_to_include, portfolio, country
+            )
+            and txn.buy_date < to_date
+        ]
+
+        if len(txn_list) == 0:
+            return RunningRiskStats(risk_free_rate).result(), {}
+
+        start_date: datetime = min(txn.buy_date for txn in txn_list)
+        if from_date is not None and from_date > start_date:
+            start_date = from_date
+
+        funds: list[str] = sorted({txn.fund for txn in txn_list})
+        fund_index: dict[str, int] = {fund: i for i, fund in enumerate(funds)}
+
+        first_buy_dates: list[datetime] = [to_date] * len(funds)
+        for txn in txn_list:
+            index: int = fund_index[txn.fund]
+            first_buy_dates[index] = min(first_buy_dates[index], txn.buy_date)
+
+        # Unit changes of every fund sorted by date, applied at the close of that date
+        unit_events: list[tuple[datetime, int, float]] = []
+        for txn in txn_list:
+            units = float(txn.units)
+            unit_events.append((txn.buy_date, fund_index[txn.fund], units))
+            if txn.buy_sell.upper() == TransactionType.SELL.value:
+                unit_events.append((txn.sell_date, fund_index[txn.fund], -units))
+        unit_events.sort(key=lambda event: event[0])
+
+        logging.debug(
+            "Streaming NAV series of %s funds from %s to %s",
+            len(funds),
+            start_date,
+            to_date,
+        )
+
+        nav_streams: list[Iterator[tuple[datetime, int, float]]] = [
+            self._nav_stream(
+                mf_api_client,
+                mf_properties[fund].amfi_code,
+                fund_index[fund],
+                start_date,
+                to_date,
+            )
+            for fund in funds
+        ]
+
+        portfolio_stats = RunningRiskStats(risk_free_rate)
+        fund_stats: list[RunningRiskStats] = [
+            RunningRiskStats(risk_free_rate) for _ in funds
+        ]
+
+        units: list[float] = [0.0] * len(funds)
+        close_navs: list[float | None] = [None] * len(funds)
+        last_navs: list[float | None] = [None] * len(funds)
+
+        # Apply unit changes which happened before the first NAV date
+        event_pos = 0
+        while event_pos < len(unit_events) and unit_events[event_pos][0] < start_date:
+            _, index, delta = unit_events[event_pos]
+            units[index] += delta
+            event_pos += 1
+
+        portfolio_index: float | None = None
+        current_date: datetime | None = None
+
+        for date, index, nav in heapq.merge(*nav_streams, key=lambda item: item[0]):
+            if date != current_date and current_date is not None:
+                portfolio_index = self._grow_portfolio_index(
+                    current_date,
+                    units,
+                    close_navs,
+                    last_navs,
+                    portfolio_index,
+                    portfolio_stats,
+                )
+
+                # Holdings change at the close of the transaction date
+                while (
+                    event_pos < len(unit_events)
+                    and unit_events[event_pos][0] <= current_date
+                ):
+                    _, event_index, delta = unit_events[event_pos]
+                    units[event_index] += delta
+                    event_pos += 1
+
+                # Start the index once something is held
+                if portfolio_index is None and any(qty > 0 for qty in units):
+                    portfolio_index = 1.0
+                    portfolio_stats.update(current_date, portfolio_index)
+
+                close_navs = list(last_navs)
+
+            current_date = date
+            last_navs[index] = nav
+            if date >= first_buy_dates[index]:
+                fund_stats[index].update(date, nav)
+
+        if current_date is not None:
+            self._grow_portfolio_index(
+                current_date,
+                units,
+                close_navs,
+                last_navs,
+                portfolio_index,
+                portfolio_stats,
+            )
+
+        return portfolio_stats.result(), {
+            fund: fund_stats[fund_index[fund]].result() for fund in funds
+        }
+
+    def _grow_portfolio_index(
+        self: Self,
+        date: datetime,
+        units: list[float],
+        close_navs: list[float | None],
+        last_navs: list[float | None],
+        portfolio_index: float | None,
+        portfolio_stats: RunningRiskStats,
+    ) -> float | None:
+        """Grows the time weighted portfolio index with the holdings of the previous close"""
+        if portfolio_index is None:
+            return None
+
+        previous_value = 0.0
+        current_value = 0.0
+        for qty, close_nav, nav in zip(units, close_navs, last_navs):
+            if qty <= 0 or close_nav is None or nav is None:
+                continue
+            previous_value += qty * close_nav
+            current_value += qty * nav
+
+        # Nothing was held at the previous close, the index stays flat
+        if previous_value <= 0:
+            return portfolio_index
+
+        portfolio_index *= current_value / previous_value
+        portfolio_stats.update(date, portfolio_index)
+
+        return portfolio_index
+
+    def _nav_stream(
+        self: Self,
+        mf_api_client: MFApiClient,
+        amfi_code: int,
+        index: int,
+        from_date: datetime,
+        to_date: datetime,
+    ) -> Iterator[tuple[datetime, int, float]]:
+        """Yields NAVs of a fund in ascending order of date"""
+        pricing_data: list[MFPrice] | None = mf_api_client.fetch_nav_prices(amfi_code)
+
+        if pricing_data is None:
+            logging.warning("No NAV data found for AMFI code %s", amfi_code)
+            return
+
+        # NAV data is sorted with the latest date first
+        for price in reversed(pricing_data):
+            if price.date < from_date:
+                continue
+            if price.date > to_date:
+                break
+            yield price.date, index, float(price.nav)
+
+    def _is_included(
+        self: Self,
+        mf_property: MFProperty,
+        assets_to_include: list[str],
+        portfolio: str | None,
+        country: str | None,
+    ) -> bool:
+        if mf_property.asset.lower() not in assets_to_include:
+            return False
+
+        if portfolio is not None and mf_property.portfolio.lower() != portfolio.lower():
+            return False
+
+        if country is not None and mf_property.country.lower() != country.lower():
+            return False
+
+        return True
@@ -0,0 +1,168 @@
+"""
+services.sheet_loader_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which reads all worksheets used by the script in one request.
+
+"""
+
+import logging
+import threading
+from typing import TYPE_CHECKING, Self
+
+from models.portfolio_config import PortfolioConfig
+from utils import profiler
+from utils.functions import to_column
+
+# Google client libraries are imported on first fetch, cached runs never load them
+if TYPE_CHECKING:
+    from gspread.spreadsheet import Spreadsheet
+
+
+class SheetLoaderService:
+    """Class that fetches the mapped columns of all worksheets of a portfolio in a single batch call"""
+
+    _instances: dict[str, "SheetLoaderService"] = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls, config: PortfolioConfig | None = None):
+        config = config if config is not None else PortfolioConfig.default()
+
+        # Services of a portfolio loading in parallel must share one loader
+        with cls._instances_lock:
+            if config.name not in cls._instances:
+                instance: Self = super().__new__(cls)
+                instance._config = config
+                instance._worksheets = cls._mapped_worksheets(config)
+                instance._rows = {}
+                instance._modified_time = None
+                instance._lock = threading.Lock()
+                cls._instances[config.name] = instance
+        return cls._instances[config.name]
+
+    @staticmethod
+    def _mapped_worksheets(
+        config: PortfolioConfig,
+    ) -> dict[str, tuple[int, list[int | None]]]:
+        """Returns worksheet name -> (first row, mapped column numbers) of the configured worksheets"""
+        worksheets: dict[str, tuple[int, list[int | None]]] = {}
+
+        # Only the mapped columns are read from the sheet, in the order the models expect them
+        for worksheet_name, first_row, columns in [
+            (
+                config.transactions_worksheet_name,
+                config.transactions_first_row,
+                config.transaction_columns,
+            ),
+            (
+                config.properties_worksheet_name,
+                config.properties_first_row,
+                config.property_columns,
+            ),
+        ]:
+            if worksheet_name is not None and first_row is not None:
+                worksheets[worksheet_name] = (first_row, list(columns.values()))
+
+        return worksheets
+
+    def get_rows(self: Self, worksheet_name: str) -> list[tuple[str, ...]]:
+        """Returns the data rows of a worksheet with only the registered columns, in their registered order.
+
+        The first request fetches every registered worksheet together, later requests for
+        any of them are served from that response.
+        """
+        # Services loading in parallel wait for the same batch call
+        with self._lock:
+            if worksheet_name not in self._rows:
+                self._rows.update(self._fetch_rows(list(self._worksheets.keys())))
+
+        return self._rows[worksheet_name]
+
+    def get_modified_time(self: Self) -> str | None:
+        """Returns the time the spreadsheet was last modified, a single small Drive API request per run"""
+        from gspread.exceptions import APIError
+
+        from apis.google_sheets_client import GoogleSheetsClient
+
+        with self._lock:
+            if self._modified_time is None:
+                try:
+                    self._modified_time = (
+                        GoogleSheetsClient(self._config).get_sheet().get_lastUpdateTime()
+                    )
+                except APIError as e:
+                    logging.warning("Could not fetch last modified time of sheet: %s", e)
+
+        return self._modified_time
+
+    def reset(self: Self) -> None:
+        """Drops the rows and modified time of this run, so the next request fetches them again"""
+        with self._lock:
+            self._rows = {}
+            self._modified_time = None
+
+    @profiler.timed("sheets.fetch")
+    def _fetch_rows(
+        self: Self, worksheet_names: list[str]
+    ) -> dict[str, list[tuple[str, ...]]]:
+        from apis.google_sheets_client import GoogleSheetsClient
+
+        logging.info("Fetching %s from Google Sheets...", ", ".join(worksheet_names))
+
+        # One range per mapped column, starting from the first data row
+        ranges: list[str] = []
+        for name in worksheet_names:
+            first_row, columns = self._worksheets[name]
+            for column in columns:
+                if column is not None:
+                    ranges.append(self._column_range(name, first_row, column))
+
+        sheet: Spreadsheet = GoogleSheetsClient(self._config).get_sheet()
+
+        response: dict = sheet.values_batch_get(
+            ranges, params={"majorDimension": "COLUMNS"}
+        )
+        value_ranges: list[dict] = response["valueRanges"]
+
+        rows: dict[str, list[tuple[str, ...]]] = {}
+        position = 0
+        for name in worksheet_names:
+            _, columns = self._worksheets[name]
+
+            column_values: list[list[str] | None] = []
+            for column in columns:
+                if column is None:
+                    column_values.append(None)
+                    continue
+                values: list[list[str]] = value_ranges[position].get("values", [])
+                column_values.append(values[0] if len(values) > 0 else [])
+                position += 1
+
+            rows[name] = self._zip_columns(column_values)
+
+        return rows
+
+    def _zip_columns(
+        self: Self, column_values: list[list[str] | None]
+    ) -> list[tuple[str, ...]]:
+        """Zips columns into rows, padding the trailing empty cells the API leaves out"""
+        row_count: int = max(
+            (len(values) for values in column_values if values is not None), default=0
+        )
+
+        padded: list[list[str]] = [
+            (
+                values + [""] * (row_count - len(values))
+                if values is not None
+                else [""] * row_count
+            )
+            for values in column_values
+        ]
+
+        return list(zip(*padded))
+
+    def _column_range(self: Self, worksheet_name: str, first_row: int, column: int) -> str:
+        """Returns the A1 range of a column from the first data row to the end of the sheet"""
+        letter: str = to_column(column)
+        title: str = "'" + worksheet_name.replace("'", "''") + "'"
+        return f"{title}!{letter}{first_row + 1}:{letter}"
@@ -0,0 +1,160 @@
+"""
+services.snapshot_service
+~~~~~~~~~~~~~~
+
+This module contains a service class which saves the prepared inputs of a portfolio as one bundle.
+
+"""
+
+import logging
+import os
+import pickle
+from datetime import datetime
+from typing import Self
+
+from apis.mf_api_client import MFApiClient
+from models.mf_property import MFProperty
+from models.nav_history import NavHistory
+from models.portfolio_config import PortfolioConfig
+from models.portfolio_snapshot import PortfolioSnapshot
+from services.mf_data_service import MFDataService
+from services.mf_properties_service import MFPropertiesService
+from utils import cache_counters, files, profiler
+
+
+class SnapshotService:
+    """Saves transactions, properties and NAV histories of a portfolio into one bundle.
+
+    The bundle holds the transaction table with its interned funds, the properties, and
+    the NAV history of every held scheme with its date index. It is written with the
+    pickle codec, so on load the file is mapped once and the arrays of NAV histories
+    are views into it. Along with the inputs it keeps the modification time and size of
+    every file they were read from, and is ignored as soon as any of them changes.
+    """
+
+    _FOLDER_NAME = "snapshot"
+    _FILE_NAME = "portfolio"
+
+    # Bumped whenever the format of the bundle changes
+    _SCHEMA_VERSION = 1
+
+    def __init__(self: Self, config: PortfolioConfig | None = None) -> None:
+        config = config if config is not None else PortfolioConfig.default()
+
+        self._config: PortfolioConfig = config
+        self._folder_name: str = config.cache_folder(self._FOLDER_NAME)
+
+    def take(self: Self, source: str | None, properties_source: str | None) -> int:
+        """Loads the inputs from cache and saves them as a bundle, returns the size of the bundle"""
+        mf_properties_service = MFPropertiesService(
+            False, properties_source, self._config
+        )
+        mf_data_service = MFDataService(False, source, self._config)
+        mf_api_client = MFApiClient()
+
+        mf_properties: dict[str, MFProperty] = mf_properties_service.mf_properties()
+        amfi_codes: list[int] = sorted(
+            {mf_property.amfi_code for mf_property in mf_properties.values()}
+        )
+
+        nav_histories: dict[int, NavHistory | None] = {
+            amfi_code: mf_api_client.nav_history(amfi_code) for amfi_code in amfi_codes
+        }
+
+        # Files are stamped after they are read, a later sync changes their stamps
+        file_paths: list[str] = [
+            mf_data_service.source_file_path(),
+            mf_properties_service.source_file_path(),
+        ] + [mf_api_client.nav_cache_file_path(amfi_code) for amfi_code in amfi_codes]
+
+        files.save_cache_file(
+            self._folder_name,
+            self._FILE_NAME,
+            {
+                "source": source,
+                "properties_source": properties_source,
+                "stamps": {
+                    file_path: self._stamp(file_path) for file_path in file_paths
+                },
+                "taken_at": datetime.now(),
+                "txn_table": mf_data_service.mf_txn_table(),
+                "mf_properties": mf_properties,
+                # Arrays of NAV histories are written out of band, to be mapped on load
+                "nav_histories": {
+                    amfi_code: (
+                        pickle.PickleBuffer(nav_history.days),
+                        pickle.PickleBuffer(nav_history.encoded_navs),
+                    )
+                    for amfi_code, nav_history in nav_histories.items()
+                    if nav_history is not None
+                },
+            },
+            self._SCHEMA_VERSION,
+            codec="pickle",
+        )
+
+        size: int = os.path.getsize(
+            files.get_cache_file_path(self._folder_name, self._FILE_NAME)
+        )
+        logging.info(
+            "Saved snapshot of %s transactions and %s schemes, %s bytes",
+            len(mf_data_service.mf_txn_table()),
+            len(amfi_codes),
+            size,
+        )
+
+        return size
+
+    @profiler.timed("snapshot.load")
+    def load(
+        self: Self, source: str | None, properties_source: str | None
+    ) -> PortfolioSnapshot | None:
+        """Maps the bundle, returns None if there is none or a file it was taken from has changed"""
+        json_data: dict | None = files.map_cache_file(
+            self._folder_name, self._FILE_NAME, self._SCHEMA_VERSION
+        )
+
+        if json_data is None:
+            logging.debug("Did not find snapshot")
+            cache_counters.record("snapshot", cache_counters.MISS)
+            return None
+
+        if (
+            json_data["source"] != source
+            or json_data["properties_source"] != properties_source
+        ):
+            logging.debug("Snapshot was taken of other sources, ignoring it")
+            cache_counters.record("snapshot", cache_counters.MISS)
+            return None
+
+        for file_path, stamp in json_data["stamps"].items():
+            if self._stamp(file_path) != stamp:
+                logging.info(
+                    "Ignoring snapshot as %s changed since it was taken", file_path
+                )
+                cache_counters.record("snapshot", cache_counters.MISS)
+                return None
+
+        logging.info("Loaded snapshot taken at %s", json_data["taken_at"])
+        cache_counters.record("snapshot", cache_counters.HIT)
+
+        # Buffers are views into the mapped file, dates are cast back to an int array
+        nav_data: dict[int, tuple[memoryview, memoryview]] = json_data["nav_histories"]
+
+        return PortfolioSnapshot(
+            txn_table=json_data["txn_table"],
+            mf_properties=json_data["mf_properties"],
+            nav_histories={
+                amfi_code: NavHistory(days.cast("i"), encoded_navs)
+                for amfi_code, (days, encoded_navs) in nav_data.items()
+            },
+            taken_at=json_data["taken_at"],
+        )
+
+    def _stamp(self: Self, file_path: str) -> tuple[int, int] | None:
+        """Returns the modification time and size of a file, None if it does not exist"""
+        try:
+            stat: os.stat_result = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
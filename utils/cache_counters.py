@@ -0,0 +1,93 @@
+"""
+utils.cache_counters
+~~~~~~~~~~~~~~
+
+This module contains methods to count hits, misses and fetches of caches across runs.
+
+"""
+
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from utils import files
+
+_FOLDER_NAME = "cache_stats"
+_FILE_NAME = "counters"
+
+# Bumped whenever the format of the counters changes
+_SCHEMA_VERSION = 1
+
+# A cache entry was served, was missing or unusable, or was fetched from its source
+HIT = "hits"
+MISS = "misses"
+FETCH = "fetches"
+
+_EVENTS: list[str] = [HIT, MISS, FETCH]
+
+_counts: dict[str, dict[str, int]] = {}
+_lock = threading.Lock()
+_is_registered = False
+
+
+def record(cache: str, event: str, count=1) -> None:
+    """Counts events of a cache in this run, they are added to the saved counters at exit"""
+    global _is_registered
+
+    with _lock:
+        counts: dict[str, int] = _counts.setdefault(cache, dict.fromkeys(_EVENTS, 0))
+        counts[event] += count
+
+        if not _is_registered:
+            atexit.register(save)
+            _is_registered = True
+
+
+def load() -> dict:
+    """Returns the counters of all runs, with the time counting started"""
+    json_data: dict | None = files.read_cache_file(
+        _FOLDER_NAME, _FILE_NAME, _SCHEMA_VERSION
+    )
+
+    if json_data is None:
+        return {"since": None, "caches": {}}
+    return json_data
+
+
+def save() -> None:
+    """Adds the counters of this run to the saved counters.
+
+    Runs started together may each read the counters before the other saves them, so
+    the counts of one can be lost. They guide tuning and are not meant to be exact.
+    """
+    with _lock:
+        if len(_counts) == 0:
+            return
+        run_counts: dict[str, dict[str, int]] = {
+            cache: dict(counts) for cache, counts in _counts.items()
+        }
+        _counts.clear()
+
+    json_data: dict = load()
+    if json_data["since"] is None:
+        json_data["since"] = datetime.now().isoformat(timespec="seconds")
+
+    for cache, counts in run_counts.items():
+        saved_counts: dict[str, int] = json_data["caches"].setdefault(
+            cache, dict.fromkeys(_EVENTS, 0)
+        )
+        for event, count in counts.items():
+            saved_counts[event] = saved_counts.get(event, 0) + count
+
+    try:
+        files.save_cache_file(_FOLDER_NAME, _FILE_NAME, json_data, _SCHEMA_VERSION)
+    except OSError as e:
+        logging.warning("Could not save cache counters: %s", e)
+
+
+def reset() -> None:
+    """Deletes the saved counters and the counters of this run"""
+    with _lock:
+        _counts.clear()
+    files.delete_files_in_folder(_FOLDER_NAME)
@@ -6,17 +6,44 @@ This module contains common date methods.
 
 """
 
+from array import array
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterable
 
+# Distinct date strings remembered by the parsers, SIP and NAV dates repeat heavily
+_CACHE_SIZE = 1 << 16
 
+
+@lru_cache(maxsize=_CACHE_SIZE)
 def to_datetime(datestring: str) -> datetime:
-    """Converts a date string with format dd-MM-yyyy to a datetime object"""
+    """Converts a date string with format dd-MM-yyyy to a datetime object.
+
+    The digits are sliced directly, any other spelling strptime accepts, like a single
+    digit day, falls back to it.
+    """
+    if len(datestring) == 10 and datestring[2] == "-" and datestring[5] == "-":
+        day, month, year = datestring[:2], datestring[3:5], datestring[6:]
+        if day.isdigit() and month.isdigit() and year.isdigit():
+            return datetime(int(year), int(month), int(day))
+
     return datetime.strptime(datestring, "%d-%m-%Y")
 
 
+@lru_cache(maxsize=_CACHE_SIZE)
+def to_ordinal(datestring: str) -> int:
+    """Converts a date string with format dd-MM-yyyy to a day ordinal"""
+    return to_datetime(datestring).toordinal()
+
+
+def to_ordinals(datestrings: Iterable[str]) -> array:
+    """Converts date strings with format dd-MM-yyyy to an array of day ordinals"""
+    return array("i", map(to_ordinal, datestrings))
+
+
 def to_datestring(date: datetime) -> str:
     """Converts a datetime object to a date string with format dd-MM-yyyy"""
-    return date.strftime("%d-%m-%Y")
+    return f"{date.day:02d}-{date.month:02d}-{date.year:04d}"
 
 
 def from_month_year(datestring: str) -> datetime:
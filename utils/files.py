@@ -6,9 +6,25 @@ This module contains common file methods.
 
 """
 
+import csv
 import json
+import logging
+import mmap
 import os
-from typing import Collection, LiteralString
+import pickle
+import struct
+import zlib
+from typing import Any, Collection, Literal, LiteralString, Self
+
+from utils import profiler
+
+CodecName = Literal["json", "record", "pickle"]
+
+# Header of cache files: magic, codec id, schema version, checksum and length of the payload
+_MAGIC = b"PTC1"
+_HEADER = struct.Struct("<4sBHIQ")
+
+_CACHE_FILE_EXTENSION = ".cache"
 
 
 def get_folder_path(folder_name: str) -> LiteralString:
@@ -21,10 +37,14 @@ def get_json_file_path(folder_name: str, file_name: str) -> LiteralString:
     return os.path.join(os.getcwd(), folder_name, file_name + ".json")
 
 
+def get_file_path(folder_name: str, file_name: str, extension: str) -> LiteralString:
+    """Returns file path taking folder name, file name and extension as input"""
+    return os.path.join(os.getcwd(), folder_name, file_name + extension)
+
+
 def check_or_create_folder(folder_name: str) -> None:
     """Checks if a folder exists and creates if it does not exist"""
-    if not os.path.exists(folder_name):
-        os.makedirs(folder_name)
+    os.makedirs(folder_name, exist_ok=True)
 
 
 def check_if_json_file_exists(folder_name: str, file_name: str) -> bool:
@@ -44,6 +64,24 @@ def save_file_as_json(folder_name: str, file_name: str, data: Collection) -> Non
         json.dump(data, f, indent=4)
 
 
+def save_private_file_as_json(folder_name: str, file_name: str, data: Collection) -> None:
+    """Saves a .json file readable only by the owner, replacing any previous file atomically"""
+    check_or_create_folder(folder_name)
+
+    file_path: LiteralString = get_json_file_path(folder_name, file_name)
+    temp_file_path: str = file_path + ".tmp"
+
+    file_descriptor: int = os.open(
+        temp_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+    )
+    with os.fdopen(file_descriptor, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+
+    # Tighten the mode in case the file was left behind with wider permissions
+    os.chmod(temp_file_path, 0o600)
+    os.replace(temp_file_path, file_path)
+
+
 def read_file_as_json(folder_name: str, file_name: str) -> Collection | None:
     """Reads a UTF-8 encoded .json file and returns the result"""
     if check_if_json_file_exists(folder_name, file_name) is False:
@@ -68,3 +106,304 @@ def delete_files_in_folder(folder_name: str) -> None:
             if os.path.isfile(file_path):
                 # Delete the file
                 os.remove(file_path)
+
+
+def export_rows(file_path: str, rows: list[dict]) -> None:
+    """Exports a list of flat dicts as a .csv file or otherwise as a .json file"""
+    directory: str = os.path.dirname(file_path)
+    if directory:
+        check_or_create_folder(directory)
+
+    with open(file_path, "w", encoding="utf-8", newline="") as f:
+        if file_path.lower().endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, f, indent=4)
+
+
+class JsonCodec:
+    """Encodes any JSON data without whitespace"""
+
+    ID = 1
+
+    def encode(self: Self, data: Any) -> bytes:
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    def decode(self: Self, payload: memoryview) -> Any:
+        return json.loads(bytes(payload))
+
+
+class RecordCodec:
+    """Encodes columns of string records, as a dict of column name to list of values.
+
+    Each column is stored as its values joined by a NUL separator, so a column is decoded
+    with a single split instead of parsing a JSON object per record.
+    """
+
+    ID = 2
+
+    _SEPARATOR = "\x00"
+    _COUNTS = struct.Struct("<II")
+    _LENGTH = struct.Struct("<I")
+
+    def encode(self: Self, data: dict[str, list[str]]) -> bytes:
+        names: list[str] = list(data.keys())
+        row_count: int = len(data[names[0]]) if len(names) > 0 else 0
+
+        parts: list[bytes] = [self._COUNTS.pack(len(names), row_count)]
+        for values in [names] + [data[name] for name in names]:
+            if len(values) != (len(names) if values is names else row_count):
+                raise ValueError("Record columns must have the same length")
+            if any(self._SEPARATOR in value for value in values):
+                raise ValueError("Record values cannot contain a NUL character")
+            encoded: bytes = self._SEPARATOR.join(values).encode("utf-8")
+            parts.append(self._LENGTH.pack(len(encoded)))
+            parts.append(encoded)
+
+        return b"".join(parts)
+
+    def decode(self: Self, payload: memoryview) -> dict[str, list[str]]:
+        name_count, row_count = self._COUNTS.unpack_from(payload, 0)
+        offset: int = self._COUNTS.size
+
+        texts: list[str] = []
+        for _ in range(name_count + 1):
+            (length,) = self._LENGTH.unpack_from(payload, offset)
+            offset += self._LENGTH.size
+            texts.append(str(payload[offset : offset + length], "utf-8"))
+            offset += length
+
+        names: list[str] = texts[0].split(self._SEPARATOR) if name_count > 0 else []
+        return {
+            name: text.split(self._SEPARATOR) if row_count > 0 else []
+            for name, text in zip(names, texts[1:])
+        }
+
+
+class PickleCodec:
+    """Encodes Python objects with pickle protocol 5, array data is kept out of band.
+
+    Buffers of arrays are written after the pickle stream and aligned, on decode they are
+    handed back as views into the file contents instead of being copied.
+    """
+
+    ID = 3
+
+    _ALIGNMENT = 64
+    _COUNT = struct.Struct("<IQ")
+    _LENGTH = struct.Struct("<Q")
+
+    def encode(self: Self, data: Any) -> bytes:
+        buffers: list[pickle.PickleBuffer] = []
+        stream: bytes = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+
+        raws: list[memoryview] = [buffer.raw() for buffer in buffers]
+        parts: list[bytes] = [self._COUNT.pack(len(raws), len(stream))]
+        parts += [self._LENGTH.pack(raw.nbytes) for raw in raws]
+        parts.append(stream)
+
+        offset: int = sum(len(part) for part in parts)
+        for raw in raws:
+            padding: int = -(_HEADER.size + offset) % self._ALIGNMENT
+            parts.append(b"\x00" * padding)
+            parts.append(raw)
+            offset += padding + raw.nbytes
+
+        return b"".join(parts)
+
+    def decode(self: Self, payload: memoryview) -> Any:
+        buffer_count, stream_length = self._COUNT.unpack_from(payload, 0)
+        offset: int = self._COUNT.size
+
+        lengths: list[int] = []
+        for _ in range(buffer_count):
+            lengths.append(self._LENGTH.unpack_from(payload, offset)[0])
+            offset += self._LENGTH.size
+
+        stream: memoryview = payload[offset : offset + stream_length]
+        offset += stream_length
+
+        buffers: list[memoryview] = []
+        for length in lengths:
+            offset += -(_HEADER.size + offset) % self._ALIGNMENT
+            buffers.append(payload[offset : offset + length])
+            offset += length
+
+        return pickle.loads(stream, buffers=buffers)
+
+
+_CODECS: dict[str, JsonCodec | RecordCodec | PickleCodec] = {
+    "json": JsonCodec(),
+    "record": RecordCodec(),
+    "pickle": PickleCodec(),
+}
+_CODECS_BY_ID: dict[int, JsonCodec | RecordCodec | PickleCodec] = {
+    codec.ID: codec for codec in _CODECS.values()
+}
+
+# Errors raised by codecs on payloads which are intact but cannot be decoded
+_DECODE_ERRORS = (
+    ValueError,
+    TypeError,
+    KeyError,
+    EOFError,
+    struct.error,
+    pickle.UnpicklingError,
+)
+
+
+def get_cache_file_path(folder_name: str, file_name: str) -> LiteralString:
+    """Returns cache file path taking folder name and file name as input"""
+    return get_file_path(folder_name, file_name, _CACHE_FILE_EXTENSION)
+
+
+def check_if_cache_file_exists(folder_name: str, file_name: str) -> bool:
+    """Checks if a cache file exists and returns the result"""
+    return os.path.exists(get_cache_file_path(folder_name, file_name))
+
+
+@profiler.timed("cache.write")
+def save_cache_file(
+    folder_name: str,
+    file_name: str,
+    data: Any,
+    schema_version: int,
+    codec: CodecName = "json",
+) -> None:
+    """Saves data as a cache file with the given codec, replacing any previous file atomically"""
+    check_or_create_folder(folder_name)
+
+    selected_codec: JsonCodec | RecordCodec | PickleCodec = _CODECS[codec]
+    payload: bytes = selected_codec.encode(data)
+    header: bytes = _HEADER.pack(
+        _MAGIC, selected_codec.ID, schema_version, zlib.crc32(payload), len(payload)
+    )
+
+    file_path: LiteralString = get_cache_file_path(folder_name, file_name)
+    temp_file_path: str = f"{file_path}.{os.getpid()}.tmp"
+
+    with open(temp_file_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+
+    os.replace(temp_file_path, file_path)
+
+
+@profiler.timed("cache.read")
+def read_cache_file(folder_name: str, file_name: str, schema_version: int) -> Any | None:
+    """Reads a cache file and returns its data.
+
+    Returns None if the file does not exist, was written with another schema version or
+    is corrupt, so the caller rebuilds it.
+    """
+    file_path: LiteralString = get_cache_file_path(folder_name, file_name)
+
+    try:
+        with open(file_path, "rb") as f:
+            contents: bytes = f.read()
+    except FileNotFoundError:
+        return None
+
+    return _decode_cache_contents(file_path, memoryview(contents), schema_version)
+
+
+@profiler.timed("cache.map")
+def map_cache_file(folder_name: str, file_name: str, schema_version: int) -> Any | None:
+    """Maps a cache file into memory and returns its data, same as read_cache_file.
+
+    Buffers of the pickle codec are returned as views into the mapping, so arrays are
+    neither read nor copied until they are used.
+    """
+    file_path: LiteralString = get_cache_file_path(folder_name, file_name)
+
+    try:
+        with open(file_path, "rb") as f:
+            contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        # An empty file cannot be mapped
+        logging.warning("Ignoring truncated cache file %s", file_path)
+        return None
+
+    return _decode_cache_contents(file_path, memoryview(contents), schema_version)
+
+
+def verify_cache_file(file_path: str) -> str | None:
+    """Reads a cache file in full, returns what is wrong with it or None if it is readable"""
+    try:
+        with open(file_path, "rb") as f:
+            contents: bytes = f.read()
+    except OSError as e:
+        return f"cannot be read: {e}"
+
+    problem, codec_id, _, payload = _unpack_cache_contents(memoryview(contents))
+    if problem is not None:
+        return problem
+
+    try:
+        _CODECS_BY_ID[codec_id].decode(payload)
+    except _DECODE_ERRORS as e:
+        return f"unreadable: {e}"
+
+    return None
+
+
+def _unpack_cache_contents(
+    contents: memoryview,
+) -> tuple[str | None, int, int, memoryview]:
+    """Returns a problem with the contents if any, otherwise the codec, schema version and payload"""
+    if len(contents) < _HEADER.size:
+        return "truncated", 0, 0, contents
+
+    magic, codec_id, schema_version, checksum, length = _HEADER.unpack_from(contents)
+    payload: memoryview = contents[_HEADER.size :]
+
+    if magic != _MAGIC or codec_id not in _CODECS_BY_ID:
+        return "of unknown format", 0, 0, contents
+
+    if len(payload) != length:
+        return "partially written", codec_id, schema_version, payload
+
+    if zlib.crc32(payload) != checksum:
+        return "corrupt", codec_id, schema_version, payload
+
+    return None, codec_id, schema_version, payload
+
+
+def _decode_cache_contents(
+    file_path: str, contents: memoryview, schema_version: int
+) -> Any | None:
+    problem, codec_id, file_schema_version, payload = _unpack_cache_contents(contents)
+
+    if problem is not None:
+        logging.warning("Ignoring cache file %s, it is %s", file_path, problem)
+        return None
+
+    if file_schema_version != schema_version:
+        logging.info(
+            "Ignoring cache file %s with schema version %s, expected %s",
+            file_path,
+            file_schema_version,
+            schema_version,
+        )
+        return None
+
+    try:
+        return _CODECS_BY_ID[codec_id].decode(payload)
+    except _DECODE_ERRORS as e:
+        logging.warning("Ignoring unreadable cache file %s: %s", file_path, e)
+        return None
+
+
+def rows_to_columns(rows: list[dict[str, str]], names: list[str]) -> dict[str, list[str]]:
+    """Converts records to columns for the record codec"""
+    return {name: [row[name] for row in rows] for name in names}
+
+
+def columns_to_rows(columns: dict[str, list[str]]) -> list[dict[str, str]]:
+    """Converts columns of the record codec back to records"""
+    names: list[str] = list(columns.keys())
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
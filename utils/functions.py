@@ -8,9 +8,9 @@ This module contains commonly used helper functions.
 
 from decimal import Decimal
 
-from babel.numbers import format_currency
 from colorama import Fore, Style
-from tabulate import tabulate
+
+from utils import profiler
 
 
 def to_num(column_letter: str) -> int | None:
@@ -20,12 +20,25 @@ def to_num(column_letter: str) -> int | None:
 
     col_num = 0
     for char in column_letter.upper():
-        col_num: int = col_num * 26 + (ord(char.upper()) - ord("A"))
-    return col_num
+        col_num: int = col_num * 26 + (ord(char.upper()) - ord("A") + 1)
+    return col_num - 1
+
+
+def to_column(col_num: int) -> str:
+    """Converts numbers to Google Sheets Column Name (A, B, C...)"""
+    column_letter = ""
+    col_num += 1
+    while col_num > 0:
+        col_num, remainder = divmod(col_num - 1, 26)
+        column_letter = chr(ord("A") + remainder) + column_letter
+    return column_letter
 
 
 def format_inr(amount: Decimal) -> str:
     """Converts decimal number to INR notation"""
+    # Formatting libraries are imported on first use, only when there is output to render
+    from babel.numbers import format_currency
+
     return format_currency(amount, "INR", locale="en_IN")
 
 
@@ -34,6 +47,9 @@ def print_header(header: str) -> None:
     print(f"\n{Fore.CYAN}{Style.BRIGHT}{header}{Style.RESET_ALL}")
 
 
+@profiler.timed("render")
 def print_table(tuple_list: list[tuple]) -> None:
     """Print tuple list as table"""
+    from tabulate import tabulate
+
     print(tabulate(tuple_list, tablefmt="plain"))
@@ -0,0 +1,212 @@
+"""
+utils.profiler
+~~~~~~~~~~~~~~
+
+This module contains methods to time the phases of a run and count calls of hot functions.
+
+"""
+
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator, Self
+
+# Spans are shared by every disabled call site, so an unprofiled run allocates nothing
+_DISABLED_SPAN = nullcontext()
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class _Node:
+    """Calls, wall time and CPU time of one span, with the spans entered within it"""
+
+    __slots__ = ("name", "calls", "wall", "cpu", "children")
+
+    def __init__(self: Self, name: str) -> None:
+        self.name: str = name
+        self.calls: int = 0
+        self.wall: float = 0.0
+        self.cpu: float = 0.0
+        self.children: dict[str, _Node] = {}
+
+    def child(self: Self, name: str) -> "_Node":
+        with _lock:
+            node: _Node | None = self.children.get(name)
+            if node is None:
+                node = self.children[name] = _Node(name)
+        return node
+
+    def to_dict(self: Self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "children": [child.to_dict() for child in self.children.values()],
+        }
+
+
+_root: _Node = _Node("run")
+_root_started: tuple[float, float] = (0.0, 0.0)
+
+# Calls and total wall time of counted functions, by name
+_counters: dict[str, list] = {}
+
+# Chrome trace events and cProfile profiler, only kept if requested
+_trace_events: list[dict] | None = None
+_cprofile: Any = None
+
+
+def enable(name: str, trace=False, cprofile=False) -> None:
+    """Starts profiling a run, functions are only counted if their module is imported after"""
+    global _enabled, _root, _root_started, _trace_events, _cprofile
+
+    _root = _Node(name)
+    _root_started = (time.perf_counter(), time.process_time())
+    _trace_events = [] if trace else None
+    _enabled = True
+
+    if cprofile:
+        import cProfile
+
+        _cprofile = cProfile.Profile()
+        _cprofile.enable()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str):
+    """Returns a context manager timing a phase, nested under the phase it is entered in"""
+    if not _enabled:
+        return _DISABLED_SPAN
+    return _span(name)
+
+
+@contextmanager
+def _span(name: str) -> Iterator[None]:
+    stack: list[_Node] = _get_stack()
+    node: _Node = stack[-1].child(name)
+    stack.append(node)
+
+    wall_start: float = time.perf_counter()
+    cpu_start: float = time.thread_time()
+    try:
+        yield
+    finally:
+        wall: float = time.perf_counter() - wall_start
+        cpu: float = time.thread_time() - cpu_start
+        stack.pop()
+
+        with _lock:
+            node.calls += 1
+            node.wall += wall
+            node.cpu += cpu
+            if _trace_events is not None:
+                _trace_events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": (wall_start - _root_started[0]) * 1e6,
+                        "dur": wall * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                    }
+                )
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator timing every call of a function as a span.
+
+    Like counted, the function is returned unchanged unless profiling was enabled before
+    it is decorated.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        if not _enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def counted(name: str) -> Callable[[Callable], Callable]:
+    """Decorator counting calls and wall time of a hot function, without nesting it as a span.
+
+    The function is returned unchanged unless profiling was enabled before it is
+    decorated, so hot paths of runs without profiling keep no wrapper.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        if not _enabled:
+            return function
+
+        counter: list = _counters.setdefault(name, [0, 0.0])
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start: float = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed: float = time.perf_counter() - start
+                with _lock:
+                    counter[0] += 1
+                    counter[1] += elapsed
+
+        return wrapper
+
+    return decorator
+
+
+def finish() -> dict:
+    """Stops profiling, returns the span tree and counters of the run"""
+    global _enabled
+
+    _enabled = False
+    if _cprofile is not None:
+        _cprofile.disable()
+
+    _root.calls = 1
+    _root.wall = time.perf_counter() - _root_started[0]
+    _root.cpu = time.process_time() - _root_started[1]
+
+    return {
+        "spans": _root.to_dict(),
+        "counters": {
+            name: {"calls": calls, "wall": wall}
+            for name, (calls, wall) in sorted(_counters.items())
+        },
+    }
+
+
+def save_trace(file_path: str) -> None:
+    """Saves the spans of the run in Chrome trace format, for chrome://tracing or Perfetto"""
+    import json
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": _trace_events or []}, f)
+
+
+def save_cprofile(file_path: str) -> None:
+    """Saves function level statistics of the run, readable with pstats or snakeviz"""
+    _cprofile.dump_stats(file_path)
+
+
+def _get_stack() -> list[_Node]:
+    """Returns the open spans of this thread, spans of worker threads start at the root"""
+    stack: list[_Node] | None = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = [_root]
+    return stack
@@ -0,0 +1,79 @@
+"""
+utils.xirr
+~~~~~~~~~~~~~~
+
+This module contains methods to solve XIRR of one or many cashflow series.
+
+"""
+
+import atexit
+import math
+import os
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from utils import profiler
+
+# Process pools are only started for large batches, so multiprocessing is imported on demand
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+# Below this many series, process start-up costs more than solving serially
+_PARALLEL_THRESHOLD = 32
+
+_executor: "ProcessPoolExecutor | None" = None
+_executor_lock = threading.Lock()
+
+
+@profiler.timed("xirr")
+def solve_xirr(cashflow: tuple[list[datetime], list[float]]) -> float:
+    """Solves XIRR of a (dates, values) cashflow series, returns 0 if there is no solution"""
+    cashflow_dates, cashflow_values = cashflow
+
+    if len(cashflow_dates) == 0:
+        return 0
+
+    xirr: float | None = _lists_xirr(cashflow_dates, cashflow_values)
+
+    if xirr is None or not math.isfinite(xirr):
+        return 0
+
+    return xirr
+
+
+@profiler.counted("listsXirr")
+def _lists_xirr(
+    cashflow_dates: list[datetime], cashflow_values: list[float]
+) -> float | None:
+    # xirr loads scipy, which dominates start-up, so it is imported on first solve
+    from xirr.math import listsXirr
+
+    return listsXirr(cashflow_dates, cashflow_values)
+
+
+@profiler.timed("xirr.batch")
+def batch_xirr(cashflows: list[tuple[list[datetime], list[float]]]) -> list[float]:
+    """Solves XIRR of many cashflow series, spreading large batches across processes"""
+    if len(cashflows) < _PARALLEL_THRESHOLD:
+        return [solve_xirr(cashflow) for cashflow in cashflows]
+
+    executor: ProcessPoolExecutor = _get_executor()
+    chunksize: int = max(1, len(cashflows) // ((os.cpu_count() or 1) * 4))
+
+    return list(executor.map(solve_xirr, cashflows, chunksize=chunksize))
+
+
+def _get_executor() -> "ProcessPoolExecutor":
+    """Returns a process pool shared by all batches of this run"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _executor
+
+    # Portfolios of a batch are calculated in parallel threads, which must share one pool
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+            atexit.register(_executor.shutdown)
+
+    return _executor